@@ -10,6 +10,7 @@ import {
   boolean,
   date,
   real,
+  doublePrecision,
   jsonb,
   timestamp,
   uniqueIndex,
@@ -99,6 +100,10 @@ export const videos = pgTable(
     difficulty: smallint('difficulty').default(5),
     tags: text('tags').array(),
     heatmapRaw: jsonb('heatmap_raw'),
+    // Compact fixed-interval heatmap (pipeline/heatmap_codec.py)
+    heatmapStart: doublePrecision('heatmap_start'),
+    heatmapStep: doublePrecision('heatmap_step'),
+    heatmapValues: real('heatmap_values').array(),
     processedAt: timestamp('processed_at', { withTimezone: true }).defaultNow(),
     createdAt: timestamp('created_at', { withTimezone: true }).defaultNow(),
   },
@@ -0,0 +1,5 @@
+"""Allows ``python pipeline <subcommand>`` from the repository root."""
+
+from cli import main
+
+main()
@@ -0,0 +1,156 @@
+"""
+Sprite-atlas packing
+====================
+Packs related variants of one frame into a single sprite image plus a
+coordinate map, so a Pixel Reveal or Fragment Match round costs the client
+one fetch instead of up to nine.
+
+Both atlases are built from the decoded master frame, never from the
+lossy variant files:
+  - ``px`` holds the native NxN pixelations (8x8 ... 128x128 tiles),
+    encoded lossless; the client scales a tile up to ``display`` size with
+    nearest-neighbour filtering, which reproduces the px* variant exactly
+  - ``frag`` adds no object at all: the four quadrants tile the frame
+    exactly, so its descriptor points at the frame's own key
+    (``frames.r2_path``) with one sprite per quadrant
+
+Atlases are written alongside the individual variant files and recorded in
+``frames.r2_variants`` under the ``"atlases"`` key:
+
+    {
+      "px8": "frames/abc/f01_px8.webp",
+      ...
+      "atlases": {
+        "px": {
+          "key": "frames/abc/f01_atlas_px.webp",
+          "width": 128, "height": 192,
+          "sprites": {"px8": {"x": 0, "y": 0, "w": 8, "h": 8}, ...},
+          "display": {"width": 1280, "height": 720, "scaling": "nearest"}
+        },
+        "frag": {
+          "key": "frames/abc/f01.webp",
+          "source": "frame",
+          "width": 1280, "height": 720,
+          "sprites": {"frag_tl": {"x": 0, "y": 0, "w": 640, "h": 360}, ...}
+        }
+      }
+    }
+"""
+
+import importlib.util
+import logging
+import os
+
+HAS_PILLOW = importlib.util.find_spec("PIL") is not None
+
+log = logging.getLogger(__name__)
+
+# Atlas groups: name → variants the atlas stands in for.
+ATLAS_GROUPS = {
+    "px": {"variants": ["px8", "px16", "px32", "px64", "px128"]},
+    "frag": {"variants": ["frag_tl", "frag_tr", "frag_bl", "frag_br"]},
+}
+
+# Pixel Reveal tile sizes (see the pixelate specs in extract_frames.VARIANTS).
+PIXEL_TILES = {"px8": 8, "px16": 16, "px32": 32, "px64": 64, "px128": 128}
+
+
+def pack_shelves(sizes: dict[str, tuple[int, int]], max_width: int) -> tuple[dict, int, int]:
+    """
+    Shelf packing: place sprites left to right, starting a new row when the
+    next one would exceed ``max_width``. Input order is preserved so the
+    layout is deterministic.
+    Returns (sprites, atlas_width, atlas_height) where sprites maps
+    name → {"x", "y", "w", "h"}.
+    """
+    sprites = {}
+    x = y = shelf_h = atlas_w = 0
+
+    for name, (w, h) in sizes.items():
+        if x > 0 and x + w > max_width:
+            y += shelf_h
+            x = shelf_h = 0
+        sprites[name] = {"x": x, "y": y, "w": w, "h": h}
+        x += w
+        shelf_h = max(shelf_h, h)
+        atlas_w = max(atlas_w, x)
+
+    return sprites, atlas_w, y + shelf_h
+
+
+def build_pixel_atlas(img, names: list[str], out_path: str, display_size: tuple[int, int]) -> dict:
+    """
+    Pack the native NxN pixelation of each listed px variant of the opened
+    frame ``img`` into one lossless WebP at ``out_path``.
+    Returns the atlas descriptor.
+    """
+    from PIL import Image
+
+    # Same downscale as extract_frames.render_variant, minus the upscale.
+    tiles = {name: img.resize((PIXEL_TILES[name],) * 2, Image.BILINEAR) for name in names}
+    sizes = {name: tile.size for name, tile in tiles.items()}
+    sprites, atlas_w, atlas_h = pack_shelves(sizes, max(w for w, _ in sizes.values()))
+
+    sheet = Image.new("RGB", (atlas_w, atlas_h))
+    for name, box in sprites.items():
+        sheet.paste(tiles[name].convert("RGB"), (box["x"], box["y"]))
+        tiles[name].close()
+    sheet.save(out_path, "WEBP", lossless=True)
+    sheet.close()
+
+    return {
+        "path": out_path,
+        "width": atlas_w,
+        "height": atlas_h,
+        "sprites": sprites,
+        "display": {"width": display_size[0], "height": display_size[1], "scaling": "nearest"},
+    }
+
+
+def build_fragment_atlas(size: tuple[int, int]) -> dict:
+    """
+    The four Fragment Match quadrants tile the frame exactly, so the atlas is
+    the frame itself with one sprite per quadrant. The descriptor has no
+    ``path``; ``"source": "frame"`` tells upload_to_r2 to use the frame's key.
+    """
+    w, h = size
+    half_w, half_h = w // 2, h // 2   # same boxes as extract_frames.render_variant
+    sprites = {
+        "frag_tl": {"x": 0, "y": 0, "w": half_w, "h": half_h},
+        "frag_tr": {"x": half_w, "y": 0, "w": w - half_w, "h": half_h},
+        "frag_bl": {"x": 0, "y": half_h, "w": half_w, "h": h - half_h},
+        "frag_br": {"x": half_w, "y": half_h, "w": w - half_w, "h": h - half_h},
+    }
+    return {"source": "frame", "width": w, "height": h, "sprites": sprites}
+
+
+def generate_atlases(frame_path: str, variant_paths: dict[str, str], rank: int, work_dir: str) -> dict:
+    """
+    Build the atlas of every group whose variants were all rendered for
+    this frame (see ``variant_paths``).
+    Returns a dict of group name → atlas descriptor (with local path, or
+    ``"source": "frame"`` for atlases that are the frame itself).
+    """
+    if not HAS_PILLOW or not variant_paths:
+        return {}
+
+    from PIL import Image
+
+    def wanted(group):
+        return all(name in variant_paths for name in ATLAS_GROUPS[group]["variants"])
+
+    atlases = {}
+    with Image.open(frame_path) as img:
+        if wanted("px"):
+            names = ATLAS_GROUPS["px"]["variants"]
+            with Image.open(variant_paths[names[0]]) as variant:
+                display_size = variant.size
+            img.load()
+            atlases["px"] = build_pixel_atlas(
+                img, names, os.path.join(work_dir, f"f{rank:02d}_atlas_px.webp"), display_size
+            )
+        if wanted("frag"):
+            atlases["frag"] = build_fragment_atlas(img.size)
+
+    log.info(f"  Packed {len(atlases)} atlases for frame rank {rank}")
+    return atlases
@@ -0,0 +1,56 @@
+"""
+Import-time benchmark
+=====================
+Measures the cold-start cost of loading the pipeline in a fresh interpreter,
+compared with eagerly importing every heavy backend (what extract_frames
+did before stages imported them lazily).
+
+Usage:
+    python bench_imports.py [--runs 7]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CASES = {
+    "python (baseline)": "pass",
+    "import extract_frames": "import extract_frames",
+    "import extract_batch": "import extract_batch",
+    "cli --help": "import sys; sys.argv = ['cli', '--help']\ntry:\n import cli; cli.main()\nexcept SystemExit: pass",
+    "eager backends": "import extract_frames, yt_dlp, psycopg2, psycopg2.extras, boto3, PIL.Image",
+}
+
+
+def time_case(code: str, runs: int) -> float:
+    """Best-of-N wall time (ms) to start an interpreter and run ``code``."""
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=HERE, check=True, stdout=subprocess.DEVNULL,
+        )
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=7)
+    args = parser.parse_args()
+
+    results = {name: time_case(code, args.runs) for name, code in CASES.items()}
+    baseline = results["python (baseline)"]
+
+    print(f"{'case':<26}{'ms':>9}{'over python':>14}")
+    for name, ms in results.items():
+        print(f"{name:<26}{ms:>9.1f}{ms - baseline:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Framedle content pipeline CLI
+=============================
+Single entry point for every pipeline stage. Heavy backends (yt-dlp,
+psycopg2, boto3, Pillow) are only imported by the subcommands that reach
+the stage needing them, so ``plan`` never loads boto3 and
+``variants-only`` never loads yt-dlp or psycopg2.
+
+Usage:
+    python cli.py process <url_or_id> [--atlas] [--snap-keyframes] [--profile NAME]
+    python cli.py batch [extract_batch options...]
+    python cli.py plan <url_or_id> [--num-frames 6] [--min-spacing 10]
+    python cli.py variants-only <frame.webp> [--rank 1] [--out DIR] [--atlas]
+    python cli.py upload-only <work_dir> --video-id <id> [--immutable]
+    python cli.py gc [--delete] [--grace-hours 24]
+
+    # From the repository root the directory itself is runnable:
+    python pipeline plan dQw4w9WgXcQ
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+
+import extract_frames
+from extract_frames import normalize_url, setup_logging
+
+
+def cmd_process(args):
+    settings = None
+    if args.profile:
+        settings = extract_frames.PipelineSettings(variant_profiles=tuple(args.profile))
+    extract_frames.process_video(
+        normalize_url(args.url),
+        atlases=args.atlas or None,
+        snap=args.snap_keyframes or None,
+        settings=settings,
+    )
+
+
+def cmd_batch(args):
+    import extract_batch
+
+    extract_batch.main(args.batch_args)
+
+
+def cmd_plan(args):
+    """Print the moments that would be captured, without touching ffmpeg/R2/DB."""
+    info = extract_frames.get_video_info(normalize_url(args.url))
+    heatmap = info.get("heatmap")
+    if not heatmap:
+        print(json.dumps({"video_id": info.get("id"), "moments": [], "heatmap": False}))
+        return
+    moments = extract_frames.find_top_moments(
+        heatmap, info.get("duration", 0), n=args.num_frames, min_spacing=args.min_spacing
+    )
+    print(json.dumps({
+        "video_id": info.get("id"),
+        "title": info.get("title"),
+        "duration": info.get("duration"),
+        "heatmap": True,
+        "moments": moments,
+    }, indent=2))
+
+
+def cmd_variants_only(args):
+    """Generate variants (and optionally atlases) for an existing frame file."""
+    out_dir = args.out or os.path.dirname(os.path.abspath(args.frame))
+    os.makedirs(out_dir, exist_ok=True)
+    paths = extract_frames.generate_variants(args.frame, "local", args.rank, out_dir)
+    result = {"variants": paths}
+    if args.atlas:
+        from atlas import generate_atlases
+
+        result["atlases"] = generate_atlases(args.frame, paths, args.rank, out_dir)
+    print(json.dumps(result, indent=2))
+
+
+def moments_from_work_dir(work_dir: str) -> list[dict]:
+    """Rebuild upload-ready moments from f{rank}.webp / f{rank}_{variant}.webp files."""
+    moments = {}
+    for name in sorted(os.listdir(work_dir)):
+        main = re.fullmatch(r"f(\d{2})\.webp", name)
+        if main:
+            rank = int(main.group(1))
+            moments.setdefault(rank, {"rank": rank, "variant_paths": {}})
+            moments[rank]["filepath"] = os.path.join(work_dir, name)
+            continue
+        variant = re.fullmatch(r"f(\d{2})_(\w+)\.webp", name)
+        if variant and variant.group(2) in extract_frames.VARIANTS:
+            rank = int(variant.group(1))
+            moments.setdefault(rank, {"rank": rank, "variant_paths": {}})
+            moments[rank]["variant_paths"][variant.group(2)] = os.path.join(work_dir, name)
+    return [m for _, m in sorted(moments.items()) if "filepath" in m]
+
+
+def cmd_upload_only(args):
+    """Upload a directory of already generated frames/variants to R2."""
+    moments = moments_from_work_dir(args.work_dir)
+    if not moments:
+        print(f"No f<rank>.webp frames found in {args.work_dir}", file=sys.stderr)
+        sys.exit(1)
+    s3_client = extract_frames.get_r2_client()
+    if not s3_client:
+        sys.exit(1)
+    results = extract_frames.upload_to_r2(
+        s3_client, args.video_id, moments, immutable=args.immutable
+    )
+    print(json.dumps(results, indent=2))
+
+
+def cmd_gc(args):
+    import r2_gc
+
+    argv = ["--delete"] if args.delete else []
+    if args.grace_hours is not None:
+        argv += ["--grace-hours", str(args.grace_hours)]
+    r2_gc.main(argv)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="framedle-pipeline", description=__doc__.split("\n")[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("process", help="Run the full pipeline for one video")
+    p.add_argument("url", help="YouTube URL or video ID")
+    p.add_argument("--atlas", action="store_true", help="Also build sprite atlases")
+    p.add_argument(
+        "--snap-keyframes", action="store_true",
+        help="Move moments onto the nearest keyframe for cheaper seeks",
+    )
+    p.add_argument(
+        "--profile", action="append", choices=sorted(extract_frames.VARIANT_PROFILES),
+        help="Variant profile to render (repeatable; default: all)",
+    )
+    p.set_defaults(func=cmd_process)
+
+    p = sub.add_parser("batch", help="Run extract_batch (all its options pass through)")
+    p.add_argument("batch_args", nargs=argparse.REMAINDER)
+    p.set_defaults(func=cmd_batch)
+
+    p = sub.add_parser("plan", help="Show which moments would be captured")
+    p.add_argument("url", help="YouTube URL or video ID")
+    p.add_argument("--num-frames", type=int, default=extract_frames.NUM_FRAMES)
+    p.add_argument("--min-spacing", type=float, default=extract_frames.MIN_SPACING_SEC)
+    p.set_defaults(func=cmd_plan)
+
+    p = sub.add_parser("variants-only", help="Generate variants for an existing frame")
+    p.add_argument("frame", help="Path to a captured frame (WebP)")
+    p.add_argument("--rank", type=int, default=1)
+    p.add_argument("--out", default=None, help="Output directory (default: frame's dir)")
+    p.add_argument("--atlas", action="store_true", help="Also build sprite atlases")
+    p.set_defaults(func=cmd_variants_only)
+
+    p = sub.add_parser("upload-only", help="Upload already generated frames to R2")
+    p.add_argument("work_dir", help="Directory with f<rank>.webp and variant files")
+    p.add_argument("--video-id", required=True)
+    p.add_argument(
+        "--immutable", action="store_true", default=extract_frames.IMMUTABLE_KEYS,
+        help="Upload under content-hashed keys cached for a year",
+    )
+    p.set_defaults(func=cmd_upload_only)
+
+    p = sub.add_parser("gc", help="Delete R2 frame objects nothing references")
+    p.add_argument("--delete", action="store_true", help="Actually delete (default: dry run)")
+    p.add_argument(
+        "--grace-hours", type=float, default=None,
+        help="Keep objects and videos newer than this (default: 24)",
+    )
+    p.set_defaults(func=cmd_gc)
+
+    return parser
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parse argv; options after ``batch`` are handed to extract_batch untouched."""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "batch":
+        return argparse.Namespace(command="batch", batch_args=argv[1:], func=cmd_batch)
+    return build_parser().parse_args(argv)
+
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    setup_logging()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,25 +6,193 @@ Usage:
     python extract_batch.py                    # reads from videos.json
     python extract_batch.py --config my.json   # custom config file
     python extract_batch.py --urls "url1,url2" # comma-separated URLs
+    python extract_batch.py --max-rss-mb 512   # enforce a peak-RSS budget
+    python extract_batch.py --profile daily_frame --profile pixel_reveal
+
+Playlists and channels (flat-listed, filtered, deduped — see ingest.py):
+    python extract_batch.py --urls "https://www.youtube.com/@channel" \
+        --min-views 1000000 --max-duration 900 --playlist-limit 500
+
+The config file's ``settings`` block (num_frames, min_spacing_sec,
+frame_width, webp_quality, generate_variants, upload_to_r2,
+variant_profiles) drives every run, including worker mode.
+
+Distributed mode (shared Postgres ``jobs`` queue, see job_queue.py):
+    python extract_batch.py --enqueue          # push videos.json / --urls to the queue
+    python extract_batch.py --worker           # drain the queue, exit when empty
+    python extract_batch.py --worker --poll-interval 30   # keep polling
 """
 
 import argparse
+import dataclasses
 import json
 import logging
 import sys
 import os
+import threading
 import time
 
-from extract_frames import process_video
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
+from extract_frames import (
+    process_video, get_r2_client, normalize_url, setup_logging, DATABASE_URL, DATABASE_SSLMODE, R2_BUCKET,
+    MAX_RSS_MB, SPILL_DIR, GENERATE_ATLASES, SNAP_KEYFRAMES, VARIANT_WORKERS,
+    VARIANT_PROFILES, PipelineSettings,
 )
+from frame_share import variant_pool
+from ingest import MIN_DURATION_SEC, EntryFilter, expand_urls, is_collection_url
+from manifest import update_catalog
+from memory_budget import MemoryBudget
+from seek_control import LatencyTracker
+
 log = logging.getLogger(__name__)
 
 
-def main():
+def connect_queue():
+    """Connection to the Postgres database that holds the jobs table."""
+    import psycopg2
+
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL environment variable is required")
+    return psycopg2.connect(DATABASE_URL, sslmode=DATABASE_SSLMODE)
+
+
+def load_videos(args) -> list[str]:
+    """Video URLs from --urls or the config file."""
+    if args.urls:
+        return [u.strip() for u in args.urls.split(",") if u.strip()]
+    if os.path.exists(args.config):
+        with open(args.config) as f:
+            config = json.load(f)
+        return config.get("videos", [])
+    log.error(f"Config file not found: {args.config}")
+    sys.exit(1)
+
+
+def iter_videos(sources: list[str], args):
+    """
+    Video URLs for ``sources``, expanding playlist/channel URLs lazily
+    (deduped against the videos table when DATABASE_URL is set).
+    """
+    if not any(is_collection_url(normalize_url(url)) for url in sources):
+        yield from sources
+        return
+
+    entry_filter = EntryFilter(
+        min_duration=args.min_duration,
+        max_duration=args.max_duration,
+        min_views=args.min_views,
+        categories=tuple(args.category or ()),
+    )
+    if not DATABASE_URL:
+        log.warning("DATABASE_URL not set — playlist entries are not deduped against videos")
+    yield from expand_urls(
+        sources, entry_filter, connect_queue if DATABASE_URL else None, limit=args.playlist_limit
+    )
+
+
+def load_settings(args) -> PipelineSettings:
+    """
+    Pipeline settings from the config file's ``settings`` block (if the
+    file exists), with --profile overriding its variant profiles.
+    """
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config) as f:
+            config = json.load(f).get("settings", {})
+    try:
+        settings = PipelineSettings.from_dict(config)
+    except (TypeError, ValueError) as e:
+        log.error(f"Invalid settings in {args.config}: {e}")
+        sys.exit(1)
+    if args.profile:
+        settings = dataclasses.replace(settings, variant_profiles=tuple(args.profile))
+        try:
+            settings.validate()
+        except ValueError as e:
+            log.error(f"Invalid --profile: {e}")
+            sys.exit(1)
+    log.info(
+        f"Settings: {settings.num_frames} frames, {settings.min_spacing_sec}s spacing, "
+        f"{settings.frame_width}px @ q{settings.webp_quality}, "
+        f"variants: {', '.join(settings.variant_names()) or 'none'}, "
+        f"R2 upload: {'on' if settings.upload_to_r2 else 'off'}"
+    )
+    return settings
+
+
+def iter_jobs(conn, worker_id: str, max_jobs: int, poll_interval: float):
+    """
+    Claim jobs from the shared queue until it is empty (poll_interval 0)
+    or max_jobs have been claimed.
+    """
+    from job_queue import claim
+
+    claimed = 0
+    while not max_jobs or claimed < max_jobs:
+        job = claim(conn, worker_id)
+        if job is None:
+            if poll_interval <= 0:
+                return
+            time.sleep(poll_interval)
+            continue
+        claimed += 1
+        yield job
+
+
+def run_worker(
+    args,
+    budget: MemoryBudget,
+    latency: LatencyTracker,
+    results: dict,
+    pool=None,
+    settings: PipelineSettings | None = None,
+) -> int:
+    """
+    Process videos pulled from the jobs table. Returns the job count.
+    Each job publishes its catalog entry as soon as it is done, so a
+    long-polling or killed worker never sits on unpublished videos.
+    """
+    from job_queue import Heartbeat, complete, default_worker_id, fail
+
+    worker_id = args.worker_id or default_worker_id()
+    conn = connect_queue()
+    processed = 0
+    log.info(f"Worker {worker_id} pulling from the jobs queue...")
+
+    try:
+        for job in iter_jobs(conn, worker_id, args.max_jobs, args.poll_interval):
+            processed += 1
+            url = job["url"]
+            log.info(f"\n{'='*60}")
+            log.info(f"Job {job['id']} (attempt {job['attempts']}): {url}")
+            log.info(f"{'='*60}")
+
+            cancel = threading.Event()
+            with Heartbeat(connect_queue, job["id"], worker_id, cancel=cancel):
+                try:
+                    entries = process_video(
+                        url, budget=budget, atlases=args.atlas,
+                        update_catalog_index=True, latency=latency,
+                        snap=args.snap_keyframes, pool=pool, settings=settings,
+                        cancel=cancel,
+                    )
+                except Exception as e:
+                    log.error(f"Failed to process {url}: {e}")
+                    status = fail(conn, job["id"], worker_id, str(e))
+                    log.info(f"  Job {job['id']} → {status or 'lease lost'}")
+                    results["failed"].append({"url": url, "error": str(e)})
+                    continue
+
+            if not complete(conn, job["id"], worker_id, {"catalog": entries}):
+                log.warning(f"  Job {job['id']} finished after its lease was lost")
+            results["success"].append(url)
+    finally:
+        conn.close()
+
+    return processed
+
+
+def main(argv: list[str] | None = None):
+    setup_logging()
     parser = argparse.ArgumentParser(description="Batch YouTube heatmap frame extractor")
     parser.add_argument(
         "--config", default="videos.json", help="Path to config JSON file"
@@ -32,48 +200,158 @@ def main():
     parser.add_argument(
         "--urls", default=None, help="Comma-separated YouTube URLs (overrides config)"
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--max-rss-mb", type=int, default=MAX_RSS_MB,
+        help="Peak-RSS budget for the whole batch in MB (0 = unbounded)",
+    )
+    parser.add_argument(
+        "--spill-dir", default=SPILL_DIR,
+        help="Disk-backed work directory used when /tmp is tmpfs",
+    )
+    parser.add_argument(
+        "--trace-memory", action="store_true",
+        help="Report Python heap usage via tracemalloc",
+    )
+    parser.add_argument(
+        "--atlas", action="store_true", default=GENERATE_ATLASES,
+        help="Also pack pixel-reveal and fragment variants into sprite atlases",
+    )
+    parser.add_argument(
+        "--snap-keyframes", action="store_true", default=SNAP_KEYFRAMES,
+        help="Move moments onto the nearest keyframe for cheaper seeks",
+    )
+    parser.add_argument(
+        "--profile", action="append", choices=sorted(VARIANT_PROFILES), default=None,
+        help="Variant profile to render (repeatable; overrides settings.variant_profiles)",
+    )
+    parser.add_argument(
+        "--variant-workers", type=int, default=VARIANT_WORKERS,
+        help="Render variants in N processes via shared memory (default: in-process)",
+    )
+    parser.add_argument(
+        "--min-duration", type=float, default=MIN_DURATION_SEC,
+        help="Skip playlist/channel entries shorter than this (s)",
+    )
+    parser.add_argument(
+        "--max-duration", type=float, default=None,
+        help="Skip playlist/channel entries longer than this (s)",
+    )
+    parser.add_argument(
+        "--min-views", type=int, default=None,
+        help="Skip playlist/channel entries with fewer views",
+    )
+    parser.add_argument(
+        "--category", action="append", default=None,
+        help="Keep only playlist/channel entries in this category (repeatable)",
+    )
+    parser.add_argument(
+        "--playlist-limit", type=int, default=None,
+        help="List at most this many entries per playlist/channel",
+    )
+    parser.add_argument(
+        "--enqueue", action="store_true",
+        help="Add the videos to the shared jobs queue instead of processing them",
+    )
+    parser.add_argument(
+        "--worker", action="store_true",
+        help="Pull videos from the shared jobs queue",
+    )
+    parser.add_argument(
+        "--worker-id", default=None, help="Worker name (default: hostname:pid)"
+    )
+    parser.add_argument(
+        "--max-jobs", type=int, default=0,
+        help="Stop after this many jobs in worker mode (0 = no limit)",
+    )
+    parser.add_argument(
+        "--poll-interval", type=float, default=0,
+        help="Seconds between polls of an empty queue (0 = exit when empty)",
+    )
+    args = parser.parse_args(argv)
 
-    # Determine video list
-    if args.urls:
-        videos = [u.strip() for u in args.urls.split(",") if u.strip()]
-    elif os.path.exists(args.config):
-        with open(args.config) as f:
-            config = json.load(f)
-        videos = config.get("videos", [])
-    else:
-        log.error(f"Config file not found: {args.config}")
-        sys.exit(1)
+    if args.enqueue:
+        from job_queue import enqueue
 
-    if not videos:
+        videos = list(iter_videos(load_videos(args), args))
+        conn = connect_queue()
+        try:
+            created = enqueue(conn, videos)
+        finally:
+            conn.close()
+        log.info(f"Enqueued {created} of {len(videos)} video(s)")
+        return
+
+    sources = [] if args.worker else load_videos(args)
+    settings = load_settings(args)
+    if not args.worker and not sources:
         log.warning("No videos to process")
         sys.exit(0)
 
-    log.info(f"Processing {len(videos)} video(s)...")
+    if not args.worker:
+        log.info(f"Processing {len(sources)} source(s)...")
     start_time = time.time()
 
+    # Batches process one video and one frame at a time, so the budget's
+    # in-flight limit stays at 1 (worker_daemon raises it to its concurrency)
+    budget = MemoryBudget(
+        limit_mb=args.max_rss_mb,
+        spill_dir=args.spill_dir,
+        trace=args.trace_memory,
+    )
+    latency = LatencyTracker()
     results = {"success": [], "failed": []}
+    catalog_entries = {}
 
-    for i, url in enumerate(videos, 1):
-        log.info(f"\n{'='*60}")
-        log.info(f"Video {i}/{len(videos)}: {url}")
-        log.info(f"{'='*60}")
+    with variant_pool(args.variant_workers) as pool:
+        if args.worker:
+            total = run_worker(args, budget, latency, results, pool=pool, settings=settings)
+        else:
+            total = 0
 
+        # Playlist/channel entries stream in while earlier videos process.
+        # A listing failure ends the loop but not the batch: what was
+        # processed still goes into the catalog and the summary.
         try:
-            process_video(url)
-            results["success"].append(url)
+            for i, url in enumerate(iter_videos(sources, args), 1):
+                total = i
+                log.info(f"\n{'='*60}")
+                log.info(f"Video {i}: {url}")
+                log.info(f"{'='*60}")
+
+                try:
+                    catalog_entries.update(
+                        process_video(
+                            url, budget=budget, atlases=args.atlas,
+                            update_catalog_index=False, latency=latency,
+                            snap=args.snap_keyframes, pool=pool, settings=settings,
+                        )
+                    )
+                    results["success"].append(url)
+                except Exception as e:
+                    log.error(f"Failed to process {url}: {e}")
+                    results["failed"].append({"url": url, "error": str(e)})
+        except Exception as e:
+            log.error(f"Listing sources failed: {e}")
+            results["failed"].append({"url": "(sources)", "error": f"{type(e).__name__}: {e}"})
+
+    # Roll all new manifests into the catalog index in one write
+    if catalog_entries:
+        try:
+            update_catalog(get_r2_client(), R2_BUCKET, catalog_entries)
         except Exception as e:
-            log.error(f"Failed to process {url}: {e}")
-            results["failed"].append({"url": url, "error": str(e)})
+            log.error(f"Failed to update catalog index: {e}")
+            results["failed"].append({"url": "catalog/index.json", "error": str(e)})
 
     # Summary
     elapsed = time.time() - start_time
     log.info(f"\n{'='*60}")
     log.info("BATCH SUMMARY")
-    log.info(f"  Total:   {len(videos)}")
+    log.info(f"  Total:   {total}")
     log.info(f"  Success: {len(results['success'])}")
     log.info(f"  Failed:  {len(results['failed'])}")
-    log.info(f"  Time:    {elapsed:.1f}s ({elapsed/len(videos):.1f}s/video)")
+    log.info(f"  Time:    {elapsed:.1f}s ({elapsed/max(total, 1):.1f}s/video)")
+    log.info(f"  Memory:  {budget.summary()}")
+    log.info(f"  Seeks:   {latency.summary()}")
 
     for fail in results["failed"]:
         log.error(f"  FAILED: {fail['url']}: {fail['error'][:200]}")
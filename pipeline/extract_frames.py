@@ -8,44 +8,76 @@ uploads to Cloudflare R2, and catalogs in Neon (PostgreSQL).
 
 Usage:
     python extract_frames.py <youtube_url_or_id>
+    python cli.py process <youtube_url_or_id>   # same, via the pipeline CLI
 
     # Or via environment variable:
     VIDEO_URL=https://www.youtube.com/watch?v=dQw4w9WgXcQ python extract_frames.py
 
 Environment:
     DATABASE_URL    Neon PostgreSQL connection string
+    DATABASE_SSLMODE  libpq sslmode (default: require; "disable" for local
+                      test databases)
     R2_ENDPOINT     Cloudflare R2 endpoint URL
     R2_ACCESS_KEY   R2 access key ID
     R2_SECRET_KEY   R2 secret access key
     R2_BUCKET       R2 bucket name (default: framedle-content)
+    MAX_RSS_MB      Peak-RSS budget in MB (default: 0 = unbounded)
+    SPILL_DIR       Disk-backed work dir used when /tmp is tmpfs and a
+                    memory budget is set
+    GENERATE_ATLASES  Set to 1 to also pack px*/frag_* variants into
+                      sprite atlases
+    HEATMAP_STORAGE   compact (default), both, or json — see heatmap_codec.py
+    QUALITY_GATE      Set to 0 to keep dark/blurred/duplicate frames
+    SEEK_HEDGING      Set to 0 to disable hedged duplicate frame requests
+                      (always off when a memory budget is set)
+    SNAP_KEYFRAMES    Set to 1 to move moments onto the nearest keyframe
+                      (within KEYFRAME_TOLERANCE_SEC, default 1.0)
+    VARIANT_WORKERS   Render variants in this many processes, handing
+                      frames over via shared memory (default: in-process)
+    SCENE_DETECT      Set to 0 to use evenly spaced frames (instead of proxy
+                      scene detection) for videos without a heatmap
+    IMMUTABLE_KEYS    Set to 1 to upload frames under content-hashed keys
+                      cached for a year (old objects: see r2_gc.py)
 """
 
+import contextlib
+import hashlib
+import importlib.util
 import os
+import re
 import sys
 import json
 import subprocess
 import tempfile
+import threading
+import time
 import logging
+from dataclasses import dataclass, field
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 
-import psycopg2
-from psycopg2.extras import Json
-from yt_dlp import YoutubeDL
+from atlas import generate_atlases
+from frame_share import render_variants_shared, variant_pool
+from heatmap_codec import heatmap_db_params
+from keyframes import probe_keyframes, snap_moments
+from manifest import build_manifest, catalog_entry, update_catalog, upload_manifest
+from memory_budget import MemoryBudget, frame_reserve_bytes
+from quality_gate import QualityGate
+from scene_detect import SceneDetectionError, get_proxy_video_url, synthetic_heatmap
+from seek_control import LatencyTracker, SeekController
+
+log = logging.getLogger(__name__)
+
+# Heavy backends (yt-dlp, psycopg2, boto3, Pillow) are imported lazily by
+# the stages that use them, so light commands and workers that never reach
+# a stage don't pay its import cost.
 
 # Optional: R2 upload via boto3
-try:
-    import boto3
-    HAS_BOTO3 = True
-except ImportError:
-    HAS_BOTO3 = False
+HAS_BOTO3 = importlib.util.find_spec("boto3") is not None
 
 # Optional: WebP/variant generation via Pillow
-try:
-    from PIL import Image
-    HAS_PILLOW = True
-except ImportError:
-    HAS_PILLOW = False
+HAS_PILLOW = importlib.util.find_spec("PIL") is not None
 
 # ---------------------------------------------------------------------------
 # Config
@@ -56,11 +88,35 @@ FRAME_WIDTH = 1280            # resize width (keep aspect ratio)
 WEBP_QUALITY = 80             # WebP quality (1-100)
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
+DATABASE_SSLMODE = os.environ.get("DATABASE_SSLMODE", "require")
 VIDEO_URL = os.environ.get("VIDEO_URL")
 R2_ENDPOINT = os.environ.get("R2_ENDPOINT")
 R2_ACCESS_KEY = os.environ.get("R2_ACCESS_KEY")
 R2_SECRET_KEY = os.environ.get("R2_SECRET_KEY")
 R2_BUCKET = os.environ.get("R2_BUCKET", "framedle-content")
+MAX_RSS_MB = int(os.environ.get("MAX_RSS_MB", "0"))
+SPILL_DIR = os.environ.get("SPILL_DIR")
+GENERATE_ATLASES = os.environ.get("GENERATE_ATLASES") == "1"
+QUALITY_GATE = os.environ.get("QUALITY_GATE", "1") != "0"
+MAX_GATE_REJECTIONS = 12      # stop replacing frames after this many rejects
+SEEK_HEDGING = os.environ.get("SEEK_HEDGING", "1") != "0"
+SNAP_KEYFRAMES = os.environ.get("SNAP_KEYFRAMES") == "1"
+VARIANT_WORKERS = int(os.environ.get("VARIANT_WORKERS", "0"))
+SCENE_DETECT = os.environ.get("SCENE_DETECT", "1") != "0"
+KEYFRAME_TOLERANCE_SEC = float(os.environ.get("KEYFRAME_TOLERANCE_SEC", "1.0"))
+IMMUTABLE_KEYS = os.environ.get("IMMUTABLE_KEYS") == "1"
+
+FRAME_CACHE_CONTROL = "public, max-age=86400"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+YDL_OPTS = {
+    "quiet": True,
+    "no_warnings": True,
+    "skip_download": True,
+    "extractor_args": {"youtube": {"player_client": ["web"]}},
+    "remote_components": {"ejs": "github"},
+}
+DB_PING_AFTER_SEC = 30        # re-check a warm DB connection idle this long
 
 # Variant definitions for each frame
 VARIANTS = {
@@ -79,11 +135,89 @@ VARIANTS = {
     "frag_br":  {"fragment": "br", "description": "Bottom-right quadrant"},
 }
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
-log = logging.getLogger(__name__)
+# Variants each game mode needs (names match the game_mode enum). A batch
+# renders and uploads the union of its profiles; "all" keeps every variant
+# and "none" uploads masters only (see variant_server.py for on-demand).
+VARIANT_PROFILES = {
+    "all":            list(VARIANTS),
+    "none":           [],
+    "thumbnail":      ["thumb"],
+    "daily_frame":    ["thumb", "crop_25", "crop_50", "desat"],
+    "pixel_reveal":   ["thumb", "px8", "px16", "px32", "px64", "px128"],
+    "fragment_match": ["thumb", "frag_tl", "frag_tr", "frag_bl", "frag_br"],
+}
+
+
+@dataclass(frozen=True)
+class PipelineSettings:
+    """
+    Per-run pipeline settings, e.g. the ``settings`` block of videos.json.
+    Defaults are the module constants above.
+    """
+
+    num_frames: int = NUM_FRAMES
+    min_spacing_sec: float = MIN_SPACING_SEC
+    frame_width: int = FRAME_WIDTH
+    webp_quality: int = WEBP_QUALITY
+    generate_variants: bool = True
+    upload_to_r2: bool = True
+    immutable_keys: bool = IMMUTABLE_KEYS
+    variant_profiles: tuple[str, ...] = field(default=("all",))
+
+    @classmethod
+    def from_dict(cls, config: dict) -> "PipelineSettings":
+        """Validate a settings block; unknown keys are ignored with a warning."""
+        config = dict(config)
+        output_format = config.pop("output_format", "webp")
+        if output_format != "webp":
+            raise ValueError(f"Unsupported output_format {output_format!r} (only webp)")
+        known = {f: config.pop(f) for f in cls.__dataclass_fields__ if f in config}
+        if config:
+            log.warning(f"Ignoring unknown settings: {', '.join(sorted(config))}")
+        if "variant_profiles" in known:
+            profiles = known["variant_profiles"]
+            known["variant_profiles"] = (profiles,) if isinstance(profiles, str) else tuple(profiles)
+        settings = cls(**known)
+        settings.validate()
+        return settings
+
+    def validate(self):
+        # JSON configs can carry "false" or "6"; don't let truthy strings through.
+        for name in ("generate_variants", "upload_to_r2", "immutable_keys"):
+            if not isinstance(getattr(self, name), bool):
+                raise ValueError(f"{name} must be true or false, not {getattr(self, name)!r}")
+        for name in ("num_frames", "frame_width", "webp_quality"):
+            value = getattr(self, name)
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise ValueError(f"{name} must be a whole number, not {value!r}")
+        if isinstance(self.min_spacing_sec, bool) or not isinstance(self.min_spacing_sec, (int, float)):
+            raise ValueError(f"min_spacing_sec must be a number, not {self.min_spacing_sec!r}")
+        unknown = [p for p in self.variant_profiles if p not in VARIANT_PROFILES]
+        if unknown:
+            raise ValueError(
+                f"Unknown variant profile(s) {unknown}; choose from {sorted(VARIANT_PROFILES)}"
+            )
+        if self.num_frames < 1:
+            raise ValueError("num_frames must be at least 1")
+        if not 1 <= self.webp_quality <= 100:
+            raise ValueError("webp_quality must be between 1 and 100")
+        if self.frame_width < 16:
+            raise ValueError("frame_width must be at least 16")
+
+    def variant_names(self) -> list[str]:
+        """Variants to render, in VARIANTS order ([] when variants are off)."""
+        if not self.generate_variants:
+            return []
+        wanted = {name for p in self.variant_profiles for name in VARIANT_PROFILES[p]}
+        return [name for name in VARIANTS if name in wanted]
+
+
+def setup_logging():
+    """Configure log output for command-line entry points."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -94,17 +228,14 @@ def get_video_info(url: str) -> dict:
     Uses yt-dlp Python API to extract video metadata including heatmap.
     No video download is performed — only metadata extraction.
     """
-    ydl_opts = {
-        "quiet": True,
-        "no_warnings": True,
-        "skip_download": True,
-        "extractor_args": {"youtube": {"player_client": ["web"]}},
-        "remote_components": {"ejs": "github"},
-    }
-
     log.info(f"Extracting metadata for: {url}")
-    with YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=False)
+    if _warm is not None:
+        info = _warm.youtube_dl().extract_info(url, download=False)
+    else:
+        from yt_dlp import YoutubeDL
+
+        with YoutubeDL(YDL_OPTS) as ydl:
+            info = ydl.extract_info(url, download=False)
 
     if not info:
         raise RuntimeError("Failed to extract video info")
@@ -120,10 +251,13 @@ def find_top_moments(
     duration: float,
     n: int = NUM_FRAMES,
     min_spacing: float = MIN_SPACING_SEC,
+    exclude: list[float] | None = None,
 ) -> list[dict]:
     """
     Greedy peak selection: pick highest heat value, exclude nearby
     timestamps (min_spacing), repeat until we have enough peaks.
+    Timestamps in ``exclude`` (e.g. frames rejected by the quality gate)
+    are never selected, so the next candidate peak takes their place.
     """
     if not heatmap:
         raise ValueError("Heatmap data is empty or unavailable for this video")
@@ -138,6 +272,9 @@ def find_top_moments(
         mid_time = (segment["start_time"] + segment["end_time"]) / 2
         mid_time = max(0.5, min(mid_time, duration - 0.5))
 
+        if exclude and any(abs(mid_time - t) < 1e-6 for t in exclude):
+            continue
+
         too_close = any(
             abs(mid_time - sel["timestamp"]) < min_spacing for sel in selected
         )
@@ -166,19 +303,42 @@ def find_top_moments(
 # ---------------------------------------------------------------------------
 # 3. Extract frames using ffmpeg
 # ---------------------------------------------------------------------------
-def extract_frame(video_url: str, timestamp: float, output_path: str) -> str:
-    """Extract a single frame at the given timestamp using ffmpeg."""
-    cmd = [
+def ffmpeg_frame_cmd(
+    video_url: str,
+    timestamp: float,
+    output_path: str,
+    extra_args: list[str] | None = None,
+    frame_width: int = FRAME_WIDTH,
+    quality: int = WEBP_QUALITY,
+) -> list[str]:
+    """ffmpeg argv capturing the frame at ``timestamp`` as WebP."""
+    return [
         "ffmpeg",
+        *(extra_args or []),
         "-ss", str(timestamp),
         "-i", video_url,
         "-vframes", "1",
-        "-vf", f"scale={FRAME_WIDTH}:-1",
-        "-quality", str(WEBP_QUALITY),
+        "-vf", f"scale={frame_width}:-1",
+        "-quality", str(quality),
         "-y",
         output_path,
     ]
 
+
+def extract_frame(
+    video_url: str,
+    timestamp: float,
+    output_path: str,
+    extra_args: list[str] | None = None,
+    settings: PipelineSettings | None = None,
+) -> str:
+    """Extract a single frame at the given timestamp using ffmpeg."""
+    settings = settings or PipelineSettings()
+    cmd = ffmpeg_frame_cmd(
+        video_url, timestamp, output_path, extra_args,
+        frame_width=settings.frame_width, quality=settings.webp_quality,
+    )
+
     log.info(f"Extracting frame at {timestamp:.1f}s → {output_path}")
     result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
 
@@ -236,101 +396,296 @@ def get_frame_dimensions(filepath: str) -> dict:
 # ---------------------------------------------------------------------------
 # 4. Generate image variants
 # ---------------------------------------------------------------------------
-def generate_variants(frame_path: str, video_id: str, rank: int, work_dir: str) -> dict:
+def generate_variants(
+    frame_path: str,
+    video_id: str,
+    rank: int,
+    work_dir: str,
+    pool=None,
+    settings: PipelineSettings | None = None,
+) -> dict:
     """
-    Generate all image variants for a frame using Pillow.
+    Generate the image variants for a frame using Pillow — all of VARIANTS,
+    or those selected by ``settings`` (profiles / generate_variants).
     Returns a dict of variant_name → local file path.
+    With a process ``pool`` (see frame_share.variant_pool), variants are
+    rendered in parallel from a shared-memory copy of the decoded frame.
     """
+    settings = settings or PipelineSettings()
+    names = settings.variant_names()
+    if not names:
+        return {}
     if not HAS_PILLOW:
         log.warning("Pillow not installed — skipping variant generation")
         return {}
 
-    img = Image.open(frame_path)
+    if pool is not None:
+        variant_paths = render_variants_shared(frame_path, rank, work_dir, pool, names, settings)
+    else:
+        from PIL import Image
+
+        with Image.open(frame_path) as img:
+            img.load()
+            variant_paths = _render_variants(img, rank, work_dir, names, settings)
+
+    log.info(f"  Generated {len(variant_paths)} variants for frame rank {rank}")
+    return variant_paths
+
+
+def render_variant(img, spec: dict, frame_width: int = FRAME_WIDTH):
+    """
+    Apply one variant spec (see VARIANTS) to an opened frame and return the
+    new image, or None for an unknown spec. Crops and pixelations are scaled
+    back up to ``frame_width``. Intermediates are closed here; the caller
+    owns (and closes) the result.
+    """
+    from PIL import Image
+
     w, h = img.size
-    variant_paths = {}
 
-    for name, spec in VARIANTS.items():
-        out_path = os.path.join(work_dir, f"f{rank:02d}_{name}.webp")
+    if "width" in spec:
+        # Thumbnail: resize to target width
+        ratio = spec["width"] / w
+        new_size = (spec["width"], int(h * ratio))
+        return img.resize(new_size, Image.LANCZOS)
+
+    if "crop" in spec:
+        # Center crop: keep inner N% of the image
+        pct = spec["crop"]
+        crop_w = int(w * pct)
+        crop_h = int(h * pct)
+        left = (w - crop_w) // 2
+        top = (h - crop_h) // 2
+        cropped = img.crop((left, top, left + crop_w, top + crop_h))
+        # Scale back up to full width for display
+        variant = cropped.resize((frame_width, int(frame_width * crop_h / crop_w)), Image.LANCZOS)
+        cropped.close()
+        return variant
+
+    if spec.get("desaturate"):
+        # Convert to grayscale then back to RGB
+        gray = img.convert("L")
+        variant = gray.convert("RGB")
+        gray.close()
+        return variant
+
+    if "pixelate" in spec:
+        # Downscale to NxN then upscale back (nearest neighbor for blocky look)
+        px = spec["pixelate"]
+        small = img.resize((px, px), Image.BILINEAR)
+        variant = small.resize((frame_width, int(frame_width * h / w)), Image.NEAREST)
+        small.close()
+        return variant
+
+    if "fragment" in spec:
+        # Quadrant crop
+        frag = spec["fragment"]
+        half_w, half_h = w // 2, h // 2
+        boxes = {
+            "tl": (0, 0, half_w, half_h),
+            "tr": (half_w, 0, w, half_h),
+            "bl": (0, half_h, half_w, h),
+            "br": (half_w, half_h, w, h),
+        }
+        return img.crop(boxes[frag])
 
-        if "width" in spec:
-            # Thumbnail: resize to target width
-            ratio = spec["width"] / w
-            new_size = (spec["width"], int(h * ratio))
-            variant = img.resize(new_size, Image.LANCZOS)
-
-        elif "crop" in spec:
-            # Center crop: keep inner N% of the image
-            pct = spec["crop"]
-            crop_w = int(w * pct)
-            crop_h = int(h * pct)
-            left = (w - crop_w) // 2
-            top = (h - crop_h) // 2
-            variant = img.crop((left, top, left + crop_w, top + crop_h))
-            # Scale back up to full width for display
-            variant = variant.resize((FRAME_WIDTH, int(FRAME_WIDTH * crop_h / crop_w)), Image.LANCZOS)
-
-        elif spec.get("desaturate"):
-            # Convert to grayscale then back to RGB
-            variant = img.convert("L").convert("RGB")
-
-        elif "pixelate" in spec:
-            # Downscale to NxN then upscale back (nearest neighbor for blocky look)
-            px = spec["pixelate"]
-            small = img.resize((px, px), Image.BILINEAR)
-            variant = small.resize((FRAME_WIDTH, int(FRAME_WIDTH * h / w)), Image.NEAREST)
-
-        elif "fragment" in spec:
-            # Quadrant crop
-            frag = spec["fragment"]
-            half_w, half_h = w // 2, h // 2
-            boxes = {
-                "tl": (0, 0, half_w, half_h),
-                "tr": (half_w, 0, w, half_h),
-                "bl": (0, half_h, half_w, h),
-                "br": (half_w, half_h, w, h),
-            }
-            variant = img.crop(boxes[frag])
-        else:
-            continue
+    return None
+
+
+def _render_variants(
+    img,
+    rank: int,
+    work_dir: str,
+    names: list[str] | None = None,
+    settings: PipelineSettings | None = None,
+) -> dict:
+    """
+    Render every variant (or just ``names``) of an opened frame to disk.
+    Each variant is closed as soon as it has been written so only the
+    source frame and one variant are alive at a time.
+    """
+    settings = settings or PipelineSettings()
+    variant_paths = {}
 
-        variant.save(out_path, "WEBP", quality=WEBP_QUALITY)
+    for name in VARIANTS if names is None else names:
+        variant = render_variant(img, VARIANTS[name], settings.frame_width)
+        if variant is None:
+            continue
+        out_path = os.path.join(work_dir, f"f{rank:02d}_{name}.webp")
+        variant.save(out_path, "WEBP", quality=settings.webp_quality)
+        variant.close()
         variant_paths[name] = out_path
 
-    log.info(f"  Generated {len(variant_paths)} variants for frame rank {rank}")
     return variant_paths
 
 
+def _seek_params(moment: dict, budget: MemoryBudget) -> tuple[float, list[str]]:
+    """Seek timestamp and ffmpeg args for a moment; snapped moments skip accurate seek."""
+    extra_args = budget.ffmpeg_args()
+    if moment.get("snapped"):
+        return moment["seek_timestamp"], ["-noaccurate_seek"] + extra_args
+    return moment["timestamp"], extra_args
+
+
+def capture_moments(
+    video_url: str,
+    heatmap: list[dict],
+    duration: float,
+    work_dir: str,
+    gate: QualityGate | None = None,
+    budget: MemoryBudget | None = None,
+    seeker: SeekController | None = None,
+    snap: bool = False,
+    settings: PipelineSettings | None = None,
+) -> list[dict]:
+    """
+    Select the top moments and capture their frames. Frames rejected by the
+    quality gate are discarded and replaced by the next candidate peak
+    before any variants are generated. With a seeker, captures go through
+    its adaptive timeouts, hedging and retries instead of extract_frame.
+    With ``snap``, moments are moved onto nearby keyframes first (see
+    keyframes.py). Returns ranked moments with ``filepath`` set to f{rank}.webp.
+    """
+    budget = budget or MemoryBudget()
+    settings = settings or PipelineSettings()
+    if gate is not None and not gate.available:
+        log.warning("NumPy/Pillow not installed — skipping frame quality gate")
+        gate = None
+
+    rejected: list[float] = []         # heatmap timestamps excluded from selection
+    captured: dict[float, str] = {}   # capture timestamp → candidate frame path
+    keyframes: set[float] = set()
+    probed: set[float] = set()
+    attempts = 0
+
+    while True:
+        moments = find_top_moments(
+            heatmap, duration, n=settings.num_frames,
+            min_spacing=settings.min_spacing_sec, exclude=rejected,
+        )
+        if snap:
+            unprobed = [m["timestamp"] for m in moments if m["timestamp"] not in probed]
+            if unprobed:
+                probe_url = seeker.video_url if seeker else video_url
+                keyframes.update(
+                    probe_keyframes(probe_url, unprobed, KEYFRAME_TOLERANCE_SEC)
+                )
+                probed.update(unprobed)
+            snap_moments(
+                moments, sorted(keyframes), duration, settings.min_spacing_sec,
+                KEYFRAME_TOLERANCE_SEC,
+            )
+        if gate is not None:
+            gate.reset()
+
+        retry = False
+        for moment in moments:
+            ts = moment["timestamp"]
+            if ts not in captured:
+                attempts += 1
+                path = os.path.join(work_dir, f"candidate_{attempts:03d}.webp")
+                seek_ts, extra_args = _seek_params(moment, budget)
+                with budget.frame_slot(
+                    f"candidate {ts:.1f}s", frame_reserve_bytes(settings.frame_width)
+                ):
+                    if seeker:
+                        seeker.extract(seek_ts, path, extra_args=extra_args)
+                    else:
+                        extract_frame(
+                            video_url, seek_ts, path, extra_args=extra_args, settings=settings
+                        )
+                captured[ts] = path
+
+            if gate is None or len(rejected) >= MAX_GATE_REJECTIONS:
+                continue
+            accepted, reason, _ = gate.check(captured[ts])
+            if not accepted:
+                log.info(f"  Rejected frame at {ts:.1f}s: {reason}")
+                rejected.append(moment.get("heatmap_timestamp", ts))
+                os.remove(captured.pop(ts))
+                retry = True
+                break
+
+        if not retry:
+            break
+
+    if len(rejected) >= MAX_GATE_REJECTIONS:
+        log.warning(f"  Quality gate gave up after {len(rejected)} rejected frames")
+
+    for moment in moments:
+        final_path = os.path.join(work_dir, f"f{moment['rank']:02d}.webp")
+        os.replace(captured.pop(moment["timestamp"]), final_path)
+        moment["filepath"] = final_path
+
+    # Candidates captured on an earlier pass but no longer selected
+    for leftover in captured.values():
+        os.remove(leftover)
+
+    return moments
+
+
 def extract_all_frames(
-    video_url: str, moments: list[dict], video_id: str, work_dir: str
+    video_url: str,
+    moments: list[dict],
+    video_id: str,
+    work_dir: str,
+    budget: MemoryBudget | None = None,
+    atlases: bool = False,
+    seeker: SeekController | None = None,
+    pool=None,
+    settings: PipelineSettings | None = None,
 ) -> list[dict]:
     """
     Extract WebP frames for all selected moments and generate variants.
     Returns moments enriched with file paths and variant info.
+    When a memory budget is given, each frame runs inside one of its slots
+    and a frame that would not fit fails with MemoryBudgetExceeded.
+    With ``atlases``, related variants are also packed into sprite sheets.
+    Moments that already carry a ``filepath`` (see capture_moments) are
+    not captured again. ``pool`` renders variants in worker processes;
+    ``settings`` picks which variants are rendered.
     """
+    budget = budget or MemoryBudget()
+    settings = settings or PipelineSettings()
+    reserve = frame_reserve_bytes(settings.frame_width)
+
     for moment in moments:
         rank = moment["rank"]
         filename = f"f{rank:02d}.webp"
-        filepath = os.path.join(work_dir, filename)
-
-        extract_frame(video_url, moment["timestamp"], filepath)
-
-        # Read file info
-        with open(filepath, "rb") as f:
-            image_data = f.read()
-
-        dims = get_frame_dimensions(filepath)
-        moment["filepath"] = filepath
-        moment["file_size"] = len(image_data)
-        moment["width"] = dims["width"]
-        moment["height"] = dims["height"]
-
-        log.info(
-            f"  Frame rank {rank}: {dims['width']}x{dims['height']}, "
-            f"{len(image_data) / 1024:.0f} KB"
-        )
+        filepath = moment.get("filepath") or os.path.join(work_dir, filename)
+
+        with budget.frame_slot(f"{video_id} f{rank:02d}", reserve):
+            if not os.path.exists(filepath):
+                seek_ts, extra_args = _seek_params(moment, budget)
+                if seeker:
+                    seeker.extract(seek_ts, filepath, extra_args=extra_args)
+                else:
+                    extract_frame(
+                        video_url, seek_ts, filepath, extra_args=extra_args, settings=settings
+                    )
+
+            # Read file info
+            file_size = os.path.getsize(filepath)
+
+            dims = get_frame_dimensions(filepath)
+            moment["filepath"] = filepath
+            moment["file_size"] = file_size
+            moment["width"] = dims["width"]
+            moment["height"] = dims["height"]
+
+            log.info(
+                f"  Frame rank {rank}: {dims['width']}x{dims['height']}, "
+                f"{file_size / 1024:.0f} KB"
+            )
 
-        # Generate variants
-        moment["variant_paths"] = generate_variants(filepath, video_id, rank, work_dir)
+            # Generate variants
+            moment["variant_paths"] = generate_variants(
+                filepath, video_id, rank, work_dir, pool=pool, settings=settings
+            )
+            if atlases:
+                moment["atlases"] = generate_atlases(
+                    filepath, moment["variant_paths"], rank, work_dir
+                )
 
     return moments
 
@@ -339,6 +694,13 @@ def extract_all_frames(
 # 5. Upload to Cloudflare R2
 # ---------------------------------------------------------------------------
 def get_r2_client():
+    """boto3 S3 client for R2: the warm shared client in daemon mode, else a new one."""
+    if _warm is not None:
+        return _warm.r2_client()
+    return create_r2_client()
+
+
+def create_r2_client():
     """Create boto3 S3 client configured for Cloudflare R2."""
     if not HAS_BOTO3:
         log.warning("boto3 not installed — skipping R2 upload")
@@ -348,6 +710,8 @@ def get_r2_client():
         log.warning("R2 credentials not configured — skipping R2 upload")
         return None
 
+    import boto3
+
     return boto3.client(
         "s3",
         endpoint_url=R2_ENDPOINT,
@@ -357,47 +721,74 @@ def get_r2_client():
     )
 
 
-def upload_to_r2(s3_client, video_id: str, moments: list[dict]) -> dict:
+def content_key(stem: str, path: str) -> str:
+    """``{stem}.{hash}.webp`` — the key changes whenever the file's bytes do."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"{stem}.{digest.hexdigest()[:12]}.webp"
+
+
+def upload_to_r2(s3_client, video_id: str, moments: list[dict], immutable: bool = False) -> dict:
     """
     Upload all frames and variants to R2.
     Returns a dict mapping frame rank → r2_path and r2_variants.
+
+    With ``immutable`` every object goes to a content-hashed key cached for
+    a year, so reprocessing never changes the bytes behind a URL the CDN
+    holds; superseded objects are removed by r2_gc.py. Otherwise keys are
+    fixed (``f01_px8.webp``) and cached for a day.
     """
     if not s3_client:
         return {}
 
-    upload_results = {}
+    cache_control = IMMUTABLE_CACHE_CONTROL if immutable else FRAME_CACHE_CONTROL
 
-    for moment in moments:
-        rank = moment["rank"]
-        r2_base = f"frames/{video_id}"
-
-        # Upload main frame
-        main_key = f"{r2_base}/f{rank:02d}.webp"
+    def upload(path: str, stem: str) -> str:
+        key = content_key(stem, path) if immutable else f"{stem}.webp"
         s3_client.upload_file(
-            moment["filepath"],
+            path,
             R2_BUCKET,
-            main_key,
+            key,
             ExtraArgs={
                 "ContentType": "image/webp",
-                "CacheControl": "public, max-age=86400",
+                "CacheControl": cache_control,
             },
         )
+        return key
+
+    upload_results = {}
+
+    for moment in moments:
+        rank = moment["rank"]
+        r2_base = f"frames/{video_id}"
+
+        # Upload main frame
+        main_key = upload(moment["filepath"], f"{r2_base}/f{rank:02d}")
         log.info(f"  Uploaded {main_key}")
 
         # Upload variants
         variant_keys = {}
         for variant_name, variant_path in moment.get("variant_paths", {}).items():
-            variant_key = f"{r2_base}/f{rank:02d}_{variant_name}.webp"
-            s3_client.upload_file(
-                variant_path,
-                R2_BUCKET,
-                variant_key,
-                ExtraArgs={
-                    "ContentType": "image/webp",
-                    "CacheControl": "public, max-age=86400",
-                },
+            variant_keys[variant_name] = upload(
+                variant_path, f"{r2_base}/f{rank:02d}_{variant_name}"
             )
-            variant_keys[variant_name] = variant_key
+
+        # Upload sprite atlases (one object per group, coordinates in the map);
+        # an atlas that is the frame itself points at the frame's key
+        atlas_keys = {}
+        for group, atlas in moment.get("atlases", {}).items():
+            if atlas.get("source") == "frame":
+                key = main_key
+            else:
+                key = upload(atlas["path"], f"{r2_base}/f{rank:02d}_atlas_{group}")
+            atlas_keys[group] = {
+                "key": key,
+                **{field: value for field, value in atlas.items() if field != "path"},
+            }
+        if atlas_keys:
+            variant_keys["atlases"] = atlas_keys
 
         upload_results[rank] = {
             "r2_path": main_key,
@@ -417,15 +808,22 @@ def save_to_database(
     moments: list[dict],
     heatmap: list[dict],
     r2_results: dict,
+    timings: dict | None = None,
 ):
     """
     Save video metadata and frame references to Neon PostgreSQL.
-    Stores R2 paths (not image bytes) in the frames table.
+    Stores R2 paths (not image bytes) in the frames table and refreshes the
+    video's video_stats row (behind pipeline_status) in the same
+    transaction. ``timings`` maps stage name → seconds for this run.
     """
     if not DATABASE_URL:
         raise RuntimeError("DATABASE_URL environment variable is required")
 
-    conn = psycopg2.connect(DATABASE_URL, sslmode="require")
+    import psycopg2
+    from psycopg2.extras import Json
+
+    warm = _warm
+    conn = warm.db_connection() if warm else psycopg2.connect(DATABASE_URL, sslmode=DATABASE_SSLMODE)
     cur = conn.cursor()
 
     try:
@@ -436,15 +834,19 @@ def save_to_database(
         if info.get("upload_date"):
             upload_date = datetime.strptime(info["upload_date"], "%Y%m%d").date()
 
+        # Fixed-interval heatmaps are stored as start/step + real[]
+        heatmap_raw, heatmap_start, heatmap_step, heatmap_values = heatmap_db_params(heatmap)
+
         # Upsert video metadata
         cur.execute(
             """
             INSERT INTO videos (
                 video_id, title, channel, channel_id, category,
                 duration, view_count, subscriber_count,
-                upload_date, heatmap_raw, processed_at
+                upload_date, heatmap_raw,
+                heatmap_start, heatmap_step, heatmap_values, processed_at
             )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
             ON CONFLICT (video_id) DO UPDATE SET
                 title = EXCLUDED.title,
                 channel = EXCLUDED.channel,
@@ -454,6 +856,9 @@ def save_to_database(
                 view_count = EXCLUDED.view_count,
                 subscriber_count = EXCLUDED.subscriber_count,
                 heatmap_raw = EXCLUDED.heatmap_raw,
+                heatmap_start = EXCLUDED.heatmap_start,
+                heatmap_step = EXCLUDED.heatmap_step,
+                heatmap_values = EXCLUDED.heatmap_values,
                 processed_at = NOW()
             """,
             (
@@ -466,7 +871,10 @@ def save_to_database(
                 info.get("view_count"),
                 info.get("channel_follower_count"),
                 upload_date,
-                Json(heatmap),
+                Json(heatmap_raw) if heatmap_raw is not None else None,
+                heatmap_start,
+                heatmap_step,
+                heatmap_values,
             ),
         )
 
@@ -499,6 +907,31 @@ def save_to_database(
                 ),
             )
 
+        # Refresh the summary row behind pipeline_status
+        stage_ms = {stage: round(sec * 1000) for stage, sec in (timings or {}).items()}
+        cur.execute(
+            """
+            INSERT INTO video_stats (
+                video_id, frame_count, total_size_bytes,
+                processing_ms, stage_ms, updated_at
+            )
+            SELECT %s, COUNT(*), COALESCE(SUM(file_size), 0), %s, %s, NOW()
+            FROM frames WHERE video_id = %s
+            ON CONFLICT (video_id) DO UPDATE SET
+                frame_count = EXCLUDED.frame_count,
+                total_size_bytes = EXCLUDED.total_size_bytes,
+                processing_ms = EXCLUDED.processing_ms,
+                stage_ms = EXCLUDED.stage_ms,
+                updated_at = NOW()
+            """,
+            (
+                video_id,
+                stage_ms.get("total"),
+                Json(stage_ms) if stage_ms else None,
+                video_id,
+            ),
+        )
+
         conn.commit()
         log.info(
             f"Saved {len(moments)} frames for '{info.get('title')}' "
@@ -506,18 +939,161 @@ def save_to_database(
         )
 
     except Exception:
-        conn.rollback()
+        if not conn.closed:
+            conn.rollback()
         raise
     finally:
         cur.close()
-        conn.close()
+        if warm is None:
+            conn.close()
+        elif conn.closed:
+            warm.discard_db_connection()
+
+
+# ---------------------------------------------------------------------------
+# Warm backends for long-running processes
+# ---------------------------------------------------------------------------
+class JobCancelled(RuntimeError):
+    """process_video was cancelled between stages."""
+
+
+class WarmResources:
+    """
+    Backends a long-running process (worker_daemon.py) keeps open across
+    videos instead of paying their setup per video: one YoutubeDL and one
+    database connection per thread, and one shared (thread-safe) boto3
+    client. Idle DB connections are pinged before reuse and reopened when
+    the server has dropped them.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._r2 = None
+        self._r2_created = False
+        self._open = []           # YoutubeDL instances and DB connections
+
+    def youtube_dl(self):
+        ydl = getattr(self._local, "ydl", None)
+        if ydl is None:
+            from yt_dlp import YoutubeDL
+
+            ydl = self._local.ydl = YoutubeDL(YDL_OPTS)
+            with self._lock:
+                self._open.append(ydl)
+        return ydl
+
+    def r2_client(self):
+        with self._lock:
+            if not self._r2_created:
+                self._r2 = create_r2_client()
+                self._r2_created = True
+            return self._r2
+
+    def db_connection(self):
+        import psycopg2
+
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and not conn.closed:
+            if time.monotonic() - self._local.conn_used < DB_PING_AFTER_SEC:
+                self._local.conn_used = time.monotonic()
+                return conn
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+                self._local.conn_used = time.monotonic()
+                return conn
+            except psycopg2.Error:
+                log.info("  Warm database connection was dropped — reconnecting")
+                self.discard_db_connection()
+
+        if not DATABASE_URL:
+            raise RuntimeError("DATABASE_URL environment variable is required")
+        conn = self._local.conn = psycopg2.connect(DATABASE_URL, sslmode=DATABASE_SSLMODE)
+        self._local.conn_used = time.monotonic()
+        with self._lock:
+            self._open.append(conn)
+        return conn
+
+    def discard_db_connection(self):
+        """Drop this thread's connection (e.g. after the server closed it)."""
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            with self._lock:
+                if conn in self._open:
+                    self._open.remove(conn)
+            with contextlib.suppress(Exception):
+                conn.close()
+
+    def close(self):
+        with self._lock:
+            resources, self._open = self._open, []
+        for resource in resources:
+            with contextlib.suppress(Exception):
+                resource.close()
+
+
+_warm: WarmResources | None = None
+
+
+def enable_warm_resources() -> WarmResources:
+    """Keep backends open across process_video calls in this process."""
+    global _warm
+    if _warm is None:
+        _warm = WarmResources()
+    return _warm
+
+
+def disable_warm_resources():
+    global _warm
+    warm, _warm = _warm, None
+    if warm is not None:
+        warm.close()
+
+
+def _check_cancelled(cancel: threading.Event | None, stage: str):
+    if cancel is not None and cancel.is_set():
+        raise JobCancelled(f"cancelled before {stage}")
 
 
 # ---------------------------------------------------------------------------
 # Main pipeline
 # ---------------------------------------------------------------------------
-def process_video(url: str):
-    """Full pipeline: metadata → heatmap → frames → variants → R2 → DB"""
+def process_video(
+    url: str,
+    budget: MemoryBudget | None = None,
+    atlases: bool | None = None,
+    update_catalog_index: bool = True,
+    latency: LatencyTracker | None = None,
+    snap: bool | None = None,
+    pool=None,
+    settings: PipelineSettings | None = None,
+    cancel: threading.Event | None = None,
+) -> dict:
+    """
+    Full pipeline: metadata → heatmap → frames → variants → R2 → DB → manifest
+    Returns the catalog entries written for this video ({} without R2).
+    Batches pass ``update_catalog_index=False`` and roll the returned
+    entries into catalog/index.json once at the end, and share one
+    LatencyTracker so seek timeouts adapt across videos. ``snap`` moves
+    moments onto keyframes (default: SNAP_KEYFRAMES). ``pool`` is a
+    variant_pool shared across videos; without one, VARIANT_WORKERS
+    processes are started for this video. ``settings`` (e.g. the
+    videos.json settings block) overrides the module defaults. Setting
+    ``cancel`` stops the run with JobCancelled at the next stage boundary
+    (before anything is written to the database).
+    """
+    if budget is None:
+        budget = MemoryBudget(limit_mb=MAX_RSS_MB, spill_dir=SPILL_DIR)
+    if atlases is None:
+        atlases = GENERATE_ATLASES
+    if snap is None:
+        snap = SNAP_KEYFRAMES
+    settings = settings or PipelineSettings()
+    started = time.monotonic()
+    timings = {}
 
     # Step 1: Get video info with heatmap
     info = get_video_info(url)
@@ -529,6 +1105,13 @@ def process_video(url: str):
     log.info(f"Video: {title}")
     log.info(f"Duration: {duration}s | ID: {video_id}")
 
+    if not heatmap and SCENE_DETECT:
+        log.warning("No heatmap data available. Scoring a low-res proxy instead...")
+        try:
+            heatmap = synthetic_heatmap(get_proxy_video_url(info), duration)
+        except SceneDetectionError as e:
+            log.warning(f"  Scene detection failed: {e}")
+
     if not heatmap:
         log.warning(
             "No heatmap data available. "
@@ -536,46 +1119,125 @@ def process_video(url: str):
         )
         heatmap = [
             {
-                "start_time": i * (duration / (NUM_FRAMES + 1)),
-                "end_time": (i + 1) * (duration / (NUM_FRAMES + 1)),
+                "start_time": i * (duration / (settings.num_frames + 1)),
+                "end_time": (i + 1) * (duration / (settings.num_frames + 1)),
                 "value": 1.0 - (i * 0.1),
             }
-            for i in range(1, NUM_FRAMES + 1)
+            for i in range(1, settings.num_frames + 1)
         ]
 
     log.info(f"Heatmap segments: {len(heatmap)}")
 
-    # Step 2: Find top moments
-    moments = find_top_moments(heatmap, duration)
-
-    # Step 3: Extract frames + generate variants
     direct_url = get_best_video_url(info)
+    seeker = SeekController(
+        direct_url,
+        partial(
+            ffmpeg_frame_cmd,
+            frame_width=settings.frame_width, quality=settings.webp_quality,
+        ),
+        refresh_url=lambda: get_best_video_url(get_video_info(url)),
+        tracker=latency,
+        # A hedge is a second ffmpeg inside the same frame slot, which only
+        # reserves memory for one decoder
+        hedge=SEEK_HEDGING and not budget.enabled,
+    )
 
-    with tempfile.TemporaryDirectory(prefix="framedle_") as work_dir:
-        moments = extract_all_frames(direct_url, moments, video_id, work_dir)
+    with contextlib.ExitStack() as stack:
+        work_dir = stack.enter_context(
+            tempfile.TemporaryDirectory(prefix="framedle_", dir=budget.work_dir_root())
+        )
+        if pool is None:
+            pool = stack.enter_context(variant_pool(VARIANT_WORKERS))
+
+        timings["metadata"] = time.monotonic() - started
+
+        # Step 2: Find top moments, replacing frames that fail the quality gate
+        _check_cancelled(cancel, "capture")
+        stage_start = time.monotonic()
+        gate = QualityGate() if QUALITY_GATE else None
+        moments = capture_moments(
+            direct_url, heatmap, duration, work_dir,
+            gate=gate, budget=budget, seeker=seeker, snap=snap, settings=settings,
+        )
+        timings["capture"] = time.monotonic() - stage_start
+
+        # Step 3: Generate variants
+        _check_cancelled(cancel, "variants")
+        stage_start = time.monotonic()
+        moments = extract_all_frames(
+            direct_url, moments, video_id, work_dir, budget,
+            atlases=atlases, seeker=seeker, pool=pool, settings=settings,
+        )
+        timings["variants"] = time.monotonic() - stage_start
 
         # Step 4: Upload to R2 (if configured)
-        s3_client = get_r2_client()
-        r2_results = upload_to_r2(s3_client, video_id, moments)
-
-        # Step 5: Save to database
-        save_to_database(info, moments, heatmap, r2_results)
+        _check_cancelled(cancel, "upload")
+        stage_start = time.monotonic()
+        s3_client = get_r2_client() if settings.upload_to_r2 else None
+        if not settings.upload_to_r2:
+            log.info("R2 upload disabled by settings — frames are not uploaded or saved")
+        r2_results = upload_to_r2(
+            s3_client, video_id, moments, immutable=settings.immutable_keys
+        )
+        timings["upload"] = time.monotonic() - stage_start
+
+        # Step 5: Save to database (frame rows point at the uploaded objects)
+        if settings.upload_to_r2:
+            _check_cancelled(cancel, "database write")
+            timings["total"] = time.monotonic() - started
+            save_to_database(info, moments, heatmap, r2_results, timings=timings)
+
+        # Step 6: Publish the game manifest next to the frames
+        catalog_entries = {}
+        if s3_client:
+            manifest = build_manifest(video_id, duration, moments, r2_results)
+            key = upload_manifest(s3_client, R2_BUCKET, manifest)
+            catalog_entries[video_id] = catalog_entry(manifest, key)
+            if update_catalog_index:
+                update_catalog(s3_client, R2_BUCKET, catalog_entries)
 
     log.info("Pipeline complete!")
+    return catalog_entries
+
+
+_VIDEO_ID_RE = re.compile(
+    r"^https?://(?:www\.|m\.)?(?:youtube\.com/(?:watch\?(?:[^#]*&)?v=|shorts/|embed/|live/)"
+    r"|youtu\.be/)([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])"
+)
+
+
+def extract_video_id(url: str) -> str | None:
+    """The YouTube video ID of a watch/short/embed URL or bare ID, else None."""
+    if re.fullmatch(r"[A-Za-z0-9_-]{11}", url):
+        return url
+    match = _VIDEO_ID_RE.match(url)
+    return match.group(1) if match else None
 
 
-def main():
-    url = sys.argv[1] if len(sys.argv) > 1 else VIDEO_URL
+def normalize_url(url: str) -> str:
+    """
+    Accept bare YouTube IDs as well as full URLs. Every form of a video URL
+    maps to the same canonical watch URL; other URLs are kept as given.
+    """
+    video_id = extract_video_id(url)
+    if video_id:
+        return f"https://www.youtube.com/watch?v={video_id}"
+    if not url.startswith("http"):
+        url = f"https://www.youtube.com/watch?v={url}"
+    return url
+
+
+def main(argv: list[str] | None = None):
+    argv = sys.argv[1:] if argv is None else argv
+    url = argv[0] if argv else VIDEO_URL
 
     if not url:
         print("Usage: python extract_frames.py <youtube_url_or_id>")
         print("  Or set VIDEO_URL environment variable")
         sys.exit(1)
 
-    if not url.startswith("http"):
-        url = f"https://www.youtube.com/watch?v={url}"
-
-    process_video(url)
+    setup_logging()
+    process_video(normalize_url(url))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,185 @@
+"""
+Shared-memory frame handoff for parallel variant rendering
+==========================================================
+Rendering the 13 variants of a 1280-wide frame in a process pool would
+otherwise pickle the decoded pixels (~2.7 MB per frame, per task) to every
+worker. Instead the parent decodes the frame once into a
+``multiprocessing.shared_memory`` segment and sends workers only a small
+descriptor (segment name, size, mode). Workers map the segment and build a
+Pillow image — or a NumPy array — directly on the buffer without copying.
+
+Lifecycle: the parent owns each segment. ``SharedFrame`` unlinks it on
+exit, including when a worker crashes or raises, and a finalizer unlinks
+it if the object is dropped without being closed. Workers only attach and
+close; they never unlink.
+
+Usage:
+    with variant_pool(4) as pool:
+        paths = render_variants_shared(frame_path, rank, work_dir, pool, names)
+"""
+
+import contextlib
+import logging
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+log = logging.getLogger(__name__)
+
+FRAME_MODE = "RGB"
+BYTES_PER_PIXEL = {"RGB": 3, "L": 1}
+
+
+@dataclass(frozen=True)
+class FrameDescriptor:
+    """Everything a worker needs to map a shared frame — cheap to pickle."""
+
+    name: str
+    width: int
+    height: int
+    mode: str = FRAME_MODE
+
+    @property
+    def nbytes(self) -> int:
+        return self.width * self.height * BYTES_PER_PIXEL[self.mode]
+
+
+def _unlink(shm: shared_memory.SharedMemory):
+    with contextlib.suppress(FileNotFoundError):
+        shm.close()
+        shm.unlink()
+
+
+class SharedFrame:
+    """
+    Decoded frame pixels in a shared-memory segment owned by this process.
+    Use as a context manager; the segment is freed on exit.
+    """
+
+    def __init__(self, img):
+        if img.mode != FRAME_MODE:
+            img = img.convert(FRAME_MODE)
+        width, height = img.size
+        size = width * height * BYTES_PER_PIXEL[FRAME_MODE]
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._finalizer = weakref.finalize(self, _unlink, self._shm)
+        try:
+            self._shm.buf[:size] = img.tobytes()
+        except BaseException:
+            self.close()
+            raise
+        self.descriptor = FrameDescriptor(self._shm.name, width, height)
+
+    @classmethod
+    def from_file(cls, path: str) -> "SharedFrame":
+        from PIL import Image
+
+        with Image.open(path) as img:
+            img.load()
+            return cls(img)
+
+    def close(self):
+        """Release and unlink the segment (idempotent)."""
+        self._finalizer()
+
+    def __enter__(self) -> "SharedFrame":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _open_segment(name: str) -> shared_memory.SharedMemory:
+    # Python 3.13+ can skip resource-tracker registration for attach-only
+    # handles; older versions share the parent's tracker, which dedupes.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+@contextlib.contextmanager
+def attach_image(descriptor: FrameDescriptor):
+    """Read-only Pillow image backed directly by the shared segment."""
+    from PIL import Image
+
+    shm = _open_segment(descriptor.name)
+    img = None
+    try:
+        img = Image.frombuffer(
+            descriptor.mode, (descriptor.width, descriptor.height),
+            shm.buf, "raw", descriptor.mode, 0, 1,
+        )
+        yield img
+    finally:
+        # The image holds an export of the buffer; drop it before closing.
+        if img is not None:
+            img.close()
+        del img
+        shm.close()
+
+
+@contextlib.contextmanager
+def attach_array(descriptor: FrameDescriptor):
+    """NumPy (height, width, channels) view on the shared segment."""
+    import numpy as np
+
+    shm = _open_segment(descriptor.name)
+    arr = None
+    try:
+        channels = BYTES_PER_PIXEL[descriptor.mode]
+        arr = np.ndarray(
+            (descriptor.height, descriptor.width, channels), dtype=np.uint8, buffer=shm.buf
+        )
+        arr.flags.writeable = False
+        yield arr
+    finally:
+        del arr
+        shm.close()
+
+
+def _render_worker(descriptor: FrameDescriptor, names: list[str], rank: int, work_dir: str,
+                   settings=None) -> dict:
+    """Pool task: render ``names`` from the shared frame."""
+    from extract_frames import _render_variants
+
+    with attach_image(descriptor) as img:
+        return _render_variants(img, rank, work_dir, names=names, settings=settings)
+
+
+def render_variants_shared(frame_path: str, rank: int, work_dir: str, pool, names: list[str],
+                           settings=None) -> dict:
+    """
+    Render ``names`` for one frame across ``pool`` (one task per variant)
+    using a shared-memory handoff. Returns variant_name → path, in
+    ``names`` order.
+    """
+    with SharedFrame.from_file(frame_path) as frame:
+        futures = [
+            pool.submit(_render_worker, frame.descriptor, [name], rank, work_dir, settings)
+            for name in names
+        ]
+        rendered = {}
+        try:
+            for future in futures:
+                rendered.update(future.result())
+        finally:
+            # Never free the segment while a task may still be mapping it
+            for future in futures:
+                future.cancel()
+            for future in futures:
+                with contextlib.suppress(BaseException):
+                    future.exception()
+    return {name: rendered[name] for name in names if name in rendered}
+
+
+@contextlib.contextmanager
+def variant_pool(workers: int):
+    """Process pool for variant rendering, or ``None`` when ``workers`` < 2."""
+    if workers < 2:
+        yield None
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        log.info(f"Rendering variants with {workers} worker processes")
+        yield pool
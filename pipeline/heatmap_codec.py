@@ -0,0 +1,242 @@
+"""
+Compact heatmap storage
+=======================
+yt-dlp returns the "most replayed" heatmap as a list of
+``{start_time, end_time, value}`` dicts, one per fixed-length segment.
+Stored verbatim as JSONB that repeats every key for every segment.
+
+Since the segments are contiguous and equally long, the same data fits in
+three columns:
+
+    heatmap_start   DOUBLE PRECISION   start of the first segment (seconds)
+    heatmap_step    DOUBLE PRECISION   segment length (seconds)
+    heatmap_values  REAL[]             one value per segment
+
+start/step are doubles: a float32 step is off by up to ~1e-7 relative,
+which start + i * step multiplies into visible drift on long videos.
+
+Heatmaps that are not fixed-interval stay in ``heatmap_raw``.
+
+Usage:
+    python heatmap_codec.py migrate [--drop-json] [--batch-size 500]
+    python heatmap_codec.py report
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+log = logging.getLogger(__name__)
+
+# Maximum drift (seconds) between a segment boundary and start + i * step
+# for a heatmap to be considered fixed-interval.
+INTERVAL_TOLERANCE_SEC = 1e-3
+
+# How heatmaps are written by save_to_database:
+#   compact — columnar only, JSONB kept only for irregular heatmaps
+#   both    — columnar + JSONB
+#   json    — JSONB only (previous behaviour)
+HEATMAP_STORAGE = os.environ.get("HEATMAP_STORAGE", "compact")
+
+
+def encode_heatmap(heatmap: list[dict] | None) -> dict | None:
+    """
+    Encode a fixed-interval heatmap as {"start", "step", "values"}.
+    Returns None when the heatmap is empty or its segments are irregular.
+    """
+    if not heatmap:
+        return None
+
+    segments = sorted(heatmap, key=lambda s: s["start_time"])
+    start = float(segments[0]["start_time"])
+    step = float(segments[0]["end_time"]) - start
+    if step <= 0:
+        return None
+
+    for i, seg in enumerate(segments):
+        expected_start = start + i * step
+        if (
+            abs(seg["start_time"] - expected_start) > INTERVAL_TOLERANCE_SEC
+            or abs(seg["end_time"] - (expected_start + step)) > INTERVAL_TOLERANCE_SEC
+        ):
+            return None
+
+    return {
+        "start": start,
+        "step": step,
+        "values": [float(seg["value"]) for seg in segments],
+    }
+
+
+def decode_heatmap(start: float, step: float, values: list[float]) -> list[dict]:
+    """Rebuild the yt-dlp segment list — the shape find_top_moments expects."""
+    return [
+        {
+            "start_time": start + i * step,
+            "end_time": start + (i + 1) * step,
+            "value": value,
+        }
+        for i, value in enumerate(values)
+    ]
+
+
+def heatmap_from_row(
+    start: float | None,
+    step: float | None,
+    values: list[float] | None,
+    raw: list[dict] | None,
+) -> list[dict]:
+    """Read a heatmap from a ``videos`` row, preferring the compact columns."""
+    if values is not None and start is not None and step is not None:
+        return decode_heatmap(start, step, values)
+    return raw or []
+
+
+def heatmap_db_params(heatmap: list[dict] | None, storage: str = HEATMAP_STORAGE) -> tuple:
+    """
+    Column values for (heatmap_raw, heatmap_start, heatmap_step, heatmap_values).
+    ``heatmap_raw`` is returned as plain Python data; the caller wraps it.
+    """
+    encoded = encode_heatmap(heatmap) if storage != "json" else None
+    if encoded is None:
+        return heatmap, None, None, None
+    raw = heatmap if storage == "both" else None
+    return raw, encoded["start"], encoded["step"], encoded["values"]
+
+
+def encoded_size_bytes(heatmap: list[dict]) -> dict:
+    """Approximate on-disk size of both representations (uncompressed)."""
+    json_bytes = len(json.dumps(heatmap).encode())
+    encoded = encode_heatmap(heatmap)
+    # real[] = 24-byte array header + 4 bytes per element; start/step = 8 each
+    compact_bytes = 24 + 4 * len(encoded["values"]) + 16 if encoded else None
+    return {"json_bytes": json_bytes, "compact_bytes": compact_bytes}
+
+
+# ---------------------------------------------------------------------------
+# Migration + size report
+# ---------------------------------------------------------------------------
+def migrate(conn, drop_json: bool = False, batch_size: int = 500) -> dict:
+    """
+    Backfill compact columns for rows that only have ``heatmap_raw``.
+    Processes keyset-paginated batches, committing after each one.
+    """
+    stats = {"converted": 0, "irregular": 0}
+    last_id = ""
+
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT video_id, heatmap_raw FROM videos
+                WHERE heatmap_values IS NULL
+                  AND heatmap_raw IS NOT NULL
+                  AND video_id > %s
+                ORDER BY video_id
+                LIMIT %s
+                """,
+                (last_id, batch_size),
+            )
+            rows = cur.fetchall()
+            if not rows:
+                break
+
+            for video_id, raw in rows:
+                last_id = video_id
+                encoded = encode_heatmap(raw)
+                if encoded is None:
+                    stats["irregular"] += 1
+                    continue
+                cur.execute(
+                    f"""
+                    UPDATE videos SET
+                        heatmap_start = %s,
+                        heatmap_step = %s,
+                        heatmap_values = %s
+                        {", heatmap_raw = NULL" if drop_json else ""}
+                    WHERE video_id = %s
+                    """,
+                    (encoded["start"], encoded["step"], encoded["values"], video_id),
+                )
+                stats["converted"] += 1
+        conn.commit()
+        log.info(f"  Migrated up to {last_id} ({stats['converted']} converted)")
+
+    return stats
+
+
+def size_report(conn) -> dict:
+    """Compare the stored size of JSONB vs compact heatmaps across the table."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT
+                COUNT(*),
+                COUNT(heatmap_raw),
+                COUNT(heatmap_values),
+                COALESCE(SUM(pg_column_size(heatmap_raw)), 0),
+                COALESCE(SUM(
+                    pg_column_size(heatmap_values)
+                    + pg_column_size(heatmap_start)
+                    + pg_column_size(heatmap_step)
+                ), 0),
+                COALESCE(SUM(pg_column_size(heatmap_raw))
+                    FILTER (WHERE heatmap_values IS NOT NULL), 0)
+            FROM videos
+            """
+        )
+        total, json_rows, compact_rows, json_bytes, compact_bytes, dual_json_bytes = cur.fetchone()
+    return {
+        "videos": total,
+        "json_rows": json_rows,
+        "compact_rows": compact_rows,
+        "json_bytes": json_bytes,
+        "compact_bytes": compact_bytes,
+        "json_bytes_droppable": dual_json_bytes,
+    }
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+    )
+    parser = argparse.ArgumentParser(description="Compact heatmap storage tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    mig = sub.add_parser("migrate", help="Backfill compact columns from heatmap_raw")
+    mig.add_argument("--drop-json", action="store_true",
+                     help="NULL heatmap_raw once the compact columns are written")
+    mig.add_argument("--batch-size", type=int, default=500)
+    sub.add_parser("report", help="Show JSONB vs compact storage size")
+    args = parser.parse_args()
+
+    from extract_frames import DATABASE_SSLMODE, DATABASE_URL
+
+    if not DATABASE_URL:
+        log.error("DATABASE_URL environment variable is required")
+        sys.exit(1)
+
+    import psycopg2
+    conn = psycopg2.connect(DATABASE_URL, sslmode=DATABASE_SSLMODE)
+    try:
+        if args.command == "migrate":
+            stats = migrate(conn, drop_json=args.drop_json, batch_size=args.batch_size)
+            log.info(
+                f"Converted {stats['converted']} heatmaps, "
+                f"kept {stats['irregular']} irregular ones as JSONB"
+            )
+
+        report = size_report(conn)
+        log.info("HEATMAP STORAGE")
+        log.info(f"  Videos:          {report['videos']}")
+        log.info(f"  JSONB rows:      {report['json_rows']} ({report['json_bytes'] / 1024:.0f} KB)")
+        log.info(f"  Compact rows:    {report['compact_rows']} ({report['compact_bytes'] / 1024:.0f} KB)")
+        log.info(f"  Droppable JSONB: {report['json_bytes_droppable'] / 1024:.0f} KB")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
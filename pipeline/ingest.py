@@ -0,0 +1,204 @@
+"""
+Playlist and channel ingestion
+==============================
+Expands playlist/channel URLs into video URLs for extract_batch without a
+full metadata extraction per entry:
+
+  - yt-dlp's flat extraction (``extract_flat``) pages through the
+    collection and yields lightweight entries (id, title, duration,
+    view_count, ...) lazily, so the first survivors start processing while
+    later pages are still being listed
+  - entries are pre-filtered on that flat data: duration bounds, minimum
+    views, categories, no live/upcoming streams. A field the flat data
+    doesn't carry (categories usually, view counts sometimes) can't reject
+    an entry
+  - survivors are deduplicated against the ``videos`` table with one
+    ``= ANY(...)`` query per DEDUPE_BATCH entries (about one listing page),
+    each on a fresh connection so a long listing never queries through a
+    connection that sat idle while earlier videos processed
+  - a source whose listing fails keeps the entries listed so far; one whose
+    dedupe query fails is skipped from there on. Either is logged and the
+    remaining sources are still expanded
+
+Plain video URLs and IDs pass through unchanged.
+"""
+
+import logging
+import re
+from dataclasses import dataclass
+from itertools import islice
+
+from extract_frames import YDL_OPTS, normalize_url
+
+log = logging.getLogger(__name__)
+
+DEDUPE_BATCH = 100            # IDs per videos-table lookup (one playlist page)
+MIN_DURATION_SEC = 60         # collection entries shorter than this are Shorts/clips
+MAX_NESTING = 2               # channel → tab → entries
+
+_COLLECTION_RE = re.compile(
+    r"^https?://(?:www\.|m\.)?youtube\.com/"
+    r"(?:playlist\?|(?:@[^/?#]+|channel/[^/?#]+|c/[^/?#]+|user/[^/?#]+)(?:/[^?#]*)?(?:[?#]|$))"
+)
+_CHANNEL_ROOT_RE = re.compile(
+    r"^(https?://(?:www\.|m\.)?youtube\.com/(?:@[^/?#]+|channel/[^/?#]+|c/[^/?#]+|user/[^/?#]+))/?$"
+)
+
+FLAT_OPTS = {
+    **YDL_OPTS,
+    "extract_flat": "in_playlist",
+    "lazy_playlist": True,
+    "ignoreerrors": True,
+}
+
+
+def is_collection_url(url: str) -> bool:
+    """Playlist or channel URL (as opposed to a single video)."""
+    return bool(_COLLECTION_RE.match(url)) and "watch?" not in url
+
+
+def collection_url(url: str) -> str:
+    """Channel roots list their uploads tab; other collection URLs are kept."""
+    root = _CHANNEL_ROOT_RE.match(url)
+    return f"{root.group(1)}/videos" if root else url
+
+
+@dataclass(frozen=True)
+class EntryFilter:
+    """Pre-filter applied to flat playlist entries."""
+
+    min_duration: float | None = MIN_DURATION_SEC
+    max_duration: float | None = None
+    min_views: int | None = None
+    categories: tuple[str, ...] = ()
+
+    def reject_reason(self, entry: dict) -> str | None:
+        """Why ``entry`` is filtered out, or None to keep it."""
+        if entry.get("live_status") in ("is_live", "is_upcoming", "post_live"):
+            return "live"
+        duration = entry.get("duration")
+        if duration is not None:
+            if self.min_duration is not None and duration < self.min_duration:
+                return "too short"
+            if self.max_duration is not None and duration > self.max_duration:
+                return "too long"
+        views = entry.get("view_count")
+        if self.min_views is not None and views is not None and views < self.min_views:
+            return "too few views"
+        categories = entry.get("categories")
+        if self.categories and categories and not set(categories) & set(self.categories):
+            return "category"
+        return None
+
+
+def iter_flat_entries(url: str, ydl=None, limit: int | None = None, _depth: int = 0):
+    """
+    Lazily yield flat video entries of a playlist/channel, descending into
+    nested collections (channel tabs). ``limit`` caps entries per collection.
+    """
+    if ydl is None:
+        from yt_dlp import YoutubeDL
+
+        opts = dict(FLAT_OPTS, playlistend=limit) if limit else FLAT_OPTS
+        with YoutubeDL(opts) as ydl:
+            yield from iter_flat_entries(url, ydl, limit, _depth)
+        return
+
+    info = ydl.extract_info(collection_url(url), download=False)
+    if not info:
+        log.warning(f"  Could not list {url}")
+        return
+    for entry in info.get("entries") or []:
+        if not entry:
+            continue      # unavailable/private entries come back as None
+        entry_url = entry.get("url") or entry.get("webpage_url") or ""
+        if entry.get("_type") == "playlist" or is_collection_url(entry_url):
+            if entry_url and _depth < MAX_NESTING:
+                yield from iter_flat_entries(entry_url, ydl, limit, _depth + 1)
+            continue
+        if entry.get("id"):
+            yield entry
+
+
+def existing_video_ids(conn, video_ids: list[str]) -> set[str]:
+    """IDs already in the videos table (one query)."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT video_id FROM videos WHERE video_id = ANY(%s)", (video_ids,))
+        found = {row[0] for row in cur}
+    conn.rollback()
+    return found
+
+
+def lookup_existing(connect, video_ids: list[str]) -> set[str]:
+    """existing_video_ids on a connection opened (and closed) for this one query."""
+    conn = connect()
+    try:
+        return existing_video_ids(conn, video_ids)
+    finally:
+        conn.close()
+
+
+def _until_error(entries, url: str):
+    """``entries`` up to the first listing error, which is logged."""
+    try:
+        yield from entries
+    except Exception as e:
+        log.error(f"  Listing {url} stopped: {type(e).__name__}: {e}")
+
+
+def _batched(iterable, size: int):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def expand_urls(urls: list[str], entry_filter: EntryFilter | None = None, connect=None,
+                limit: int | None = None, list_entries=iter_flat_entries):
+    """
+    Yield video URLs: plain URLs/IDs as given, collections expanded via
+    flat extraction, filtered and (with ``connect``, a callable returning a
+    database connection) minus videos already in the database. Each video
+    is yielded at most once.
+    """
+    entry_filter = entry_filter or EntryFilter()
+    seen = set()
+    for url in urls:
+        url = normalize_url(url)
+        if not is_collection_url(url):
+            if url not in seen:
+                seen.add(url)
+                yield url
+            continue
+
+        log.info(f"Listing {url} (flat)...")
+        listed, rejected, known, kept = 0, {}, 0, 0
+        try:
+            entries = _until_error(list_entries(url, limit=limit), url)
+            for batch in _batched(entries, DEDUPE_BATCH):
+                survivors = []
+                for entry in batch:
+                    listed += 1
+                    reason = entry_filter.reject_reason(entry)
+                    if reason:
+                        rejected[reason] = rejected.get(reason, 0) + 1
+                    elif normalize_url(entry["id"]) not in seen:
+                        seen.add(normalize_url(entry["id"]))
+                        survivors.append(entry["id"])
+                existing = lookup_existing(connect, survivors) if connect and survivors else set()
+                known += len(existing)
+                for video_id in survivors:
+                    if video_id not in existing:
+                        kept += 1
+                        yield normalize_url(video_id)
+        except Exception as e:
+            log.error(
+                f"  Expanding {url} failed after {listed} entries, skipping the rest: "
+                f"{type(e).__name__}: {e}"
+            )
+
+        skipped = ", ".join(f"{n} {reason}" for reason, n in sorted(rejected.items()))
+        log.info(
+            f"  {url}: {listed} listed, {kept} new"
+            f"{f', {known} already in database' if known else ''}"
+            f"{f', filtered: {skipped}' if skipped else ''}"
+        )
@@ -0,0 +1,114 @@
+"""
+Keyframe-aware timestamp snapping
+=================================
+Seeking to an arbitrary timestamp makes ffmpeg decode from the preceding
+keyframe through the rest of the GOP — seconds of decode per frame on
+long-GOP streams. When snapping is enabled, each selected moment is moved
+to the nearest keyframe within a small tolerance so the capture becomes a
+near-zero-decode seek.
+
+Keyframe positions are read from the packet index with ffprobe (one call
+per video, only the packets around the selected moments; nothing is
+decoded). Snapping never brings two moments closer than ``min_spacing``,
+so the guarantees of find_top_moments still hold. The original heatmap
+midpoint is kept in ``heatmap_timestamp``; ``timestamp`` (saved as
+``frames.timestamp_sec``) becomes the keyframe time.
+"""
+
+import logging
+import subprocess
+
+log = logging.getLogger(__name__)
+
+KEYFRAME_TOLERANCE_SEC = 1.0  # max distance a moment may move
+PROBE_TIMEOUT_SEC = 30
+# Seek just past the keyframe so float formatting can never land on the
+# previous GOP; with -noaccurate_seek ffmpeg then emits the keyframe itself.
+SEEK_EPSILON_SEC = 0.001
+
+
+def parse_keyframe_packets(output: str) -> list[float]:
+    """Keyframe pts_time values from ``ffprobe -show_entries packet=pts_time,flags`` CSV."""
+    keyframes = set()
+    for line in output.splitlines():
+        fields = [f for f in line.strip().split(",") if f]
+        if len(fields) < 2:
+            continue
+        flags = fields[-1]
+        if "K" not in flags:
+            continue
+        try:
+            keyframes.add(float(fields[0]))
+        except ValueError:
+            continue
+    return sorted(keyframes)
+
+
+def probe_keyframes(
+    video_url: str,
+    timestamps: list[float],
+    tolerance: float = KEYFRAME_TOLERANCE_SEC,
+) -> list[float]:
+    """
+    Keyframe times within ``tolerance`` of any of ``timestamps``.
+    Reads packet headers only — no frames are decoded.
+    """
+    if not timestamps:
+        return []
+    intervals = ",".join(
+        f"{max(0.0, t - tolerance):.3f}%{t + tolerance:.3f}" for t in sorted(timestamps)
+    )
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-read_intervals", intervals,
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
+        video_url,
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=PROBE_TIMEOUT_SEC)
+    except subprocess.TimeoutExpired:
+        log.warning("  Keyframe probe timed out — using exact timestamps")
+        return []
+    if result.returncode != 0:
+        log.warning(f"  Keyframe probe failed — using exact timestamps: {result.stderr[-200:]}")
+        return []
+    return parse_keyframe_packets(result.stdout)
+
+
+def snap_moments(
+    moments: list[dict],
+    keyframes: list[float],
+    duration: float,
+    min_spacing: float,
+    tolerance: float = KEYFRAME_TOLERANCE_SEC,
+) -> list[dict]:
+    """
+    Move each moment to its nearest keyframe within ``tolerance`` as long
+    as it stays ``min_spacing`` away from every other moment. Moments are
+    processed in rank order; ones that cannot be snapped keep their exact
+    timestamp. Mutates and returns ``moments``.
+    """
+    for moment in sorted(moments, key=lambda m: m["rank"]):
+        original = moment.setdefault("heatmap_timestamp", moment["timestamp"])
+        moment["timestamp"] = original
+        moment["snapped"] = False
+        moment.pop("seek_timestamp", None)
+
+        others = [m["timestamp"] for m in moments if m is not moment]
+        candidates = sorted(
+            (kf for kf in keyframes
+             if abs(kf - original) <= tolerance and 0 <= kf <= duration - 0.5),
+            key=lambda kf: abs(kf - original),
+        )
+        for kf in candidates:
+            if all(abs(kf - t) >= min_spacing for t in others):
+                moment["timestamp"] = kf
+                moment["seek_timestamp"] = kf + SEEK_EPSILON_SEC
+                moment["snapped"] = True
+                break
+
+    snapped = sum(m["snapped"] for m in moments)
+    log.info(f"  Snapped {snapped}/{len(moments)} moments to keyframes")
+    return moments
@@ -0,0 +1,500 @@
+"""
+Offline end-to-end load test
+============================
+Runs extract_batch end-to-end for thousands of synthetic videos without
+YouTube, R2 or the internet, injecting faults, and reports throughput,
+tail latency and how failures were handled:
+
+  - a handful of distinct clips are rendered once with ffmpeg ``testsrc2``
+    and served by a local HTTP server with Range support; every synthetic
+    video ID maps onto one of them
+  - the server injects latency, hung requests, 5xx errors and 403s (which
+    exercise SeekController's expired-URL refresh)
+  - get_video_info is replaced by a stub returning seeded synthetic
+    heatmaps (a fraction have none, exercising scene detection)
+  - R2 is replaced by LocalS3, a directory-backed stand-in for the boto3
+    calls the pipeline makes, optionally failing a fraction of uploads
+  - frames/videos go to a real Postgres when --database-url is given
+    (e.g. a local docker container); otherwise DB writes are recorded only
+
+Usage:
+    python loadtest.py --videos 2000 --processes 4 --latency-ms 50 \\
+        --error-rate 0.02 --hang-rate 0.005 --expired-rate 0.01 \\
+        --database-url postgresql://postgres@localhost/framedle_test \\
+        --report loadtest-report.json
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+
+from seek_control import percentile
+
+log = logging.getLogger(__name__)
+
+CLIP_SIZE = "1280x720"
+CLIP_RATE = 25
+CLIP_GOP = 50                  # 2s keyframe interval at 25 fps
+HANG_SEC = 30                  # how long a "hung" request stalls
+
+
+# ---------------------------------------------------------------------------
+# Synthetic media
+# ---------------------------------------------------------------------------
+def make_clips(out_dir: str, count: int, duration: int) -> list[str]:
+    """Render ``count`` distinct H.264 test clips (cached between runs)."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(out_dir, f"clip{i}_{duration}s.mp4")
+        if not os.path.exists(path):
+            subprocess.run([
+                "ffmpeg", "-v", "error", "-y",
+                "-f", "lavfi", "-i",
+                f"testsrc2=size={CLIP_SIZE}:rate={CLIP_RATE}:duration={duration},"
+                f"hue=h={i * 360 // max(count, 1)}",
+                "-c:v", "libx264", "-preset", "veryfast", "-g", str(CLIP_GOP),
+                "-pix_fmt", "yuv420p", "-movflags", "+faststart",
+                path,
+            ], check=True)
+        paths.append(path)
+    return paths
+
+
+def video_ids(count: int) -> list[str]:
+    return [f"lt{i:09d}" for i in range(count)]
+
+
+def synthetic_info(video_id: str, base_url: str, duration: int, seed: int,
+                   no_heatmap_rate: float) -> dict:
+    """yt-dlp-shaped info dict with a seeded synthetic heatmap."""
+    rng = random.Random(f"{seed}:{video_id}")
+    heatmap = None
+    if rng.random() >= no_heatmap_rate:
+        segments = 100
+        step = duration / segments
+        heatmap = [
+            {"start_time": i * step, "end_time": (i + 1) * step, "value": rng.random()}
+            for i in range(segments)
+        ]
+    return {
+        "id": video_id,
+        "title": f"Load test video {video_id}",
+        "channel": "Load Test",
+        "channel_id": "UCloadtest",
+        "categories": ["Gaming"],
+        "duration": duration,
+        "view_count": rng.randint(1_000, 10_000_000),
+        "channel_follower_count": 1_000,
+        "upload_date": "20240101",
+        "heatmap": heatmap,
+        "formats": [{
+            "url": f"{base_url}/v/{video_id}.mp4",
+            "vcodec": "avc1", "height": 720,
+        }],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Fault injection + local video server
+# ---------------------------------------------------------------------------
+class FaultInjector:
+    """Seeded per-request fault decisions plus counters for the report."""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0,
+                 hang_rate: float = 0, expired_rate: float = 0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.expired_rate = expired_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "errors": 0, "hangs": 0, "expired": 0}
+
+    def decide(self) -> tuple[str, float]:
+        """(fault, delay_sec) where fault is ok / error / hang / expired."""
+        with self._lock:
+            self.counts["requests"] += 1
+            roll = self._rng.random()
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-1, 1) * self.jitter_ms) / 1000
+            fault = "ok"
+            for name, rate in (("hang", self.hang_rate), ("error", self.error_rate),
+                               ("expired", self.expired_rate)):
+                if roll < rate:
+                    fault = name
+                    self.counts[{"hang": "hangs", "error": "errors"}.get(name, name)] += 1
+                    break
+                roll -= rate
+            return fault, delay
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Inclusive (start, end) for a single ``bytes=`` range, or None for the whole file."""
+    if not header or not header.startswith("bytes="):
+        return None
+    start_s, _, end_s = header[len("bytes="):].split(",")[0].partition("-")
+    if start_s:
+        start = int(start_s)
+        end = min(int(end_s), size - 1) if end_s else size - 1
+    else:
+        start = max(0, size - int(end_s))
+        end = size - 1
+    if start > end or start >= size:
+        raise ValueError("unsatisfiable range")
+    return start, end
+
+
+def make_video_handler(clip_for, injector: FaultInjector):
+    class VideoHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_HEAD(self):
+            self._serve(body=False)
+
+        def do_GET(self):
+            self._serve(body=True)
+
+        def _serve(self, body: bool):
+            fault, delay = injector.decide()
+            time.sleep(delay)
+            if fault == "hang":
+                time.sleep(HANG_SEC)
+                self.close_connection = True
+                return
+            if fault in ("error", "expired"):
+                status = 500 if fault == "error" else 403
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            path = clip_for(self.path)
+            if path is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            size = os.path.getsize(path)
+            try:
+                byte_range = parse_range(self.headers.get("Range"), size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            start, end = byte_range or (0, size - 1)
+            self.send_response(206 if byte_range else 200)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(end - start + 1))
+            if byte_range:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.end_headers()
+            if not body:
+                return
+            with open(path, "rb") as f:
+                f.seek(start)
+                remaining = end - start + 1
+                try:
+                    while remaining:
+                        chunk = f.read(min(remaining, 256 * 1024))
+                        self.wfile.write(chunk)
+                        remaining -= len(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass   # ffmpeg closes the connection once it has its frame
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return VideoHandler
+
+
+def start_video_server(clips: list[str], injector: FaultInjector, ids: list[str]):
+    """Serve /v/<video_id>.mp4 on an ephemeral port; returns (server, base_url)."""
+    mapping = {vid: clips[i % len(clips)] for i, vid in enumerate(ids)}
+
+    def clip_for(path: str):
+        name = os.path.basename(path.split("?", 1)[0])
+        return mapping.get(name.removesuffix(".mp4"))
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_video_handler(clip_for, injector))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# ---------------------------------------------------------------------------
+# Local S3 stand-in
+# ---------------------------------------------------------------------------
+class NoSuchKey(Exception):
+    pass
+
+
+class PreconditionFailed(Exception):
+    """A conditional put lost, shaped like the botocore ClientError R2 returns."""
+
+    def __init__(self, key: str):
+        super().__init__(f"At least one of the pre-conditions you specified did not hold: {key}")
+        self.response = {
+            "Error": {"Code": "PreconditionFailed", "Message": str(self)},
+            "ResponseMetadata": {"HTTPStatusCode": 412},
+        }
+
+
+def _etag(data: bytes) -> str:
+    return f'"{hashlib.md5(data).hexdigest()}"'
+
+
+class LocalS3:
+    """
+    Directory-backed stand-in for the boto3 S3 client methods the pipeline
+    uses. ``error_rate`` makes writes fail like a flaky endpoint would.
+    Objects carry an MD5 ETag, and ``IfMatch`` / ``IfNoneMatch="*"`` puts are
+    checked under a lock file, so shards in separate processes race on the
+    catalog the way concurrent R2 writers do.
+    """
+
+    class exceptions:
+        NoSuchKey = NoSuchKey
+
+    def __init__(self, root: str, error_rate: float = 0.0, seed: int = 0):
+        self.root = root
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {"puts": 0, "gets": 0, "put_errors": 0, "precondition_failures": 0}
+
+    def _path(self, bucket: str, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, bucket, key))
+        if not path.startswith(os.path.join(self.root, bucket) + os.sep):
+            raise ValueError(f"invalid key {key!r}")
+        return path
+
+    def _write(self, bucket: str, key: str, data: bytes):
+        with self._lock:
+            self.counts["puts"] += 1
+            if self._rng.random() < self.error_rate:
+                self.counts["put_errors"] += 1
+                raise ConnectionError(f"injected upload failure for {key}")
+        path = self._path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _current_etag(self, bucket: str, key: str) -> str | None:
+        try:
+            with open(self._path(bucket, key), "rb") as f:
+                return _etag(f.read())
+        except FileNotFoundError:
+            return None
+
+    def put_object(self, Bucket: str, Key: str, Body, IfMatch: str | None = None,
+                   IfNoneMatch: str | None = None, **kwargs):
+        data = Body if isinstance(Body, bytes) else Body.read()
+        if IfMatch is None and IfNoneMatch is None:
+            self._write(Bucket, Key, data)
+            return {"ETag": _etag(data)}
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, ".conditional.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)     # check-and-write is atomic across shards
+            current = self._current_etag(Bucket, Key)
+            if (IfNoneMatch == "*" and current is not None) or (
+                IfMatch is not None and IfMatch != current
+            ):
+                with self._lock:
+                    self.counts["precondition_failures"] += 1
+                raise PreconditionFailed(Key)
+            self._write(Bucket, Key, data)
+        return {"ETag": _etag(data)}
+
+    def upload_file(self, Filename: str, Bucket: str, Key: str, ExtraArgs=None):
+        with open(Filename, "rb") as f:
+            self._write(Bucket, Key, f.read())
+
+    def get_object(self, Bucket: str, Key: str, **kwargs):
+        with self._lock:
+            self.counts["gets"] += 1
+        path = self._path(Bucket, Key)
+        if not os.path.exists(path):
+            raise NoSuchKey(Key)
+        with open(path, "rb") as f:
+            data = f.read()
+        return {"Body": _Body(data), "ContentLength": len(data), "ETag": _etag(data)}
+
+
+class _Body:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    def read(self) -> bytes:
+        return self._data
+
+
+# ---------------------------------------------------------------------------
+# Running the batch
+# ---------------------------------------------------------------------------
+def _install_stubs(base_url: str, s3_root: str, args, records: list):
+    """Point the pipeline at the local stand-ins (call after env setup)."""
+    import extract_batch
+    import extract_frames
+
+    def get_video_info(url: str) -> dict:
+        video_id = url.rsplit("=", 1)[-1]
+        return synthetic_info(video_id, base_url, args.duration, args.seed, args.no_heatmap_rate)
+
+    s3 = LocalS3(s3_root, error_rate=args.upload_error_rate, seed=args.seed + os.getpid())
+    extract_frames.get_video_info = get_video_info
+    extract_frames.get_r2_client = lambda: s3
+    extract_batch.get_r2_client = lambda: s3
+
+    if not args.database_url:
+        def save_to_database(info, moments, heatmap, r2_results, timings=None):
+            records.append({"db_write": info["id"], "frames": len(moments)})
+        extract_frames.save_to_database = save_to_database
+
+    process_video = extract_batch.process_video
+
+    def timed_process_video(url, **kwargs):
+        start = time.monotonic()
+        try:
+            result = process_video(url, **kwargs)
+        except Exception as e:
+            records.append({"url": url, "sec": time.monotonic() - start,
+                            "ok": False, "error": f"{type(e).__name__}: {e}"[:300]})
+            raise
+        records.append({"url": url, "sec": time.monotonic() - start, "ok": True})
+        return result
+
+    extract_batch.process_video = timed_process_video
+    return s3
+
+
+def run_shard(urls: list[str], base_url: str, s3_root: str, args) -> dict:
+    """Run one extract_batch over ``urls`` in this process; returns records."""
+    import extract_batch
+
+    records = []
+    s3 = _install_stubs(base_url, s3_root, args, records)
+    argv = ["--urls", ",".join(urls), "--config", args.config] + args.batch_args
+    try:
+        extract_batch.main(argv)
+    except SystemExit:
+        pass   # extract_batch exits 1 when any video failed
+    return {"records": records, "s3": s3.counts}
+
+
+def build_report(records: list[dict], wall_sec: float, faults: dict, s3_counts: dict) -> dict:
+    videos = [r for r in records if "url" in r]
+    latencies = [r["sec"] for r in videos]
+    failures = {}
+    for r in videos:
+        if not r["ok"]:
+            kind = r["error"].split(":", 1)[0]
+            failures[kind] = failures.get(kind, 0) + 1
+    succeeded = sum(r["ok"] for r in videos)
+    return {
+        "videos": len(videos),
+        "succeeded": succeeded,
+        "failed": len(videos) - succeeded,
+        "wall_sec": round(wall_sec, 1),
+        "videos_per_min": round(60 * succeeded / wall_sec, 1) if wall_sec else 0.0,
+        "latency_sec": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(max(latencies, default=0.0), 2),
+        },
+        "failures": failures,
+        "db_writes": sum(1 for r in records if "db_write" in r),
+        "faults_injected": faults,
+        "s3": s3_counts,
+    }
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline load test")
+    parser.add_argument("--videos", type=int, default=100)
+    parser.add_argument(
+        "--config", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "videos.json"),
+        help="Config whose settings block the batch uses (its video list is ignored)",
+    )
+    parser.add_argument("--clips", type=int, default=4, help="Distinct clips to render")
+    parser.add_argument("--duration", type=int, default=120, help="Clip length (s)")
+    parser.add_argument("--processes", type=int, default=1, help="Parallel batch processes")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "framedle-loadtest"))
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="HTTP 500 rate")
+    parser.add_argument("--hang-rate", type=float, default=0, help=f"{HANG_SEC}s stall rate")
+    parser.add_argument("--expired-rate", type=float, default=0, help="HTTP 403 rate")
+    parser.add_argument("--upload-error-rate", type=float, default=0)
+    parser.add_argument("--no-heatmap-rate", type=float, default=0.1)
+    parser.add_argument("--database-url", default=None, help="Postgres with schema.sql applied")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--report", default=None, help="Write the JSON report here")
+    parser.add_argument("batch_args", nargs="*", help="Extra extract_batch options (after --)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(message)s")
+    if not shutil.which("ffmpeg"):
+        sys.exit("ffmpeg is required to render and capture the synthetic videos")
+
+    # Configure the pipeline before it is imported by the shards
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+        os.environ.setdefault("DATABASE_SSLMODE", "disable")
+
+    clips = make_clips(os.path.join(args.work_dir, "clips"), args.clips, args.duration)
+    ids = video_ids(args.videos)
+    injector = FaultInjector(args.latency_ms, args.jitter_ms, args.error_rate,
+                             args.hang_rate, args.expired_rate, args.seed)
+    server, base_url = start_video_server(clips, injector, ids)
+    s3_root = os.path.join(args.work_dir, "s3")
+    shutil.rmtree(s3_root, ignore_errors=True)
+
+    urls = [f"https://www.youtube.com/watch?v={vid}" for vid in ids]
+    shards = [urls[i::args.processes] for i in range(args.processes)]
+    print(f"Load test: {len(urls)} videos, {args.processes} process(es), server {base_url}")
+
+    start = time.monotonic()
+    if args.processes == 1:
+        results = [run_shard(urls, base_url, s3_root, args)]
+    else:
+        with get_context("fork").Pool(args.processes) as pool:
+            results = pool.starmap(
+                run_shard, [(shard, base_url, s3_root, args) for shard in shards if shard]
+            )
+    wall = time.monotonic() - start
+    server.shutdown()
+
+    s3_counts = {}
+    for result in results:
+        for name, value in result["s3"].items():
+            s3_counts[name] = s3_counts.get(name, 0) + value
+    report = build_report(
+        [r for result in results for r in result["records"]], wall, injector.counts, s3_counts
+    )
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Per-video game manifests
+========================
+After a video's frames are uploaded, the pipeline writes a compact JSON
+manifest next to them so the API and edge can serve a game round with a
+single cacheable object fetch instead of querying ``frames``.
+
+    frames/{video_id}/manifest.{hash}.json   immutable, content-addressed
+    catalog/index.json                       rolled-up index, short TTL
+
+The catalog is shared by every batch, worker and daemon, so it is only
+ever rewritten with a conditional put (If-Match on the ETag that was read,
+If-None-Match when creating it); a writer that loses the race re-reads
+and merges again instead of dropping the other writer's entries.
+
+The manifest deliberately omits title/channel — it is fetched by game
+clients and must not give the answer away.
+
+Manifest shape:
+    {
+      "v": 1,
+      "video_id": "dQw4w9WgXcQ",
+      "duration": 212,
+      "frames": [
+        {"rank": 1, "t": 43.2, "heat": 1.0, "w": 1280, "h": 720,
+         "key": "frames/dQw4w9WgXcQ/f01.webp", "bytes": 81234,
+         "variants": {"thumb": {"key": "...", "bytes": 9120}, ...},
+         "atlases": {...}}
+      ]
+    }
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+log = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+CATALOG_KEY = "catalog/index.json"
+
+MANIFEST_CACHE_CONTROL = "public, max-age=31536000, immutable"
+CATALOG_CACHE_CONTROL = "public, max-age=300"
+
+# Conditional catalog writes that lose a race are retried this many times.
+CATALOG_WRITE_ATTEMPTS = 8
+
+
+def _file_size(path: str | None) -> int | None:
+    if path and os.path.exists(path):
+        return os.path.getsize(path)
+    return None
+
+
+def build_manifest(video_id: str, duration: float, moments: list[dict], r2_results: dict) -> dict:
+    """Assemble the manifest for one video from uploaded moments."""
+    frames = []
+    for moment in sorted(moments, key=lambda m: m["rank"]):
+        rank = moment["rank"]
+        r2_info = r2_results.get(rank, {})
+        r2_variants = r2_info.get("r2_variants", {})
+        variant_paths = moment.get("variant_paths", {})
+
+        frame = {
+            "rank": rank,
+            "t": round(moment["timestamp"], 3),
+            "heat": moment["value"],
+            "w": moment.get("width"),
+            "h": moment.get("height"),
+            "key": r2_info.get("r2_path", f"frames/{video_id}/f{rank:02d}.webp"),
+            "bytes": moment.get("file_size"),
+            "variants": {
+                name: {"key": key, "bytes": _file_size(variant_paths.get(name))}
+                for name, key in r2_variants.items()
+                if name != "atlases"
+            },
+        }
+        if "atlases" in r2_variants:
+            frame["atlases"] = r2_variants["atlases"]
+        frames.append(frame)
+
+    return {
+        "v": MANIFEST_VERSION,
+        "video_id": video_id,
+        "duration": duration,
+        "frames": frames,
+    }
+
+
+def encode_manifest(manifest: dict) -> bytes:
+    """Compact, deterministic JSON encoding (stable across runs)."""
+    return json.dumps(manifest, separators=(",", ":"), sort_keys=True).encode()
+
+
+def manifest_key(video_id: str, body: bytes) -> str:
+    digest = hashlib.sha256(body).hexdigest()[:12]
+    return f"frames/{video_id}/manifest.{digest}.json"
+
+
+def upload_manifest(s3_client, bucket: str, manifest: dict) -> str:
+    """Upload the manifest under its content-addressed key. Returns the key."""
+    body = encode_manifest(manifest)
+    key = manifest_key(manifest["video_id"], body)
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=body,
+        ContentType="application/json",
+        CacheControl=MANIFEST_CACHE_CONTROL,
+    )
+    log.info(f"  Uploaded {key} ({len(body)} bytes)")
+    return key
+
+
+def catalog_entry(manifest: dict, key: str) -> dict:
+    return {
+        "manifest": key,
+        "frames": len(manifest["frames"]),
+        "duration": manifest["duration"],
+    }
+
+
+def _read_catalog(s3_client, bucket: str) -> tuple[dict, str | None]:
+    """(catalog, ETag) — the ETag is None when no catalog exists yet."""
+    try:
+        obj = s3_client.get_object(Bucket=bucket, Key=CATALOG_KEY)
+    except s3_client.exceptions.NoSuchKey:
+        return {"v": MANIFEST_VERSION, "videos": {}}, None
+    return json.loads(obj["Body"].read()), obj.get("ETag")
+
+
+def load_catalog(s3_client, bucket: str) -> dict:
+    """Current catalog/index.json (an empty catalog if none exists yet)."""
+    return _read_catalog(s3_client, bucket)[0]
+
+
+def _lost_race(error: Exception) -> bool:
+    """True for the 412/409 a conditional put fails with when another writer won."""
+    response = getattr(error, "response", None) or {}
+    code = response.get("Error", {}).get("Code")
+    status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code in ("PreconditionFailed", "ConditionalRequestConflict") or status in (409, 412)
+
+
+def update_catalog(s3_client, bucket: str, entries: dict[str, dict]) -> dict:
+    """
+    Merge catalog entries (video_id → entry) into catalog/index.json with a
+    conditional put, re-reading and merging again when a concurrent writer
+    got there first. Safe to call per video from any number of processes.
+    """
+    for attempt in range(1, CATALOG_WRITE_ATTEMPTS + 1):
+        catalog, etag = _read_catalog(s3_client, bucket)
+        catalog.setdefault("videos", {}).update(entries)
+        catalog["v"] = MANIFEST_VERSION
+        catalog["updated_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+        condition = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+        try:
+            s3_client.put_object(
+                Bucket=bucket,
+                Key=CATALOG_KEY,
+                Body=json.dumps(catalog, separators=(",", ":"), sort_keys=True).encode(),
+                ContentType="application/json",
+                CacheControl=CATALOG_CACHE_CONTROL,
+                **condition,
+            )
+        except Exception as e:
+            if not _lost_race(e) or attempt == CATALOG_WRITE_ATTEMPTS:
+                raise
+            log.info(f"  {CATALOG_KEY} changed while merging — retrying ({attempt})")
+            time.sleep(random.uniform(0, 0.1 * 2**attempt))
+            continue
+        log.info(f"Updated {CATALOG_KEY}: {len(entries)} changed, {len(catalog['videos'])} total")
+        return catalog
@@ -0,0 +1,345 @@
+"""
+Memory-bounded processing
+=========================
+Keeps a batch under a configurable peak-RSS budget so the pipeline can run
+in small containers next to other services without being OOM-killed.
+
+The budget is enforced at frame granularity:
+  - at most ``max_in_flight`` frames are decoded/transformed at once
+  - memory in use is this process plus its ffmpeg/ffprobe children, or the
+    container's cgroup working set when that is larger
+  - before a frame starts, usage plus the frame's expected footprint is
+    checked; above the soft limit the process collects garbage and returns
+    freed arenas to the OS, above the hard limit the frame waits for
+    running frames to finish, and fails with MemoryBudgetExceeded when
+    none are left to free anything
+  - work files are spilled to a disk-backed directory when the default
+    temp dir lives on tmpfs (which is charged against the container's RAM)
+
+Usage:
+    budget = MemoryBudget(limit_mb=512, trace=True)
+    with budget.frame_slot("abc123 f01", frame_reserve_bytes(1280)):
+        ...decode + generate variants...
+    log.info(budget.summary())
+"""
+
+import ctypes
+import ctypes.util
+import gc
+import logging
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+# Fraction of the limit at which we start reclaiming memory before a frame.
+SOFT_LIMIT_RATIO = 0.8
+
+# How long an over-budget frame waits for running frames to free memory
+# before it fails.
+OVER_BUDGET_WAIT_SEC = 60.0
+
+# Expected footprint of one frame on top of current usage: a single-threaded
+# ffmpeg decoder (up to 4K) plus a few RGBA copies of the output frame while
+# variants are rendered.
+FFMPEG_RESERVE_MB = 96
+FRAME_COPIES = 4
+
+CGROUP_DIR = "/sys/fs/cgroup"
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """Raised when a frame cannot start without going over the budget."""
+
+
+# ---------------------------------------------------------------------------
+# RSS probes
+# ---------------------------------------------------------------------------
+def current_rss_bytes() -> int:
+    """Resident set size of this process, in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Non-Linux: fall back to the high-water mark, the best we have.
+        return peak_rss_bytes()
+
+
+def _proc_stats() -> dict[int, tuple[int, int]]:
+    """pid → (ppid, resident pages) for every visible process."""
+    stats = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # Fields after the parenthesised command name: state, ppid, ...
+                fields = f.read().rsplit(")", 1)[1].split()
+            stats[int(name)] = (int(fields[1]), int(fields[21]))
+        except (OSError, ValueError, IndexError):
+            continue      # exited while we were scanning
+    return stats
+
+
+def process_tree_rss_bytes() -> int:
+    """RSS of this process plus all its descendants (ffmpeg/ffprobe), in bytes."""
+    try:
+        stats = _proc_stats()
+    except OSError:
+        return current_rss_bytes()
+    children: dict[int, list[int]] = {}
+    for pid, (ppid, _) in stats.items():
+        children.setdefault(ppid, []).append(pid)
+
+    total, stack = 0, [os.getpid()]
+    while stack:
+        pid = stack.pop()
+        total += stats.get(pid, (0, 0))[1]
+        stack.extend(children.get(pid, ()))
+    if total == 0:
+        return current_rss_bytes()
+    return total * os.sysconf("SC_PAGE_SIZE")
+
+
+def cgroup_working_set_bytes() -> int | None:
+    """
+    The container's cgroup v2 memory usage minus reclaimable page cache
+    (what the OOM killer goes by), or None outside a cgroup v2 container.
+    """
+    try:
+        with open(os.path.join(CGROUP_DIR, "memory.current")) as f:
+            usage = int(f.read())
+        inactive_file = 0
+        with open(os.path.join(CGROUP_DIR, "memory.stat")) as f:
+            for line in f:
+                key, _, value = line.partition(" ")
+                if key == "inactive_file":
+                    inactive_file = int(value)
+                    break
+    except (OSError, ValueError):
+        return None
+    return max(0, usage - inactive_file)
+
+
+def memory_usage_bytes() -> int:
+    """Memory charged to the batch: process tree RSS or cgroup working set, whichever is larger."""
+    return max(process_tree_rss_bytes(), cgroup_working_set_bytes() or 0)
+
+
+def frame_reserve_bytes(frame_width: int) -> int:
+    """Headroom one frame of ``frame_width`` pixels (16:9) needs to run."""
+    frame_bytes = frame_width * (frame_width * 9 // 16) * 4
+    return FFMPEG_RESERVE_MB * 2**20 + frame_bytes * FRAME_COPIES
+
+
+def _maxrss_to_bytes(value: int) -> int:
+    # ru_maxrss is kilobytes on Linux, bytes on macOS.
+    return value if sys.platform == "darwin" else value * 1024
+
+
+def peak_rss_bytes() -> int:
+    """Peak RSS of this process since start, in bytes."""
+    return _maxrss_to_bytes(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def peak_child_rss_bytes() -> int:
+    """Peak RSS of the largest reaped child (ffmpeg/ffprobe), in bytes."""
+    return _maxrss_to_bytes(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def release_memory():
+    """Collect garbage and ask glibc to hand freed heap pages back to the OS."""
+    gc.collect()
+    libc_name = ctypes.util.find_library("c")
+    if not libc_name:
+        return
+    try:
+        libc = ctypes.CDLL(libc_name)
+        if hasattr(libc, "malloc_trim"):
+            libc.malloc_trim(0)
+    except OSError:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Spill directory
+# ---------------------------------------------------------------------------
+def _is_tmpfs(path: str) -> bool:
+    """True when ``path`` lives on a RAM-backed filesystem."""
+    path = os.path.realpath(path)
+    best_mount, best_type = "", ""
+    try:
+        with open("/proc/mounts") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                mount, fstype = parts[1], parts[2]
+                if (path == mount or path.startswith(mount.rstrip("/") + "/")) and len(
+                    mount
+                ) > len(best_mount):
+                    best_mount, best_type = mount, fstype
+    except OSError:
+        return False
+    return best_type in ("tmpfs", "ramfs")
+
+
+def spill_root(spill_dir: str | None = None) -> str | None:
+    """
+    Directory to create per-video work dirs in.
+    Returns ``spill_dir`` when the system temp dir is RAM-backed, else None
+    (meaning: use the default temp dir).
+    """
+    if not spill_dir:
+        return None
+    if not _is_tmpfs(tempfile.gettempdir()):
+        return None
+    os.makedirs(spill_dir, exist_ok=True)
+    return spill_dir
+
+
+# ---------------------------------------------------------------------------
+# Budget
+# ---------------------------------------------------------------------------
+class MemoryBudget:
+    """
+    Peak-RSS governor shared by every frame of a batch.
+    A ``limit_mb`` of 0 disables enforcement but still records samples.
+    """
+
+    def __init__(
+        self,
+        limit_mb: int = 0,
+        max_in_flight: int = 1,
+        spill_dir: str | None = None,
+        trace: bool = False,
+    ):
+        self.limit_bytes = limit_mb * 1024 * 1024
+        self.max_in_flight = max(1, max_in_flight)
+        self.spill_dir = spill_dir
+        self.trace = trace
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._lock = threading.Lock()
+        self._finished = threading.Condition()   # signalled when a running frame ends
+        self._running = 0
+        self._reserved = 0      # footprint promised to running frames
+        self.samples = 0
+        self.reclaims = 0
+        self.overruns = 0
+        self.max_observed_rss = 0
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit_bytes > 0
+
+    @property
+    def soft_limit_bytes(self) -> int:
+        return int(self.limit_bytes * SOFT_LIMIT_RATIO)
+
+    def sample(self) -> int:
+        rss = memory_usage_bytes()
+        with self._lock:
+            self.samples += 1
+            self.max_observed_rss = max(self.max_observed_rss, rss)
+        return rss
+
+    def work_dir_root(self) -> str | None:
+        """Parent directory for per-video temp dirs (None = system default)."""
+        return spill_root(self.spill_dir) if self.enabled else None
+
+    def ffmpeg_args(self) -> list[str]:
+        """Extra ffmpeg flags that cap decoder memory on large (4K) sources."""
+        if not self.enabled:
+            return []
+        return ["-threads", "1", "-filter_threads", "1"]
+
+    def _fits(self, usage: int, reserve_bytes: int, limit: int) -> bool:
+        # Running frames may not have allocated their footprint yet.
+        return not self.enabled or usage + self._reserved + reserve_bytes <= limit
+
+    def _admit(self, label: str, reserve_bytes: int):
+        """Wait until the frame fits, then reserve its footprint (caller holds _finished)."""
+        if not self._fits(self.sample(), reserve_bytes, self.soft_limit_bytes):
+            release_memory()
+            with self._lock:
+                self.reclaims += 1
+            deadline = time.monotonic() + OVER_BUDGET_WAIT_SEC
+            usage = self.sample()
+            # Waiting only helps while another frame holds memory it will free.
+            while not self._fits(usage, reserve_bytes, self.limit_bytes) and self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._finished.wait(remaining)
+                release_memory()
+                usage = self.sample()
+
+            if not self._fits(usage, reserve_bytes, self.limit_bytes):
+                with self._lock:
+                    self.overruns += 1
+                raise MemoryBudgetExceeded(
+                    f"{usage / 2**20:.0f} MB in use + "
+                    f"{(self._reserved + reserve_bytes) / 2**20:.0f} MB reserved with {label} "
+                    f"exceeds budget {self.limit_bytes / 2**20:.0f} MB"
+                )
+        self._running += 1
+        self._reserved += reserve_bytes
+
+    @contextmanager
+    def frame_slot(self, label: str = "frame", reserve_bytes: int = 0):
+        """
+        Gate one frame's decode + variant work behind the budget.
+        ``reserve_bytes`` is the frame's expected footprint (see
+        frame_reserve_bytes); raises MemoryBudgetExceeded when it won't fit.
+        """
+        with self._slots:
+            with self._finished:
+                self._admit(label, reserve_bytes)
+            try:
+                yield
+            finally:
+                gc.collect()
+                self.sample()
+                with self._finished:
+                    self._running -= 1
+                    self._reserved -= reserve_bytes
+                    self._finished.notify_all()
+
+    def report(self) -> dict:
+        """Memory statistics for the batch summary."""
+        result = {
+            "limit_mb": self.limit_bytes / 2**20,
+            "peak_rss_mb": round(peak_rss_bytes() / 2**20, 1),
+            "peak_child_rss_mb": round(peak_child_rss_bytes() / 2**20, 1),
+            "max_sampled_usage_mb": round(self.max_observed_rss / 2**20, 1),
+            "samples": self.samples,
+            "reclaims": self.reclaims,
+            "overruns": self.overruns,   # frames failed for lack of memory
+        }
+        if self.trace and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            result["tracemalloc_current_mb"] = round(current / 2**20, 1)
+            result["tracemalloc_peak_mb"] = round(peak / 2**20, 1)
+        return result
+
+    def summary(self) -> str:
+        r = self.report()
+        parts = [
+            f"peak RSS {r['peak_rss_mb']:.0f} MB",
+            f"ffmpeg peak {r['peak_child_rss_mb']:.0f} MB",
+        ]
+        if self.enabled:
+            parts.append(f"budget {r['limit_mb']:.0f} MB")
+            parts.append(f"{r['reclaims']} reclaims, {r['overruns']} overruns")
+        if "tracemalloc_peak_mb" in r:
+            parts.append(f"tracemalloc peak {r['tracemalloc_peak_mb']:.1f} MB")
+        return ", ".join(parts)
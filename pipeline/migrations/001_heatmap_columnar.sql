@@ -0,0 +1,11 @@
+-- ============================================
+-- 001 — Compact columnar heatmap storage
+-- ============================================
+-- Adds DOUBLE PRECISION start/step + REAL[] columns next to heatmap_raw.
+-- After applying, backfill existing rows with:
+--     python heatmap_codec.py migrate [--drop-json]
+-- ============================================
+
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS heatmap_start DOUBLE PRECISION;
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS heatmap_step DOUBLE PRECISION;
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS heatmap_values REAL[];
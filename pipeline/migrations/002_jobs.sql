@@ -0,0 +1,30 @@
+-- ============================================
+-- 002 — Distributed job queue
+-- ============================================
+-- Shared queue for extract_batch --worker processes.
+-- ============================================
+
+-- Distributed extraction queue (see job_queue.py)
+CREATE TABLE IF NOT EXISTS jobs (
+    id              BIGSERIAL PRIMARY KEY,
+    url             TEXT NOT NULL,
+    status          VARCHAR(10) NOT NULL DEFAULT 'pending'
+                    CHECK (status IN ('pending', 'running', 'done', 'failed')),
+    attempts        SMALLINT NOT NULL DEFAULT 0,
+    max_attempts    SMALLINT NOT NULL DEFAULT 3,
+    worker_id       TEXT,
+    lease_expires_at TIMESTAMPTZ,
+    heartbeat_at    TIMESTAMPTZ,
+    last_error      TEXT,
+    result          JSONB,
+    created_at      TIMESTAMPTZ DEFAULT NOW(),
+    started_at      TIMESTAMPTZ,
+    finished_at     TIMESTAMPTZ,
+    updated_at      TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- One active job per URL; finished jobs are kept as history
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_url
+    ON jobs(url) WHERE status IN ('pending', 'running');
+CREATE INDEX IF NOT EXISTS idx_jobs_claimable
+    ON jobs(created_at, id) WHERE status IN ('pending', 'running');
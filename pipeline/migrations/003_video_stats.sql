@@ -0,0 +1,46 @@
+-- ============================================
+-- 003 — Incrementally maintained pipeline status
+-- ============================================
+-- pipeline_status used to GROUP BY videos × frames on every query.
+-- video_stats holds the per-video frame count, bytes and timings and is
+-- rewritten by save_to_database inside the same transaction as the
+-- frames, so the view becomes a join on primary keys.
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS video_stats (
+    video_id        VARCHAR(20) PRIMARY KEY REFERENCES videos(video_id) ON DELETE CASCADE,
+    frame_count     INTEGER NOT NULL DEFAULT 0,
+    total_size_bytes BIGINT NOT NULL DEFAULT 0,
+    processing_ms   INTEGER,                -- wall time of the last pipeline run
+    stage_ms        JSONB,                  -- per-stage timings of the last run
+    updated_at      TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_video_stats_incomplete
+    ON video_stats(updated_at) WHERE frame_count = 0;
+CREATE INDEX IF NOT EXISTS idx_videos_processed_at ON videos(processed_at DESC);
+
+-- Backfill from the existing frames (timings are unknown for old runs)
+INSERT INTO video_stats (video_id, frame_count, total_size_bytes)
+SELECT v.video_id, COUNT(f.id), COALESCE(SUM(f.file_size), 0)
+FROM videos v
+LEFT JOIN frames f ON f.video_id = v.video_id
+GROUP BY v.video_id
+ON CONFLICT (video_id) DO NOTHING;
+
+-- Same columns as before, plus processing_ms at the end
+CREATE OR REPLACE VIEW pipeline_status AS
+SELECT
+    v.video_id,
+    v.title,
+    v.channel,
+    v.category,
+    v.duration,
+    v.view_count,
+    v.processed_at,
+    COALESCE(s.frame_count, 0)::BIGINT AS frame_count,
+    NULLIF(s.total_size_bytes, 0) AS total_size_bytes,
+    s.processing_ms
+FROM videos v
+LEFT JOIN video_stats s ON s.video_id = v.video_id
+ORDER BY v.processed_at DESC;
@@ -0,0 +1,132 @@
+"""
+Frame quality gate
+==================
+Cheap NumPy checks run right after a frame is captured and before any
+variants are generated, so black fades, transition blurs and repeated
+shots never reach variant generation, R2 or the database.
+
+Each check works on a 320px grayscale proxy of the frame and costs a few
+milliseconds:
+  - mean luminance   rejects black fades and white flashes
+  - contrast         rejects flat single-colour frames
+  - sharpness        variance of the Laplacian; rejects motion/transition blur
+  - difference hash  64-bit perceptual hash; rejects near-duplicates of a
+                     frame already accepted for the same video
+"""
+
+import importlib.util
+import logging
+
+# Imported lazily in frame_metrics so loading this module stays cheap.
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+HAS_PILLOW = importlib.util.find_spec("PIL") is not None
+
+log = logging.getLogger(__name__)
+
+# Thresholds (luminance on a 0-255 scale)
+MIN_LUMINANCE = 18            # darker → black fade
+MAX_LUMINANCE = 245           # brighter → white flash
+MIN_CONTRAST = 6.0            # luminance std-dev below this → flat frame
+MIN_SHARPNESS = 20.0          # Laplacian variance below this → blurred
+MAX_DUPLICATE_DISTANCE = 6    # dHash Hamming distance ≤ this → near-duplicate
+
+PROXY_WIDTH = 320             # analysis resolution
+
+
+def frame_metrics(frame_path: str) -> dict:
+    """Luminance, contrast, sharpness and dHash of a frame on disk."""
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(frame_path) as img:
+        gray = img.convert("L")
+    w, h = gray.size
+    if w > PROXY_WIDTH:
+        proxy = gray.resize((PROXY_WIDTH, max(1, h * PROXY_WIDTH // w)), Image.BILINEAR)
+    else:
+        proxy = gray
+    px = np.asarray(proxy, dtype=np.float32)
+
+    # 4-neighbour Laplacian on the interior pixels
+    lap = (
+        4 * px[1:-1, 1:-1]
+        - px[:-2, 1:-1] - px[2:, 1:-1]
+        - px[1:-1, :-2] - px[1:-1, 2:]
+    )
+
+    # Difference hash: 9x8 thumbnail, compare horizontal neighbours
+    small = np.asarray(gray.resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    dhash = int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+    gray.close()
+    if proxy is not gray:
+        proxy.close()
+
+    return {
+        "luminance": float(px.mean()),
+        "contrast": float(px.std()),
+        "sharpness": float(lap.var()) if lap.size else 0.0,
+        "dhash": dhash,
+    }
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class QualityGate:
+    """
+    Per-video frame filter. Remembers the hashes of accepted frames so
+    near-duplicates within the same video are rejected.
+    """
+
+    def __init__(
+        self,
+        min_luminance: float = MIN_LUMINANCE,
+        max_luminance: float = MAX_LUMINANCE,
+        min_contrast: float = MIN_CONTRAST,
+        min_sharpness: float = MIN_SHARPNESS,
+        max_duplicate_distance: int = MAX_DUPLICATE_DISTANCE,
+    ):
+        self.min_luminance = min_luminance
+        self.max_luminance = max_luminance
+        self.min_contrast = min_contrast
+        self.min_sharpness = min_sharpness
+        self.max_duplicate_distance = max_duplicate_distance
+        self.accepted_hashes: list[int] = []
+
+    @property
+    def available(self) -> bool:
+        return HAS_NUMPY and HAS_PILLOW
+
+    def reset(self):
+        self.accepted_hashes = []
+
+    def rejection_reason(self, metrics: dict) -> str | None:
+        """Why a frame with these metrics is unusable, or None if it's fine."""
+        if metrics["luminance"] < self.min_luminance:
+            return f"too dark (luminance {metrics['luminance']:.0f})"
+        if metrics["luminance"] > self.max_luminance:
+            return f"too bright (luminance {metrics['luminance']:.0f})"
+        if metrics["contrast"] < self.min_contrast:
+            return f"flat (contrast {metrics['contrast']:.1f})"
+        if metrics["sharpness"] < self.min_sharpness:
+            return f"blurred (sharpness {metrics['sharpness']:.1f})"
+        for seen in self.accepted_hashes:
+            if hamming(metrics["dhash"], seen) <= self.max_duplicate_distance:
+                return "near-duplicate of an accepted frame"
+        return None
+
+    def check(self, frame_path: str) -> tuple[bool, str | None, dict]:
+        """
+        Evaluate a frame. Accepted frames are remembered for duplicate checks.
+        Returns (accepted, reason, metrics).
+        """
+        if not self.available:
+            return True, None, {}
+        metrics = frame_metrics(frame_path)
+        reason = self.rejection_reason(metrics)
+        if reason is None:
+            self.accepted_hashes.append(metrics["dhash"])
+        return reason is None, reason, metrics
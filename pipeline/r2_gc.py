@@ -0,0 +1,248 @@
+"""
+R2 garbage collection
+=====================
+With IMMUTABLE_KEYS, reprocessing a video uploads new content-hashed
+objects and repoints ``frames`` at them; the previous objects are never
+overwritten, so they have to be swept. This walks ``frames/`` in R2 one
+listing page at a time and deletes objects nothing references any more:
+
+  - frame, variant and atlas keys are referenced by ``frames.r2_path`` /
+    ``frames.r2_variants``, looked up with one query per listing page for
+    just the videos on that page
+  - manifests are referenced by catalog/index.json. Since the catalog can
+    lag behind the database, a manifest it doesn't list is still kept when
+    it was written by the video's latest run (not older than
+    ``videos.processed_at``)
+  - variants written back by variant_server.py (``f01_<name>.<hash>.webp``,
+    not recorded in ``frames``) carry the hash of the master they were
+    rendered from. They are kept while that is the current content-hashed
+    master; for a fixed-key master (whose hash isn't in its key) while they
+    were written after the video's latest run
+  - objects younger than the grace period are kept (an upload may not be
+    committed to the database yet), and so is everything under a video
+    processed within the grace period (clients may still hold its previous
+    manifest)
+  - deletes go out in DeleteObjects batches of up to 1000 keys
+
+Usage:
+    python r2_gc.py                      # dry run: report what would go
+    python r2_gc.py --delete --grace-hours 48
+"""
+
+import argparse
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from functools import partial
+
+from extract_frames import DATABASE_SSLMODE, DATABASE_URL, R2_BUCKET, get_r2_client, setup_logging
+from manifest import load_catalog
+
+log = logging.getLogger(__name__)
+
+FRAMES_PREFIX = "frames/"
+GRACE_HOURS = 24
+PAGE_SIZE = 1000
+DELETE_BATCH = 1000            # DeleteObjects limit
+
+# Object timestamps (R2) vs processed_at (Postgres) come from different clocks.
+CLOCK_SKEW = timedelta(minutes=5)
+
+# Keys written for the latest run but not listed in ``frames``: manifests,
+# and variant_server write-backs (f01_<variant>.<master hash>.webp).
+MANIFEST_KEY = re.compile(r"^frames/[^/]+/manifest\.[0-9a-f]+\.json$")
+WRITE_BACK_KEY = re.compile(r"^(frames/[^/]+/f\d{2})_[a-z0-9_]+\.([0-9a-f]{12})\.webp$")
+
+
+def frame_keys(r2_path: str, r2_variants: dict) -> set[str]:
+    """Every object key one ``frames`` row points at."""
+    keys = {r2_path}
+    for name, value in (r2_variants or {}).items():
+        if name == "atlases":
+            keys.update(atlas["key"] for atlas in value.values())
+        else:
+            keys.add(value)
+    return keys
+
+
+def video_references(
+    conn, video_ids: list[str], grace_hours: float
+) -> tuple[set[str], set[str], dict[str, datetime]]:
+    """
+    (referenced keys, recently processed video IDs, video ID → processed_at)
+    for ``video_ids``. Videos missing from the database are in neither.
+    """
+    referenced, recent, processed = set(), set(), {}
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT v.video_id, v.processed_at,
+                   v.processed_at > NOW() - %s * INTERVAL '1 hour',
+                   f.r2_path, f.r2_variants
+            FROM videos v
+            LEFT JOIN frames f ON f.video_id = v.video_id
+            WHERE v.video_id = ANY(%s)
+            """,
+            (grace_hours, video_ids),
+        )
+        for video_id, processed_at, is_recent, r2_path, r2_variants in cur:
+            processed[video_id] = processed_at
+            if is_recent:
+                recent.add(video_id)
+            if r2_path:
+                referenced |= frame_keys(r2_path, r2_variants)
+    conn.rollback()   # read-only; don't hold a transaction open between pages
+    return referenced, recent, processed
+
+
+def iter_pages(s3_client, bucket: str, prefix: str = FRAMES_PREFIX, page_size: int | None = None):
+    """Yield lists of ``{"Key", "LastModified", "Size"}`` one listing page at a time."""
+    kwargs = {"Bucket": bucket, "Prefix": prefix, "MaxKeys": page_size or PAGE_SIZE}
+    while True:
+        page = s3_client.list_objects_v2(**kwargs)
+        yield page.get("Contents", [])
+        if not page.get("IsTruncated"):
+            return
+        kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+
+def _video_id(key: str) -> str:
+    return key.split("/", 2)[1]
+
+
+def _from_latest_run(obj: dict, referenced: set[str], processed_at: datetime | None) -> bool:
+    """Manifest or write-back belonging to the video's current master."""
+    if processed_at is None:
+        return False   # video no longer in the database
+    write_back = WRITE_BACK_KEY.match(obj["Key"])
+    if write_back:
+        master, version = write_back.groups()
+        if f"{master}.{version}.webp" in referenced:
+            return True    # rendered from the current content-hashed master
+        if f"{master}.webp" not in referenced:
+            return False   # from a superseded master (or a hashed variant)
+    elif not MANIFEST_KEY.match(obj["Key"]):
+        return False
+    if processed_at.tzinfo is None:
+        processed_at = processed_at.replace(tzinfo=timezone.utc)
+    return obj["LastModified"] >= processed_at - CLOCK_SKEW
+
+
+class Sweeper:
+    """Batches deletes and keeps the counters reported at the end."""
+
+    def __init__(self, s3_client, bucket: str, dry_run: bool = True):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.dry_run = dry_run
+        self.pending = []
+        self.stats = {
+            "scanned": 0, "referenced": 0, "young": 0,
+            "deleted": 0, "deleted_bytes": 0, "errors": 0,
+        }
+
+    def delete(self, obj: dict):
+        self.pending.append(obj)
+        if len(self.pending) >= DELETE_BATCH:
+            self.flush()
+
+    def flush(self):
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        failed = set()
+        if not self.dry_run:
+            resp = self.s3.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": obj["Key"]} for obj in batch], "Quiet": True},
+            )
+            for error in resp.get("Errors", []):
+                log.warning(f"  Could not delete {error.get('Key')}: {error.get('Message')}")
+                failed.add(error.get("Key"))
+        done = [obj for obj in batch if obj["Key"] not in failed]
+        self.stats["errors"] += len(failed)
+        self.stats["deleted"] += len(done)
+        self.stats["deleted_bytes"] += sum(obj.get("Size", 0) for obj in done)
+        log.info(f"  {'Would delete' if self.dry_run else 'Deleted'} {len(done)} object(s)")
+
+
+def sweep(s3_client, bucket: str, lookup, grace_hours: float = GRACE_HOURS,
+          dry_run: bool = True, prefix: str = FRAMES_PREFIX, now: datetime | None = None) -> dict:
+    """
+    Delete unreferenced objects under ``prefix``. ``lookup(video_ids)``
+    returns (referenced keys, recently processed video IDs, video ID →
+    processed_at) for one page. Returns the sweep counters.
+    """
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(hours=grace_hours)
+    manifests = {entry["manifest"] for entry in load_catalog(s3_client, bucket)["videos"].values()}
+    sweeper = Sweeper(s3_client, bucket, dry_run)
+
+    for page in iter_pages(s3_client, bucket, prefix):
+        sweeper.stats["scanned"] += len(page)
+        candidates = []
+        for obj in page:
+            if obj["LastModified"] > cutoff:
+                sweeper.stats["young"] += 1
+            elif obj["Key"] in manifests:
+                sweeper.stats["referenced"] += 1
+            else:
+                candidates.append(obj)
+        if not candidates:
+            continue
+
+        referenced, recent, processed = lookup(
+            sorted({_video_id(obj["Key"]) for obj in candidates})
+        )
+        for obj in candidates:
+            key, video_id = obj["Key"], _video_id(obj["Key"])
+            if video_id in recent:
+                sweeper.stats["young"] += 1
+            elif key in referenced or _from_latest_run(obj, referenced, processed.get(video_id)):
+                sweeper.stats["referenced"] += 1
+            else:
+                sweeper.delete(obj)
+
+    sweeper.flush()
+    return sweeper.stats
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Delete R2 frame objects nothing references")
+    parser.add_argument("--delete", action="store_true", help="Actually delete (default: dry run)")
+    parser.add_argument("--grace-hours", type=float, default=GRACE_HOURS)
+    parser.add_argument("--prefix", default=FRAMES_PREFIX)
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    if not args.prefix.startswith(FRAMES_PREFIX):
+        raise SystemExit(f"--prefix must be under {FRAMES_PREFIX}")
+    s3_client = get_r2_client()
+    if s3_client is None:
+        raise SystemExit("R2 is not configured (R2_ENDPOINT / R2_ACCESS_KEY / R2_SECRET_KEY)")
+    if not DATABASE_URL:
+        raise SystemExit("DATABASE_URL environment variable is required")
+
+    import psycopg2
+
+    conn = psycopg2.connect(DATABASE_URL, sslmode=DATABASE_SSLMODE)
+    try:
+        stats = sweep(
+            s3_client, R2_BUCKET,
+            partial(video_references, conn, grace_hours=args.grace_hours),
+            grace_hours=args.grace_hours, dry_run=not args.delete, prefix=args.prefix,
+        )
+    finally:
+        conn.close()
+
+    mode = "deleted" if args.delete else "would delete"
+    log.info(
+        f"GC: scanned {stats['scanned']}, kept {stats['referenced']} referenced + "
+        f"{stats['young']} within grace, {mode} {stats['deleted']} "
+        f"({stats['deleted_bytes'] / 1024 / 1024:.1f} MB), {stats['errors']} error(s)"
+    )
+    if stats["errors"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
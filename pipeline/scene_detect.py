@@ -0,0 +1,196 @@
+"""
+Proxy scene detection
+=====================
+Fallback for videos without a YouTube "most replayed" heatmap. Instead of
+evenly spaced guesses, a tiny proxy of the video is decoded and scored:
+
+  - ffmpeg decodes only keyframes (``-skip_frame nokey``) of the smallest
+    available rendition, scales them to 160x90 grayscale and resamples to
+    1 fps; raw bytes are streamed straight into NumPy in blocks
+  - each proxy frame gets a scene-change score (mean absolute difference
+    to the previous frame) and an activity score (luminance std-dev); dark,
+    washed-out and flat frames use the quality gate thresholds and score 0
+  - per-frame scores are max-pooled into fixed-length synthetic heatmap
+    segments that find_top_moments consumes like a real heatmap
+
+Skipping non-key frames means an hour-long video costs a few seconds of
+single-threaded CPU rather than a full decode.
+"""
+
+import importlib.util
+import logging
+import math
+import subprocess
+import tempfile
+import threading
+
+from quality_gate import MAX_LUMINANCE, MIN_CONTRAST, MIN_LUMINANCE
+
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+log = logging.getLogger(__name__)
+
+PROXY_WIDTH = 160
+PROXY_HEIGHT = 90
+PROXY_FPS = 1
+PROXY_MAX_HEIGHT = 360         # never pick a larger rendition for the proxy
+PROXY_TIMEOUT_SEC = 120
+BLOCK_FRAMES = 64              # frames converted to NumPy per read
+
+SCENE_CHANGE_WEIGHT = 0.6
+ACTIVITY_WEIGHT = 0.4
+NORMALIZE_PERCENTILE = 95      # non-zero scores are scaled so this percentile → 1.0
+MIN_SEGMENT_SEC = 2.0
+MAX_SEGMENTS = 400
+
+
+class SceneDetectionError(RuntimeError):
+    """The proxy could not be decoded or scored."""
+
+
+def get_proxy_video_url(info: dict) -> str:
+    """Smallest video rendition (≤ PROXY_MAX_HEIGHT) from yt-dlp info."""
+    candidates = [
+        f for f in info.get("formats", [])
+        if f.get("vcodec", "none") != "none" and f.get("url")
+        and (f.get("height") or 0) <= PROXY_MAX_HEIGHT
+    ]
+    if candidates:
+        return min(candidates, key=lambda f: f.get("height") or 0)["url"]
+    from extract_frames import get_best_video_url
+
+    return get_best_video_url(info)
+
+
+def proxy_cmd(video_url: str, duration: float | None = None) -> list[str]:
+    """ffmpeg argv streaming keyframe-only 1 fps 160x90 gray raw frames to stdout."""
+    return [
+        "ffmpeg", "-v", "error",
+        "-threads", "1",
+        "-skip_frame", "nokey",
+        *(["-t", str(duration)] if duration else []),
+        "-i", video_url,
+        "-an", "-sn", "-dn",
+        "-vf", f"fps={PROXY_FPS},scale={PROXY_WIDTH}:{PROXY_HEIGHT},format=gray",
+        "-f", "rawvideo", "-pix_fmt", "gray",
+        "pipe:1",
+    ]
+
+
+def frame_features(video_url: str, duration: float | None = None, cmd=None):
+    """
+    Decode the proxy and return (scene_change, activity, luminance) arrays,
+    one value per proxy frame. Only the current block and the previous frame
+    are held in memory.
+    """
+    import numpy as np
+
+    frame_bytes = PROXY_WIDTH * PROXY_HEIGHT
+    stderr_file = tempfile.TemporaryFile()
+    try:
+        proc = subprocess.Popen(
+            cmd or proxy_cmd(video_url, duration),
+            stdout=subprocess.PIPE, stderr=stderr_file,
+        )
+    except OSError as e:
+        stderr_file.close()
+        raise SceneDetectionError(f"cannot start ffmpeg: {e}") from e
+    watchdog = threading.Timer(PROXY_TIMEOUT_SEC, proc.kill)
+    watchdog.start()
+    changes, activity, luminance = [], [], []
+    prev = None
+    try:
+        while True:
+            chunk = proc.stdout.read(frame_bytes * BLOCK_FRAMES)
+            count = len(chunk) // frame_bytes
+            if count == 0:
+                break
+            block = np.frombuffer(chunk[:count * frame_bytes], dtype=np.uint8)
+            block = block.reshape(count, PROXY_HEIGHT, PROXY_WIDTH).astype(np.int16)
+
+            flat = block.reshape(count, -1)
+            activity.append(flat.std(axis=1))
+            luminance.append(flat.mean(axis=1))
+
+            stacked = block if prev is None else np.concatenate([prev[None], block])
+            diffs = np.abs(np.diff(stacked, axis=0)).reshape(len(stacked) - 1, -1).mean(axis=1)
+            changes.append(np.concatenate([[0.0], diffs]) if prev is None else diffs)
+            prev = block[-1]
+        returncode = proc.wait()
+        stderr_file.seek(0)
+        stderr = stderr_file.read().decode(errors="replace")
+    finally:
+        watchdog.cancel()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        stderr_file.close()
+
+    if returncode != 0:
+        raise SceneDetectionError(f"proxy decode failed ({returncode}): {stderr[-300:]}")
+    if not activity:
+        raise SceneDetectionError("proxy decode produced no frames")
+    return np.concatenate(changes), np.concatenate(activity), np.concatenate(luminance)
+
+
+def _normalize(values):
+    import numpy as np
+
+    # Percentile of the non-zero values: cuts are rare, so the plain p95 of
+    # scene-change scores is usually 0 for videos with a handful of shots.
+    nonzero = values[values > 0]
+    if not nonzero.size:
+        return np.zeros_like(values, dtype=float)
+    return np.clip(values / np.percentile(nonzero, NORMALIZE_PERCENTILE), 0.0, 1.0)
+
+
+def score_frames(changes, activity, luminance):
+    """Per-frame interest score in [0, 1]; unusable frames score 0."""
+    import numpy as np
+
+    scores = SCENE_CHANGE_WEIGHT * _normalize(changes) + ACTIVITY_WEIGHT * _normalize(activity)
+    unusable = (luminance < MIN_LUMINANCE) | (luminance > MAX_LUMINANCE) | (activity < MIN_CONTRAST)
+    return np.where(unusable, 0.0, scores)
+
+
+def segment_length(duration: float) -> float:
+    """Synthetic segment length: ≥ MIN_SEGMENT_SEC and ≤ MAX_SEGMENTS segments."""
+    return max(MIN_SEGMENT_SEC, duration / MAX_SEGMENTS)
+
+
+def scores_to_heatmap(scores, duration: float, fps: float = PROXY_FPS) -> list[dict]:
+    """Max-pool per-frame scores into fixed-length heatmap segments."""
+    import numpy as np
+
+    seg_sec = segment_length(duration)
+    per_segment = max(1, round(seg_sec * fps))
+    n_segments = math.ceil(len(scores) / per_segment)
+    padded = np.zeros(n_segments * per_segment)
+    padded[:len(scores)] = scores
+    values = padded.reshape(n_segments, per_segment).max(axis=1)
+    peak = values.max()
+    if peak <= 0:
+        raise SceneDetectionError("no usable frames in proxy")
+    values = values / peak
+
+    step = per_segment / fps
+    return [
+        {
+            "start_time": round(i * step, 3),
+            "end_time": round(min((i + 1) * step, duration), 3),
+            "value": round(float(v), 4),
+        }
+        for i, v in enumerate(values)
+        if i * step < duration
+    ]
+
+
+def synthetic_heatmap(video_url: str, duration: float) -> list[dict]:
+    """Decode a proxy of ``video_url`` and return heatmap-shaped segments."""
+    if not HAS_NUMPY:
+        raise SceneDetectionError("NumPy not installed")
+    changes, activity, luminance = frame_features(video_url, duration)
+    heatmap = scores_to_heatmap(score_frames(changes, activity, luminance), duration)
+    log.info(f"  Scene detection: {len(changes)} proxy frames → {len(heatmap)} segments")
+    return heatmap
@@ -26,7 +26,10 @@ CREATE TABLE IF NOT EXISTS videos (
     upload_date     DATE,
     difficulty      SMALLINT DEFAULT 5,
     tags            TEXT[],
-    heatmap_raw     JSONB,
+    heatmap_raw     JSONB,                  -- only for irregular heatmaps (see heatmap_codec.py)
+    heatmap_start   DOUBLE PRECISION,       -- compact heatmap: first segment start (s)
+    heatmap_step    DOUBLE PRECISION,       -- compact heatmap: segment length (s)
+    heatmap_values  REAL[],                 -- compact heatmap: one value per segment
     processed_at    TIMESTAMPTZ DEFAULT NOW(),
     created_at      TIMESTAMPTZ DEFAULT NOW()
 );
@@ -34,6 +37,8 @@ CREATE TABLE IF NOT EXISTS videos (
 CREATE INDEX IF NOT EXISTS idx_videos_difficulty ON videos(difficulty);
 CREATE INDEX IF NOT EXISTS idx_videos_category ON videos(category);
 CREATE INDEX IF NOT EXISTS idx_videos_title_trgm ON videos USING GIN (title gin_trgm_ops);
+-- "recently processed" (DESC scan) and "stale videos" (processed_at < cutoff)
+CREATE INDEX IF NOT EXISTS idx_videos_processed_at ON videos(processed_at DESC);
 
 -- Extracted frames with R2 storage references
 CREATE TABLE IF NOT EXISTS frames (
@@ -53,7 +58,47 @@ CREATE TABLE IF NOT EXISTS frames (
 
 CREATE INDEX IF NOT EXISTS idx_frames_video ON frames(video_id);
 
--- View for easy querying
+-- Distributed extraction queue (see job_queue.py)
+CREATE TABLE IF NOT EXISTS jobs (
+    id              BIGSERIAL PRIMARY KEY,
+    url             TEXT NOT NULL,
+    status          VARCHAR(10) NOT NULL DEFAULT 'pending'
+                    CHECK (status IN ('pending', 'running', 'done', 'failed')),
+    attempts        SMALLINT NOT NULL DEFAULT 0,
+    max_attempts    SMALLINT NOT NULL DEFAULT 3,
+    worker_id       TEXT,
+    lease_expires_at TIMESTAMPTZ,
+    heartbeat_at    TIMESTAMPTZ,
+    last_error      TEXT,
+    result          JSONB,
+    created_at      TIMESTAMPTZ DEFAULT NOW(),
+    started_at      TIMESTAMPTZ,
+    finished_at     TIMESTAMPTZ,
+    updated_at      TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- One active job per URL; finished jobs are kept as history
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_url
+    ON jobs(url) WHERE status IN ('pending', 'running');
+CREATE INDEX IF NOT EXISTS idx_jobs_claimable
+    ON jobs(created_at, id) WHERE status IN ('pending', 'running');
+
+-- Per-video pipeline summary, maintained by save_to_database in the same
+-- transaction that rewrites the video's frames (see migrations/003)
+CREATE TABLE IF NOT EXISTS video_stats (
+    video_id        VARCHAR(20) PRIMARY KEY REFERENCES videos(video_id) ON DELETE CASCADE,
+    frame_count     INTEGER NOT NULL DEFAULT 0,
+    total_size_bytes BIGINT NOT NULL DEFAULT 0,
+    processing_ms   INTEGER,                -- wall time of the last pipeline run
+    stage_ms        JSONB,                  -- per-stage timings of the last run
+    updated_at      TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Videos that are missing frames (failed or partial runs)
+CREATE INDEX IF NOT EXISTS idx_video_stats_incomplete
+    ON video_stats(updated_at) WHERE frame_count = 0;
+
+-- View for easy querying; reads the summary instead of aggregating frames
 CREATE OR REPLACE VIEW pipeline_status AS
 SELECT
     v.video_id,
@@ -63,9 +108,9 @@ SELECT
     v.duration,
     v.view_count,
     v.processed_at,
-    COUNT(f.id) AS frame_count,
-    SUM(f.file_size) AS total_size_bytes
+    COALESCE(s.frame_count, 0)::BIGINT AS frame_count,
+    NULLIF(s.total_size_bytes, 0) AS total_size_bytes,
+    s.processing_ms
 FROM videos v
-LEFT JOIN frames f ON v.video_id = f.video_id
-GROUP BY v.id
+LEFT JOIN video_stats s ON s.video_id = v.video_id
 ORDER BY v.processed_at DESC;
@@ -0,0 +1,244 @@
+"""
+Tail-latency control for frame seeks
+====================================
+A single slow CDN range request used to hold ``extract_frame`` until its
+fixed 60s timeout and then fail the whole video. SeekController wraps each
+ffmpeg capture with:
+
+  - adaptive timeouts derived from the latency percentiles observed so far
+    in the batch (p99 × TIMEOUT_MULTIPLIER, clamped)
+  - hedging: when a capture runs longer than the usual p95, a duplicate
+    request is started and whichever finishes first wins
+  - bounded retries; only when ffmpeg reports an expired/forbidden URL
+    (HTTP 403/410) is the direct URL refreshed via the supplied callback
+    (get_video_info + get_best_video_url) before retrying. Timeouts and
+    runs that exit without writing a frame are retried on the same URL
+  - p50/p95/p99 latency metrics for the batch summary
+"""
+
+import logging
+import math
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT_SEC = 60.0    # used until enough samples are observed
+MIN_TIMEOUT_SEC = 10.0
+MAX_TIMEOUT_SEC = 120.0
+TIMEOUT_MULTIPLIER = 3.0      # timeout = p99 × this
+
+DEFAULT_HEDGE_SEC = 15.0      # hedge delay until enough samples are observed
+MIN_HEDGE_SEC = 2.0
+HEDGE_MULTIPLIER = 1.5        # hedge after p95 × this
+
+MIN_SAMPLES = 5               # samples needed before percentiles are trusted
+MAX_SAMPLES = 1000
+MAX_RETRIES = 2
+RETRY_BACKOFF_SEC = 0.5       # linear backoff between retries
+POLL_SEC = 0.05
+
+# ffmpeg stderr fragments that mean the signed googlevideo URL has expired
+# (403/410 only; a 404 or 429 is not fixed by a fresh URL)
+EXPIRED_URL_PATTERN = re.compile(r"(?:HTTP error|Server returned) (?:403|410)\b|403 Forbidden|410 Gone")
+
+
+def _has_output(path: str) -> bool:
+    return os.path.exists(path) and os.path.getsize(path) > 0
+
+
+class FrameCaptureError(RuntimeError):
+    """ffmpeg failed (or timed out) capturing a frame."""
+
+    def __init__(self, message: str, expired: bool = False, timed_out: bool = False):
+        super().__init__(message)
+        self.expired = expired
+        self.timed_out = timed_out
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an unsorted sample list."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class LatencyTracker:
+    """Capture latencies shared across a batch, plus hedge/retry counters."""
+
+    def __init__(self, max_samples: int = MAX_SAMPLES):
+        self._samples: deque[float] = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self.counters = {
+            "captures": 0, "hedges": 0, "hedge_wins": 0,
+            "retries": 0, "timeouts": 0, "url_refreshes": 0,
+        }
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.counters["captures"] += 1
+
+    def count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def samples(self) -> list[float]:
+        with self._lock:
+            return list(self._samples)
+
+    def percentile(self, pct: float) -> float:
+        return percentile(self.samples(), pct)
+
+    def timeout(self) -> float:
+        samples = self.samples()
+        if len(samples) < MIN_SAMPLES:
+            return DEFAULT_TIMEOUT_SEC
+        adaptive = percentile(samples, 99) * TIMEOUT_MULTIPLIER
+        return max(MIN_TIMEOUT_SEC, min(MAX_TIMEOUT_SEC, adaptive))
+
+    def hedge_delay(self) -> float:
+        samples = self.samples()
+        if len(samples) < MIN_SAMPLES:
+            return DEFAULT_HEDGE_SEC
+        return max(MIN_HEDGE_SEC, percentile(samples, 95) * HEDGE_MULTIPLIER)
+
+    def report(self) -> dict:
+        samples = self.samples()
+        return {
+            "p50": percentile(samples, 50),
+            "p95": percentile(samples, 95),
+            "p99": percentile(samples, 99),
+            **self.counters,
+        }
+
+    def summary(self) -> str:
+        r = self.report()
+        return (
+            f"p50 {r['p50']:.1f}s, p95 {r['p95']:.1f}s, p99 {r['p99']:.1f}s "
+            f"over {r['captures']} captures; {r['hedges']} hedges "
+            f"({r['hedge_wins']} won), {r['retries']} retries, "
+            f"{r['timeouts']} timeouts, {r['url_refreshes']} URL refreshes"
+        )
+
+
+class SeekController:
+    """
+    Runs frame captures for one video with adaptive timeouts, hedging and
+    retries. ``build_cmd(url, timestamp, output_path, extra_args)`` returns
+    the ffmpeg argv; ``refresh_url()`` returns a fresh direct URL.
+    """
+
+    def __init__(
+        self,
+        video_url: str,
+        build_cmd,
+        refresh_url=None,
+        tracker: LatencyTracker | None = None,
+        hedge: bool = True,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self.video_url = video_url
+        self.build_cmd = build_cmd
+        self.refresh_url = refresh_url
+        self.tracker = tracker or LatencyTracker()
+        self.hedge = hedge
+        self.max_retries = max_retries
+
+    def extract(self, timestamp: float, output_path: str, extra_args: list[str] | None = None) -> str:
+        """Capture one frame, retrying and refreshing the URL as needed."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._run_hedged(timestamp, output_path, extra_args)
+            except FrameCaptureError as e:
+                if attempt == self.max_retries:
+                    raise
+                self.tracker.count("retries")
+                log.warning(f"  Capture at {timestamp:.1f}s failed ({e}); retrying")
+                # Only a confirmed 403/410 means the signed URL went stale; a
+                # slow or failed seek on a valid URL is just retried.
+                if e.expired and self.refresh_url:
+                    self.video_url = self.refresh_url()
+                    self.tracker.count("url_refreshes")
+                    log.info("  Refreshed direct video URL")
+                time.sleep(min(2.0, RETRY_BACKOFF_SEC * (attempt + 1)))
+        raise AssertionError("unreachable")
+
+    def _spawn(self, timestamp, output_path, extra_args, n):
+        # Each request writes its own file so a losing request can never
+        # clobber the winner's output.
+        stem, ext = os.path.splitext(output_path)
+        path = f"{stem}.try{n}{ext}"
+        stderr = tempfile.TemporaryFile()
+        proc = subprocess.Popen(
+            self.build_cmd(self.video_url, timestamp, path, extra_args),
+            stdout=subprocess.DEVNULL,
+            stderr=stderr,
+        )
+        return {"proc": proc, "path": path, "stderr": stderr}
+
+    @staticmethod
+    def _stop(runs):
+        for run in runs:
+            if run["proc"].poll() is None:
+                run["proc"].kill()
+                run["proc"].wait()
+
+    def _run_hedged(self, timestamp, output_path, extra_args) -> str:
+        timeout = self.tracker.timeout()
+        hedge_after = self.tracker.hedge_delay() if self.hedge else None
+        start = time.monotonic()
+        runs = [self._spawn(timestamp, output_path, extra_args, 0)]
+
+        try:
+            while True:
+                elapsed = time.monotonic() - start
+                for i, run in enumerate(runs):
+                    # ffmpeg exits 0 without writing anything when the seek
+                    # lands past the last decodable frame; that run failed.
+                    if run["proc"].poll() == 0 and _has_output(run["path"]):
+                        self._stop(runs)
+                        os.replace(run["path"], output_path)
+                        if i > 0:
+                            self.tracker.count("hedge_wins")
+                        self.tracker.record(elapsed)
+                        return output_path
+
+                if all(run["proc"].poll() is not None for run in runs):
+                    stderr = ""
+                    for run in runs:
+                        run["stderr"].seek(0)
+                        stderr += run["stderr"].read().decode(errors="replace")
+                    failed = [run for run in runs if run["proc"].returncode != 0]
+                    reason = stderr[-500:] if failed else "ffmpeg exited without writing a frame"
+                    raise FrameCaptureError(
+                        f"ffmpeg failed at {timestamp}s: {reason}",
+                        expired=bool(EXPIRED_URL_PATTERN.search(stderr)),
+                    )
+
+                if elapsed > timeout:
+                    self.tracker.count("timeouts")
+                    raise FrameCaptureError(
+                        f"ffmpeg timed out at {timestamp}s after {timeout:.0f}s",
+                        timed_out=True,
+                    )
+
+                if hedge_after is not None and len(runs) == 1 and elapsed > hedge_after:
+                    runs.append(self._spawn(timestamp, output_path, extra_args, 1))
+                    self.tracker.count("hedges")
+                    log.info(f"  Hedging capture at {timestamp:.1f}s after {elapsed:.1f}s")
+
+                time.sleep(POLL_SEC)
+        finally:
+            self._stop(runs)
+            for run in runs:
+                run["stderr"].close()
+                if os.path.exists(run["path"]):
+                    os.remove(run["path"])
@@ -0,0 +1,107 @@
+"""
+Unit tests for sprite-atlas packing.
+Uses real Pillow variants generated on tmp_path — no network, no DB, no R2.
+"""
+import os
+
+import pytest
+from atlas import ATLAS_GROUPS, generate_atlases, pack_shelves
+from extract_frames import generate_variants, upload_to_r2
+
+
+@pytest.fixture
+def variant_paths(sample_image, tmp_path):
+    return generate_variants(sample_image, video_id="test123", rank=1, work_dir=str(tmp_path))
+
+
+class TestPackShelves:
+    def test_same_width_sprites_stack_vertically(self):
+        sizes = {"a": (100, 50), "b": (100, 50), "c": (100, 50)}
+        sprites, w, h = pack_shelves(sizes, max_width=100)
+        assert (w, h) == (100, 150)
+        assert [sprites[n]["y"] for n in "abc"] == [0, 50, 100]
+
+    def test_half_width_sprites_form_a_grid(self):
+        sizes = {"tl": (50, 30), "tr": (50, 30), "bl": (50, 30), "br": (50, 30)}
+        sprites, w, h = pack_shelves(sizes, max_width=100)
+        assert (w, h) == (100, 60)
+        assert sprites["tr"] == {"x": 50, "y": 0, "w": 50, "h": 30}
+        assert sprites["bl"] == {"x": 0, "y": 30, "w": 50, "h": 30}
+
+    def test_sprites_never_overlap(self):
+        sizes = {f"s{i}": (30 + i * 7, 20 + i * 3) for i in range(8)}
+        sprites, _, _ = pack_shelves(sizes, max_width=120)
+        boxes = list(sprites.values())
+        for i, a in enumerate(boxes):
+            for b in boxes[i + 1:]:
+                assert (
+                    a["x"] + a["w"] <= b["x"] or b["x"] + b["w"] <= a["x"]
+                    or a["y"] + a["h"] <= b["y"] or b["y"] + b["h"] <= a["y"]
+                )
+
+
+class TestGenerateAtlases:
+    def test_builds_every_group(self, sample_image, variant_paths, tmp_path):
+        atlases = generate_atlases(sample_image, variant_paths, 1, str(tmp_path))
+        assert set(atlases) == set(ATLAS_GROUPS)
+
+    def test_sprite_map_covers_group_variants(self, sample_image, variant_paths, tmp_path):
+        atlases = generate_atlases(sample_image, variant_paths, 1, str(tmp_path))
+        for group, spec in ATLAS_GROUPS.items():
+            assert list(atlases[group]["sprites"]) == spec["variants"]
+
+    def test_atlas_image_matches_descriptor(self, sample_image, variant_paths, tmp_path):
+        from PIL import Image
+        atlases = generate_atlases(sample_image, variant_paths, 2, str(tmp_path))
+        for atlas in atlases.values():
+            img = Image.open(atlas.get("path", sample_image))
+            assert img.format == "WEBP"
+            assert img.size == (atlas["width"], atlas["height"])
+
+    def test_atlas_is_no_larger_than_its_members(self, sample_image, variant_paths, tmp_path):
+        atlases = generate_atlases(sample_image, variant_paths, 1, str(tmp_path))
+        members = sum(os.path.getsize(variant_paths[name]) for name in ATLAS_GROUPS["px"]["variants"])
+        assert os.path.getsize(atlases["px"]["path"]) <= members
+
+    def test_pixel_tiles_are_native_and_lossless(self, sample_image, variant_paths, tmp_path):
+        from PIL import Image
+        atlases = generate_atlases(sample_image, variant_paths, 1, str(tmp_path))
+        atlas = atlases["px"]
+        box = atlas["sprites"]["px16"]
+        assert (box["w"], box["h"]) == (16, 16)
+        assert atlas["display"] == {"width": 1280, "height": 720, "scaling": "nearest"}
+
+        sheet = Image.open(atlas["path"]).convert("RGB")
+        tile = sheet.crop((box["x"], box["y"], box["x"] + 16, box["y"] + 16))
+        with Image.open(sample_image) as img:
+            expected = img.resize((16, 16), Image.BILINEAR).convert("RGB")
+        assert tile.tobytes() == expected.tobytes()
+
+    def test_fragment_atlas_is_the_frame_itself(self, sample_image, variant_paths, tmp_path):
+        from PIL import Image
+        atlas = generate_atlases(sample_image, variant_paths, 1, str(tmp_path))["frag"]
+        assert atlas["source"] == "frame" and "path" not in atlas
+        assert not list(tmp_path.glob("*atlas_frag*"))
+        box = atlas["sprites"]["frag_br"]
+        with Image.open(variant_paths["frag_br"]) as frag:
+            assert frag.size == (box["w"], box["h"])
+        assert (box["x"], box["y"]) == (640, 360)
+
+    def test_fragment_atlas_uploads_no_object(self, sample_image, variant_paths, tmp_path):
+        from unittest.mock import MagicMock
+        client = MagicMock()
+        moment = {
+            "rank": 1, "filepath": sample_image, "variant_paths": variant_paths,
+            "atlases": generate_atlases(sample_image, variant_paths, 1, str(tmp_path)),
+        }
+        result = upload_to_r2(client, "vid", [moment])[1]
+        assert result["r2_variants"]["atlases"]["frag"]["key"] == result["r2_path"]
+        uploaded = [call.args[2] for call in client.upload_file.call_args_list]
+        assert "frames/vid/f01_atlas_px.webp" in uploaded
+        assert not any("atlas_frag" in key for key in uploaded)
+
+    def test_missing_variants_skip_the_group(self, sample_image, variant_paths, tmp_path):
+        partial = {k: v for k, v in variant_paths.items() if k != "px8"}
+        atlases = generate_atlases(sample_image, partial, 1, str(tmp_path))
+        assert "px" not in atlases
+        assert "frag" in atlases
@@ -0,0 +1,74 @@
+"""
+Unit tests for the pipeline CLI and lazy backend imports.
+No network, no database, no R2.
+"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from cli import main, moments_from_work_dir, parse_args
+
+PIPELINE_DIR = Path(__file__).parent.parent
+
+
+class TestLazyImports:
+    @pytest.mark.parametrize("module", ["extract_frames", "extract_batch", "cli"])
+    def test_heavy_backends_are_not_imported_eagerly(self, module):
+        code = (
+            f"import sys, {module}; "
+            "heavy = {'yt_dlp', 'psycopg2', 'boto3', 'PIL', 'numpy'} & set(sys.modules); "
+            "print(sorted(heavy))"
+        )
+        out = subprocess.run(
+            [sys.executable, "-c", code], cwd=PIPELINE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        assert out == "[]"
+
+    def test_import_does_not_configure_logging(self):
+        code = "import logging, extract_batch; print(len(logging.getLogger().handlers))"
+        out = subprocess.run(
+            [sys.executable, "-c", code], cwd=PIPELINE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        assert out == "0"
+
+
+class TestParser:
+    @pytest.mark.parametrize("command", ["process", "batch", "plan", "variants-only", "upload-only", "gc"])
+    def test_subcommand_is_registered(self, command):
+        argv = {
+            "process": ["process", "abc"],
+            "batch": ["batch", "--urls", "x"],
+            "plan": ["plan", "abc"],
+            "variants-only": ["variants-only", "f01.webp"],
+            "upload-only": ["upload-only", "dir", "--video-id", "abc"],
+            "gc": ["gc", "--delete"],
+        }[command]
+        args = parse_args(argv)
+        assert args.command == command
+
+    def test_batch_passes_remaining_args_through(self):
+        args = parse_args(["batch", "--worker", "--max-jobs", "3"])
+        assert args.batch_args == ["--worker", "--max-jobs", "3"]
+
+
+class TestVariantsOnly:
+    def test_generates_variants_next_to_frame(self, sample_image, capsys):
+        main(["variants-only", sample_image, "--rank", "2"])
+        result = json.loads(capsys.readouterr().out)
+        assert "px8" in result["variants"]
+        assert Path(result["variants"]["px8"]).name == "f02_px8.webp"
+
+
+class TestMomentsFromWorkDir:
+    def test_rebuilds_frames_and_variants(self, tmp_path):
+        for name in ("f01.webp", "f01_thumb.webp", "f01_px8.webp", "f02.webp",
+                     "f01_atlas_px.webp", "notes.txt"):
+            (tmp_path / name).write_bytes(b"x")
+        moments = moments_from_work_dir(str(tmp_path))
+        assert [m["rank"] for m in moments] == [1, 2]
+        assert set(moments[0]["variant_paths"]) == {"thumb", "px8"}
+        assert moments[1]["variant_paths"] == {}
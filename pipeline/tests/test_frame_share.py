@@ -0,0 +1,89 @@
+"""
+Unit tests for the shared-memory frame handoff used by parallel variant
+rendering. Runs a real two-process pool; no network, no ffmpeg.
+"""
+import pickle
+from multiprocessing import shared_memory
+
+import pytest
+from PIL import Image
+
+import extract_frames
+from frame_share import (
+    SharedFrame, attach_array, attach_image, render_variants_shared, variant_pool,
+)
+
+
+def _segment_exists(name: str) -> bool:
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    shm.close()
+    return True
+
+
+class TestSharedFrame:
+    def test_workers_see_the_decoded_pixels(self, sample_image):
+        with SharedFrame.from_file(sample_image) as frame:
+            with attach_image(frame.descriptor) as img, Image.open(sample_image) as original:
+                assert img.size == original.size
+                assert img.tobytes() == original.convert("RGB").tobytes()
+
+    def test_array_view_is_zero_copy_and_read_only(self, sample_image):
+        with SharedFrame.from_file(sample_image) as frame:
+            with attach_array(frame.descriptor) as arr:
+                assert arr.shape == (frame.descriptor.height, frame.descriptor.width, 3)
+                assert not arr.flags.owndata
+                assert not arr.flags.writeable
+
+    def test_descriptor_is_small_to_pickle(self, sample_image):
+        with SharedFrame.from_file(sample_image) as frame:
+            assert len(pickle.dumps(frame.descriptor)) < 256
+
+    def test_segment_is_unlinked_on_exit(self, sample_image):
+        with SharedFrame.from_file(sample_image) as frame:
+            name = frame.descriptor.name
+            assert _segment_exists(name)
+        assert not _segment_exists(name)
+        frame.close()  # idempotent
+
+    def test_segment_is_unlinked_when_dropped(self, sample_image):
+        frame = SharedFrame.from_file(sample_image)
+        name = frame.descriptor.name
+        del frame
+        assert not _segment_exists(name)
+
+
+class TestRenderVariantsShared:
+    def test_matches_in_process_rendering(self, sample_image, tmp_path):
+        serial_dir, shared_dir = tmp_path / "serial", tmp_path / "shared"
+        serial_dir.mkdir()
+        shared_dir.mkdir()
+        serial = extract_frames.generate_variants(sample_image, "vid", 1, str(serial_dir))
+        with variant_pool(2) as pool:
+            shared = extract_frames.generate_variants(
+                sample_image, "vid", 1, str(shared_dir), pool=pool
+            )
+        assert list(shared) == list(serial)
+        for name in serial:
+            with Image.open(serial[name]) as a, Image.open(shared[name]) as b:
+                assert a.size == b.size
+
+    def test_worker_failure_still_frees_segment(self, sample_image, tmp_path, monkeypatch):
+        created = []
+        original_init = SharedFrame.__init__
+
+        def tracking_init(self, img):
+            original_init(self, img)
+            created.append(self.descriptor.name)
+
+        monkeypatch.setattr(SharedFrame, "__init__", tracking_init)
+        with variant_pool(2) as pool:
+            with pytest.raises(KeyError):
+                render_variants_shared(sample_image, 1, str(tmp_path), pool, ["thumb", "nope"])
+        assert created and not _segment_exists(created[0])
+
+    def test_pool_is_disabled_below_two_workers(self):
+        with variant_pool(1) as pool:
+            assert pool is None
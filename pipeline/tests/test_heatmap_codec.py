@@ -0,0 +1,96 @@
+"""
+Unit tests for compact heatmap encoding.
+Pure functions — no network, no database.
+"""
+import pytest
+from extract_frames import find_top_moments
+from heatmap_codec import (
+    decode_heatmap,
+    encode_heatmap,
+    encoded_size_bytes,
+    heatmap_db_params,
+    heatmap_from_row,
+)
+
+
+@pytest.fixture
+def ytdlp_heatmap():
+    """100 fixed-length segments, as yt-dlp returns for a 212s video."""
+    step = 212 / 100
+    return [
+        {"start_time": i * step, "end_time": (i + 1) * step, "value": (i * 37 % 100) / 100}
+        for i in range(100)
+    ]
+
+
+class TestEncodeHeatmap:
+    def test_fixed_interval_heatmap_is_encoded(self, sample_heatmap):
+        encoded = encode_heatmap(sample_heatmap)
+        assert encoded["start"] == 0.0
+        assert encoded["step"] == 12.0
+        assert len(encoded["values"]) == len(sample_heatmap)
+
+    def test_irregular_heatmap_is_not_encoded(self, sparse_heatmap):
+        assert encode_heatmap(sparse_heatmap) is None
+
+    def test_empty_heatmap_is_not_encoded(self):
+        assert encode_heatmap([]) is None
+        assert encode_heatmap(None) is None
+
+    def test_segment_order_does_not_matter(self, sample_heatmap):
+        assert encode_heatmap(list(reversed(sample_heatmap))) == encode_heatmap(sample_heatmap)
+
+
+class TestDecodeHeatmap:
+    def test_round_trip_preserves_segments(self, ytdlp_heatmap):
+        encoded = encode_heatmap(ytdlp_heatmap)
+        decoded = decode_heatmap(encoded["start"], encoded["step"], encoded["values"])
+        for original, restored in zip(ytdlp_heatmap, decoded):
+            assert restored["start_time"] == pytest.approx(original["start_time"])
+            assert restored["end_time"] == pytest.approx(original["end_time"])
+            assert restored["value"] == original["value"]
+
+    def test_decoded_heatmap_feeds_find_top_moments(self, ytdlp_heatmap):
+        encoded = encode_heatmap(ytdlp_heatmap)
+        decoded = decode_heatmap(encoded["start"], encoded["step"], encoded["values"])
+        expected = find_top_moments(ytdlp_heatmap, duration=212.0)
+        actual = find_top_moments(decoded, duration=212.0)
+        assert [m["timestamp"] for m in actual] == pytest.approx(
+            [m["timestamp"] for m in expected]
+        )
+
+    def test_row_prefers_compact_columns(self, sample_heatmap):
+        row = heatmap_from_row(0.0, 12.0, [0.5], raw=sample_heatmap)
+        assert row == [{"start_time": 0.0, "end_time": 12.0, "value": 0.5}]
+
+    def test_row_falls_back_to_raw_json(self, sparse_heatmap):
+        assert heatmap_from_row(None, None, None, raw=sparse_heatmap) == sparse_heatmap
+
+
+class TestHeatmapDbParams:
+    def test_compact_mode_drops_json_for_regular_heatmaps(self, sample_heatmap):
+        raw, start, step, values = heatmap_db_params(sample_heatmap, storage="compact")
+        assert raw is None
+        assert (start, step) == (0.0, 12.0)
+        assert len(values) == len(sample_heatmap)
+
+    def test_compact_mode_keeps_json_for_irregular_heatmaps(self, sparse_heatmap):
+        raw, start, step, values = heatmap_db_params(sparse_heatmap, storage="compact")
+        assert raw == sparse_heatmap
+        assert values is None
+
+    def test_both_mode_writes_json_and_columns(self, sample_heatmap):
+        raw, _, _, values = heatmap_db_params(sample_heatmap, storage="both")
+        assert raw == sample_heatmap
+        assert values is not None
+
+    def test_json_mode_keeps_previous_behaviour(self, sample_heatmap):
+        assert heatmap_db_params(sample_heatmap, storage="json") == (
+            sample_heatmap, None, None, None,
+        )
+
+
+class TestEncodedSize:
+    def test_compact_form_is_much_smaller(self, ytdlp_heatmap):
+        sizes = encoded_size_bytes(ytdlp_heatmap)
+        assert sizes["compact_bytes"] * 5 < sizes["json_bytes"]
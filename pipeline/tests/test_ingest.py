@@ -0,0 +1,186 @@
+"""
+Unit tests for playlist/channel ingestion.
+yt-dlp and the database are replaced by fakes — no network.
+"""
+from argparse import Namespace
+
+import pytest
+
+import ingest
+from extract_batch import iter_videos
+from ingest import EntryFilter, collection_url, expand_urls, is_collection_url, iter_flat_entries
+
+
+def entry(video_id, **fields):
+    return {"id": video_id, "url": f"https://www.youtube.com/watch?v={video_id}",
+            "duration": 300, "view_count": 10_000, **fields}
+
+
+class FakeConn:
+    """Answers the videos-table lookup from a fixed set of known IDs."""
+
+    def __init__(self, known=()):
+        self.known = set(known)
+        self.queries = []
+        self.opened = self.closed = 0
+
+    def connect(self):
+        self.opened += 1
+        return self
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params):
+                conn.queries.append(list(params[0]))
+                self.rows = [(v,) for v in params[0] if v in conn.known]
+
+            def __iter__(self):
+                return iter(self.rows)
+
+        return Cursor()
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed += 1
+
+
+class TestUrls:
+    @pytest.mark.parametrize("url,expected", [
+        ("https://www.youtube.com/playlist?list=PL123", True),
+        ("https://www.youtube.com/@LinusTechTips", True),
+        ("https://www.youtube.com/@LinusTechTips/videos", True),
+        ("https://www.youtube.com/channel/UC123/", True),
+        ("https://www.youtube.com/watch?v=abc&list=PL123", False),
+        ("https://www.youtube.com/watch?v=abc", False),
+        ("https://youtu.be/abc", False),
+    ])
+    def test_is_collection_url(self, url, expected):
+        assert is_collection_url(url) is expected
+
+    def test_channel_root_lists_uploads_tab(self):
+        assert collection_url("https://www.youtube.com/@chan/") == "https://www.youtube.com/@chan/videos"
+        assert collection_url("https://www.youtube.com/@chan/shorts") == "https://www.youtube.com/@chan/shorts"
+
+
+class TestEntryFilter:
+    @pytest.mark.parametrize("fields,reason", [
+        ({"duration": 30}, "too short"),
+        ({"duration": 7200}, "too long"),
+        ({"view_count": 5}, "too few views"),
+        ({"categories": ["Music"]}, "category"),
+        ({"live_status": "is_upcoming"}, "live"),
+        ({}, None),
+    ])
+    def test_reject_reasons(self, fields, reason):
+        entry_filter = EntryFilter(max_duration=3600, min_views=100, categories=("Gaming",))
+        assert entry_filter.reject_reason(entry("a", **fields)) == reason
+
+    def test_missing_fields_do_not_reject(self):
+        entry_filter = EntryFilter(min_views=100, categories=("Gaming",))
+        assert entry_filter.reject_reason({"id": "a", "duration": None, "view_count": None}) is None
+
+
+class TestFlatEntries:
+    def test_descends_into_channel_tabs_and_skips_unavailable(self):
+        class FakeYDL:
+            def __init__(self):
+                self.urls = []
+
+            def extract_info(self, url, download):
+                self.urls.append(url)
+                if url.endswith("/videos"):
+                    return {"entries": [
+                        {"_type": "url", "url": "https://www.youtube.com/@chan/videos/sub"},
+                        entry("a"), None, entry("b"),
+                    ]}
+                return {"entries": iter([entry("c")])}
+
+        ydl = FakeYDL()
+        ids = [e["id"] for e in iter_flat_entries("https://www.youtube.com/@chan", ydl)]
+        assert ids == ["c", "a", "b"]
+        assert ydl.urls[0] == "https://www.youtube.com/@chan/videos"
+
+
+class TestExpandUrls:
+    PLAYLIST = "https://www.youtube.com/playlist?list=PL1"
+
+    def test_plain_urls_pass_through(self):
+        assert list(expand_urls(["abc", "https://www.youtube.com/watch?v=abc"])) == [
+            "https://www.youtube.com/watch?v=abc",
+        ]
+
+    def test_filters_and_dedupes_against_database(self):
+        entries = [entry("new1"), entry("old"), entry("short", duration=20), entry("new2"), entry("new1")]
+        conn = FakeConn(known={"old"})
+        urls = list(expand_urls(
+            [self.PLAYLIST, "new2"], connect=conn.connect, list_entries=lambda url, limit: iter(entries),
+        ))
+        assert urls == [
+            "https://www.youtube.com/watch?v=new1",
+            "https://www.youtube.com/watch?v=new2",
+        ]
+        assert conn.queries == [["new1", "old", "new2"]]
+
+    def test_streams_survivors_batch_by_batch(self, monkeypatch):
+        monkeypatch.setattr(ingest, "DEDUPE_BATCH", 2)
+        listed = []
+
+        def list_entries(url, limit):
+            for i in range(5):
+                listed.append(i)
+                yield entry(f"v{i}")
+
+        conn = FakeConn()
+        urls = expand_urls([self.PLAYLIST], connect=conn.connect, list_entries=list_entries)
+        assert next(urls).endswith("v0")
+        assert len(listed) == 2            # later pages not listed yet
+        assert len(list(urls)) == 4
+        assert [len(q) for q in conn.queries] == [2, 2, 1]
+        assert conn.opened == conn.closed == 3     # a fresh connection per lookup
+
+    def test_failing_source_is_logged_and_skipped(self, caplog):
+        other = "https://www.youtube.com/playlist?list=PL2"
+
+        def list_entries(url, limit):
+            if url == self.PLAYLIST:
+                yield entry("a")
+                raise RuntimeError("HTTP Error 429")
+            yield entry("b")
+
+        urls = list(expand_urls([self.PLAYLIST, other, "c"], list_entries=list_entries))
+        assert urls == [f"https://www.youtube.com/watch?v={v}" for v in ("a", "b", "c")]
+        assert "HTTP Error 429" in caplog.text
+
+    def test_dedupe_failure_skips_only_that_source(self):
+        class DownOnce(FakeConn):
+            def connect(self):
+                if not self.opened:
+                    self.opened += 1
+                    raise ConnectionError("server closed the connection unexpectedly")
+                return super().connect()
+
+        conn = DownOnce(known={"b"})
+        lists = {
+            self.PLAYLIST: [entry("a")],
+            "https://www.youtube.com/playlist?list=PL2": [entry("b"), entry("c")],
+        }
+        urls = list(expand_urls(
+            list(lists), connect=conn.connect, list_entries=lambda url, limit: iter(lists[url]),
+        ))
+        assert urls == ["https://www.youtube.com/watch?v=c"]
+
+
+class TestIterVideos:
+    def test_plain_sources_are_unchanged(self):
+        sources = ["https://www.youtube.com/watch?v=a", "b"]
+        assert list(iter_videos(sources, Namespace())) == sources
@@ -0,0 +1,229 @@
+"""
+Integration tests for the Postgres job queue.
+Requires a real PostgreSQL connection (TEST_DATABASE_URL env var) with
+schema.sql applied — e.g. the postgres service from docker-compose.yml.
+Skipped automatically when the database is not available; the URL
+normalisation and heartbeat tests use fake connections and always run.
+"""
+import os
+import threading
+import time
+
+import pytest
+
+requires_db = pytest.mark.skipif(
+    not os.environ.get("TEST_DATABASE_URL"),
+    reason="TEST_DATABASE_URL not set — skipping DB integration tests",
+)
+
+
+def _connect():
+    import psycopg2
+    return psycopg2.connect(os.environ["TEST_DATABASE_URL"], sslmode="prefer")
+
+
+@pytest.fixture
+def queue_conn():
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute("TRUNCATE TABLE jobs")
+    conn.commit()
+    cur.close()
+    yield conn
+    conn.rollback()
+    conn.close()
+
+
+def _expire_leases(conn):
+    cur = conn.cursor()
+    cur.execute("UPDATE jobs SET lease_expires_at = NOW() - INTERVAL '1 second'")
+    conn.commit()
+    cur.close()
+
+
+@requires_db
+class TestEnqueue:
+    def test_enqueue_creates_pending_jobs(self, queue_conn):
+        from job_queue import enqueue, queue_counts
+        assert enqueue(queue_conn, ["u1", "u2"]) == 2
+        assert queue_counts(queue_conn) == {"pending": 2}
+
+    def test_active_url_is_not_enqueued_twice(self, queue_conn):
+        from job_queue import enqueue
+        enqueue(queue_conn, ["u1"])
+        assert enqueue(queue_conn, ["u1", "u2"]) == 1
+
+    def test_other_url_forms_of_an_active_video_are_skipped(self, queue_conn):
+        from job_queue import enqueue
+        enqueue(queue_conn, ["https://youtu.be/dQw4w9WgXcQ"])
+        assert enqueue(queue_conn, ["dQw4w9WgXcQ",
+                                    "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42"]) == 0
+
+
+@requires_db
+class TestClaim:
+    def test_claims_oldest_job_first(self, queue_conn):
+        from job_queue import claim, enqueue
+        enqueue(queue_conn, ["first", "second"])
+        job = claim(queue_conn, "w1")
+        assert job["url"] == "https://www.youtube.com/watch?v=first"
+        assert job["attempts"] == 1
+
+    def test_returns_none_when_queue_is_empty(self, queue_conn):
+        from job_queue import claim
+        assert claim(queue_conn, "w1") is None
+
+    def test_concurrent_workers_never_share_a_job(self, queue_conn):
+        from job_queue import claim, enqueue
+        enqueue(queue_conn, [f"u{i}" for i in range(5)])
+        other = _connect()
+        try:
+            claimed = [claim(queue_conn, "w1"), claim(other, "w2"), claim(queue_conn, "w1")]
+        finally:
+            other.close()
+        ids = [job["id"] for job in claimed]
+        assert len(set(ids)) == 3
+
+    def test_expired_lease_is_reclaimed(self, queue_conn):
+        from job_queue import claim, complete, enqueue
+        enqueue(queue_conn, ["u1"])
+        first = claim(queue_conn, "crashed")
+        _expire_leases(queue_conn)
+        second = claim(queue_conn, "w2")
+        assert second["id"] == first["id"]
+        assert second["attempts"] == 2
+        assert not complete(queue_conn, first["id"], "crashed")
+        assert complete(queue_conn, second["id"], "w2")
+
+    def test_expired_final_attempt_is_marked_failed(self, queue_conn):
+        from job_queue import claim, enqueue, queue_counts
+        enqueue(queue_conn, ["u1"], max_attempts=1)
+        claim(queue_conn, "crashed")
+        _expire_leases(queue_conn)
+        assert claim(queue_conn, "w2") is None
+        assert queue_counts(queue_conn) == {"failed": 1}
+
+
+@requires_db
+class TestRetries:
+    def test_failed_job_is_retried_until_max_attempts(self, queue_conn):
+        from job_queue import claim, enqueue, fail
+        enqueue(queue_conn, ["u1"], max_attempts=2)
+        job = claim(queue_conn, "w1")
+        assert fail(queue_conn, job["id"], "w1", "boom") == "pending"
+        job = claim(queue_conn, "w1")
+        assert fail(queue_conn, job["id"], "w1", "boom") == "failed"
+        assert claim(queue_conn, "w1") is None
+
+    def test_heartbeat_requires_ownership(self, queue_conn):
+        from job_queue import claim, enqueue, heartbeat
+        enqueue(queue_conn, ["u1"])
+        job = claim(queue_conn, "w1")
+        assert heartbeat(queue_conn, job["id"], "w1")
+        assert not heartbeat(queue_conn, job["id"], "intruder")
+
+
+class FakeConn:
+    """Records statements; every UPDATE/INSERT reports ``rowcount`` rows."""
+
+    def __init__(self, rowcount=1):
+        self.rowcount = rowcount
+        self.executed = []
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            rowcount = conn.rowcount
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=None):
+                conn.executed.append(params)
+
+        return Cursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class BrokenConn(FakeConn):
+    """A dropped connection: statements fail and so does rollback/close."""
+
+    def cursor(self):
+        raise ConnectionError("server closed the connection unexpectedly")
+
+    def rollback(self):
+        raise ConnectionError("connection already closed")
+
+    def close(self):
+        raise ConnectionError("connection already closed")
+
+
+class TestEnqueueNormalisation:
+    def test_one_job_per_video_whatever_the_url_form(self):
+        from job_queue import enqueue
+        conn = FakeConn()
+        created = enqueue(conn, [
+            "dQw4w9WgXcQ",
+            "https://youtu.be/dQw4w9WgXcQ?t=10",
+            "https://www.youtube.com/watch?feature=share&v=dQw4w9WgXcQ",
+            "https://www.youtube.com/shorts/abcdefghijk",
+        ])
+        assert created == 2
+        assert [params[0] for params in conn.executed] == [
+            "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+            "https://www.youtube.com/watch?v=abcdefghijk",
+        ]
+
+
+class TestHeartbeat:
+    def test_lost_lease_cancels_processing(self):
+        from job_queue import Heartbeat
+        cancel = threading.Event()
+        with Heartbeat(lambda: FakeConn(rowcount=0), 1, "w1", interval=0.01,
+                       cancel=cancel) as beat:
+            assert cancel.wait(2)
+        assert beat.lost
+
+    def test_owned_lease_does_not_cancel(self):
+        from job_queue import Heartbeat
+        with Heartbeat(lambda: FakeConn(), 1, "w1", interval=0.01) as beat:
+            assert not beat.cancel.wait(0.1)
+        assert not beat.lost
+
+    def test_failed_renewals_reconnect(self):
+        from job_queue import Heartbeat
+        conns = []
+
+        def connect():
+            conns.append(FakeConn() if len(conns) else BrokenConn())
+            return conns[-1]
+
+        with Heartbeat(connect, 1, "w1", interval=0.01) as beat:
+            deadline = time.monotonic() + 2
+            while not (len(conns) >= 2 and conns[-1].executed) and time.monotonic() < deadline:
+                time.sleep(0.01)
+        assert conns[-1].executed
+        assert not beat.lost and not beat.cancel.is_set()
+
+    def test_renewals_failing_until_expiry_cancel(self):
+        from job_queue import Heartbeat
+
+        def connect():
+            raise ConnectionError("could not connect to server")
+
+        with Heartbeat(connect, 1, "w1", interval=0.01, lease_sec=0.1) as beat:
+            assert beat.cancel.wait(2)
+        assert beat.lost
+
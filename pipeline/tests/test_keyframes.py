@@ -0,0 +1,104 @@
+"""
+Unit tests for keyframe-aware timestamp snapping.
+ffprobe output is canned — no network, no video.
+"""
+import subprocess
+
+import extract_frames
+import keyframes
+from keyframes import SEEK_EPSILON_SEC, parse_keyframe_packets, probe_keyframes, snap_moments
+
+FFPROBE_CSV = """\
+4.938000,K__
+4.971000,___
+5.005000,___
+7.007000,K__
+7.040000,__
+
+9.009000,K_D
+"""
+
+
+def _moments(*timestamps):
+    return [{"rank": i, "timestamp": t, "value": 1.0} for i, t in enumerate(timestamps, 1)]
+
+
+class TestParsePackets:
+    def test_keeps_only_keyframes(self):
+        assert parse_keyframe_packets(FFPROBE_CSV) == [4.938, 7.007, 9.009]
+
+    def test_ignores_garbage_lines(self):
+        assert parse_keyframe_packets("N/A,K__\nnot csv\n") == []
+
+
+class TestProbeKeyframes:
+    def test_reads_only_windows_around_moments(self, monkeypatch):
+        calls = []
+
+        def fake_run(cmd, **kwargs):
+            calls.append(cmd)
+            return subprocess.CompletedProcess(cmd, 0, stdout=FFPROBE_CSV, stderr="")
+
+        monkeypatch.setattr(keyframes.subprocess, "run", fake_run)
+        assert probe_keyframes("http://example/v", [30.0, 6.0], tolerance=1.0) == [4.938, 7.007, 9.009]
+        cmd = calls[0]
+        assert cmd[cmd.index("-read_intervals") + 1] == "5.000%7.000,29.000%31.000"
+        assert "packet=pts_time,flags" in cmd
+
+    def test_probe_failure_falls_back_to_exact_timestamps(self, monkeypatch):
+        monkeypatch.setattr(
+            keyframes.subprocess, "run",
+            lambda cmd, **kw: subprocess.CompletedProcess(cmd, 1, stdout="", stderr="boom"),
+        )
+        assert probe_keyframes("http://example/v", [6.0]) == []
+
+
+class TestSnapMoments:
+    def test_snaps_to_nearest_keyframe_within_tolerance(self):
+        moments = snap_moments(_moments(6.0, 30.0), [5.5, 6.8, 40.0], 120.0, 10)
+        assert moments[0]["timestamp"] == 5.5
+        assert moments[0]["heatmap_timestamp"] == 6.0
+        assert moments[0]["seek_timestamp"] == 5.5 + SEEK_EPSILON_SEC
+        assert moments[0]["snapped"]
+        # Nearest keyframe is 10s away — beyond tolerance, stays exact
+        assert moments[1]["timestamp"] == 30.0
+        assert not moments[1]["snapped"]
+
+    def test_never_violates_min_spacing(self):
+        # 16.9 is nearest to 17 but would sit 9.9s from rank 1 at 7.0
+        moments = snap_moments(_moments(7.0, 17.0), [7.0, 16.9, 17.8], 120.0, 10)
+        assert moments[1]["timestamp"] == 17.8
+        assert moments[1]["timestamp"] - moments[0]["timestamp"] >= 10
+
+    def test_keeps_exact_timestamp_when_no_keyframe_fits(self):
+        moments = snap_moments(_moments(7.0, 17.0), [7.0, 16.5], 120.0, 10)
+        assert moments[1]["timestamp"] == 17.0
+        assert not moments[1]["snapped"]
+
+    def test_resnap_starts_from_heatmap_timestamp(self):
+        moments = snap_moments(_moments(6.0), [5.5], 120.0, 10)
+        snap_moments(moments, [6.4], 120.0, 10)
+        assert moments[0]["timestamp"] == 6.4
+
+
+class TestCaptureWithSnapping:
+    def test_snapped_moments_are_captured_at_keyframes(self, sample_heatmap, tmp_path, monkeypatch):
+        seeks = []
+
+        def fake_extract(video_url, timestamp, output_path, extra_args=None, settings=None):
+            seeks.append((timestamp, extra_args))
+            open(output_path, "wb").write(b"frame")
+            return output_path
+
+        monkeypatch.setattr(extract_frames, "extract_frame", fake_extract)
+        monkeypatch.setattr(
+            extract_frames, "probe_keyframes",
+            lambda url, timestamps, tolerance: [t - 0.5 for t in timestamps],
+        )
+        moments = extract_frames.capture_moments(
+            "http://example/video", sample_heatmap, 120.0, str(tmp_path), snap=True
+        )
+        assert [m["timestamp"] for m in moments] == [5.5, 17.5, 29.5, 41.5, 53.5, 65.5]
+        for timestamp, extra_args in seeks:
+            assert extra_args[0] == "-noaccurate_seek"
+            assert (timestamp - SEEK_EPSILON_SEC) in [m["timestamp"] for m in moments]
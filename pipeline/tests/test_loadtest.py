@@ -0,0 +1,161 @@
+"""
+Unit tests for the offline load-test harness.
+The end-to-end run needs ffmpeg and is skipped without it.
+"""
+import json
+import shutil
+import subprocess
+import sys
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+from loadtest import (
+    FaultInjector, LocalS3, PreconditionFailed, build_report, parse_range, start_video_server,
+    synthetic_info,
+)
+
+
+@pytest.fixture
+def clip(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(bytes(range(256)) * 4)
+    return str(path)
+
+
+class TestParseRange:
+    @pytest.mark.parametrize("header,expected", [
+        (None, None),
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-", (100, 1023)),
+        ("bytes=-24", (1000, 1023)),
+        ("bytes=1000-5000", (1000, 1023)),
+    ])
+    def test_ranges(self, header, expected):
+        assert parse_range(header, 1024) == expected
+
+    def test_unsatisfiable(self):
+        with pytest.raises(ValueError):
+            parse_range("bytes=2000-", 1024)
+
+
+class TestVideoServer:
+    def test_serves_partial_content(self, clip):
+        server, base_url = start_video_server([clip], FaultInjector(), ["vid1"])
+        try:
+            req = urllib.request.Request(f"{base_url}/v/vid1.mp4", headers={"Range": "bytes=10-19"})
+            with urllib.request.urlopen(req) as resp:
+                assert resp.status == 206
+                assert resp.headers["Content-Range"] == "bytes 10-19/1024"
+                assert resp.read() == bytes(range(10, 20))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_injected_expiry_returns_403(self, clip):
+        injector = FaultInjector(expired_rate=1.0)
+        server, base_url = start_video_server([clip], injector, ["vid1"])
+        try:
+            with pytest.raises(urllib.error.HTTPError) as excinfo:
+                urllib.request.urlopen(f"{base_url}/v/vid1.mp4")
+            assert excinfo.value.code == 403
+            assert injector.counts["expired"] == 1
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestFaultInjector:
+    def test_seeded_decisions_are_reproducible(self):
+        first = FaultInjector(error_rate=0.2, hang_rate=0.1, seed=7)
+        second = FaultInjector(error_rate=0.2, hang_rate=0.1, seed=7)
+        assert [first.decide() for _ in range(200)] == [second.decide() for _ in range(200)]
+        assert first.counts["errors"] > 0 and first.counts["hangs"] > 0
+
+
+class TestLocalS3:
+    def test_round_trip(self, tmp_path, clip):
+        s3 = LocalS3(str(tmp_path))
+        s3.upload_file(clip, "bucket", "frames/vid1/f01.webp")
+        assert s3.get_object(Bucket="bucket", Key="frames/vid1/f01.webp")["Body"].read()[:3] == b"\x00\x01\x02"
+
+    def test_missing_key_raises_no_such_key(self, tmp_path):
+        s3 = LocalS3(str(tmp_path))
+        with pytest.raises(s3.exceptions.NoSuchKey):
+            s3.get_object(Bucket="bucket", Key="catalog/index.json")
+
+    def test_rejects_keys_outside_bucket(self, tmp_path):
+        with pytest.raises(ValueError):
+            LocalS3(str(tmp_path)).put_object(Bucket="bucket", Key="../escape", Body=b"x")
+
+    def test_injected_upload_failures(self, tmp_path):
+        s3 = LocalS3(str(tmp_path), error_rate=1.0)
+        with pytest.raises(ConnectionError):
+            s3.put_object(Bucket="bucket", Key="a", Body=b"x")
+        assert s3.counts["put_errors"] == 1
+
+
+class TestConditionalPuts:
+    def test_if_match_and_if_none_match(self, tmp_path):
+        s3 = LocalS3(str(tmp_path))
+        etag = s3.put_object(Bucket="b", Key="k", Body=b"one", IfNoneMatch="*")["ETag"]
+        assert s3.get_object(Bucket="b", Key="k")["ETag"] == etag
+        with pytest.raises(PreconditionFailed):
+            s3.put_object(Bucket="b", Key="k", Body=b"two", IfNoneMatch="*")
+        s3.put_object(Bucket="b", Key="k", Body=b"two", IfMatch=etag)
+        with pytest.raises(PreconditionFailed) as excinfo:
+            s3.put_object(Bucket="b", Key="k", Body=b"three", IfMatch=etag)   # stale ETag
+        assert excinfo.value.response["ResponseMetadata"]["HTTPStatusCode"] == 412
+        assert s3.get_object(Bucket="b", Key="k")["Body"].read() == b"two"
+        assert s3.counts["precondition_failures"] == 2
+
+    def test_catalog_updates_from_racing_processes_all_land(self, tmp_path):
+        from multiprocessing import get_context
+
+        with get_context("fork").Pool(4) as pool:
+            pool.starmap(_publish, [(str(tmp_path), shard) for shard in range(4)])
+        from manifest import load_catalog
+        catalog = load_catalog(LocalS3(str(tmp_path)), "bucket")
+        assert len(catalog["videos"]) == 4 * 5
+
+
+def _publish(root: str, shard: int):
+    from manifest import update_catalog
+    s3 = LocalS3(root)
+    for i in range(5):
+        update_catalog(s3, "bucket", {f"v{shard}_{i}": {"manifest": f"m{shard}_{i}"}})
+
+
+class TestReport:
+    def test_synthetic_info_is_deterministic(self):
+        info = synthetic_info("vid1", "http://127.0.0.1:1", 120, 1, 0.0)
+        assert info == synthetic_info("vid1", "http://127.0.0.1:1", 120, 1, 0.0)
+        assert info["heatmap"][-1]["end_time"] == pytest.approx(120)
+        assert synthetic_info("vid1", "http://x", 120, 1, 1.0)["heatmap"] is None
+
+    def test_report_summarizes_latency_and_failures(self):
+        records = [{"url": f"u{i}", "sec": float(i), "ok": True} for i in range(1, 101)]
+        records.append({"url": "bad", "sec": 5.0, "ok": False, "error": "TimeoutError: stalled"})
+        report = build_report(records, 60.0, {"requests": 1}, {})
+        assert report["succeeded"] == 100
+        assert report["failures"] == {"TimeoutError": 1}
+        assert report["latency_sec"]["p99"] == 99.0
+        assert report["videos_per_min"] == 100.0
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+class TestEndToEnd:
+    def test_small_run_with_faults(self, tmp_path):
+        # Separate process: the harness patches pipeline module globals
+        report_path = tmp_path / "report.json"
+        subprocess.run([
+            sys.executable, str(Path(__file__).parent.parent / "loadtest.py"),
+            "--videos", "4", "--clips", "1", "--duration", "60",
+            "--work-dir", str(tmp_path), "--error-rate", "0.05",
+            "--report", str(report_path),
+        ], check=True, timeout=600)
+        report = json.loads(report_path.read_text())
+        assert report["videos"] == 4
+        assert report["db_writes"] == report["succeeded"]
@@ -0,0 +1,139 @@
+"""
+Unit tests for per-video manifests and the catalog index.
+R2 is replaced by a MagicMock S3 client — no network.
+"""
+import io
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from manifest import (
+    CATALOG_KEY,
+    MANIFEST_CACHE_CONTROL,
+    build_manifest,
+    catalog_entry,
+    encode_manifest,
+    manifest_key,
+    update_catalog,
+    upload_manifest,
+)
+
+
+@pytest.fixture
+def uploaded_moments(tmp_path):
+    thumb = tmp_path / "f01_thumb.webp"
+    thumb.write_bytes(b"x" * 321)
+    moments = [
+        {"rank": 2, "timestamp": 90.0, "value": 0.7, "width": 1280, "height": 720,
+         "file_size": 40_000, "variant_paths": {}},
+        {"rank": 1, "timestamp": 45.123456, "value": 0.9, "width": 1280, "height": 720,
+         "file_size": 50_000, "variant_paths": {"thumb": str(thumb)}},
+    ]
+    r2_results = {
+        1: {"r2_path": "frames/vid/f01.webp",
+            "r2_variants": {"thumb": "frames/vid/f01_thumb.webp"}},
+        2: {"r2_path": "frames/vid/f02.webp", "r2_variants": {}},
+    }
+    return moments, r2_results
+
+
+@pytest.fixture
+def s3_client():
+    client = MagicMock()
+    client.exceptions.NoSuchKey = type("NoSuchKey", (Exception,), {})
+    return client
+
+
+class TestBuildManifest:
+    def test_frames_are_ordered_by_rank(self, uploaded_moments):
+        manifest = build_manifest("vid", 300, *uploaded_moments)
+        assert [f["rank"] for f in manifest["frames"]] == [1, 2]
+
+    def test_frame_entry_contents(self, uploaded_moments):
+        frame = build_manifest("vid", 300, *uploaded_moments)["frames"][0]
+        assert frame["key"] == "frames/vid/f01.webp"
+        assert frame["t"] == 45.123
+        assert (frame["w"], frame["h"], frame["bytes"]) == (1280, 720, 50_000)
+        assert frame["variants"]["thumb"] == {"key": "frames/vid/f01_thumb.webp", "bytes": 321}
+
+    def test_manifest_does_not_reveal_the_answer(self, uploaded_moments):
+        body = encode_manifest(build_manifest("vid", 300, *uploaded_moments))
+        assert b"title" not in body
+        assert b"channel" not in body
+
+
+class TestManifestKey:
+    def test_key_is_content_addressed(self, uploaded_moments):
+        body = encode_manifest(build_manifest("vid", 300, *uploaded_moments))
+        assert manifest_key("vid", body) == manifest_key("vid", body)
+        assert manifest_key("vid", body) != manifest_key("vid", body + b" ")
+        assert manifest_key("vid", body).startswith("frames/vid/manifest.")
+
+    def test_upload_uses_immutable_cache_control(self, uploaded_moments, s3_client):
+        manifest = build_manifest("vid", 300, *uploaded_moments)
+        key = upload_manifest(s3_client, "bucket", manifest)
+        kwargs = s3_client.put_object.call_args.kwargs
+        assert kwargs["Key"] == key
+        assert kwargs["CacheControl"] == MANIFEST_CACHE_CONTROL
+        assert json.loads(kwargs["Body"]) == manifest
+
+
+class TestUpdateCatalog:
+    def test_creates_catalog_when_missing(self, s3_client):
+        s3_client.get_object.side_effect = s3_client.exceptions.NoSuchKey()
+        catalog = update_catalog(s3_client, "bucket", {"a": {"manifest": "m"}})
+        assert catalog["videos"] == {"a": {"manifest": "m"}}
+        assert s3_client.put_object.call_args.kwargs["Key"] == CATALOG_KEY
+
+    def test_merges_into_existing_catalog(self, s3_client, uploaded_moments):
+        existing = {"v": 1, "videos": {"old": {"manifest": "x"}, "vid": {"manifest": "stale"}}}
+        s3_client.get_object.return_value = {"Body": io.BytesIO(json.dumps(existing).encode())}
+        manifest = build_manifest("vid", 300, *uploaded_moments)
+        entry = catalog_entry(manifest, "frames/vid/manifest.abc.json")
+        catalog = update_catalog(s3_client, "bucket", {"vid": entry})
+        assert set(catalog["videos"]) == {"old", "vid"}
+        assert catalog["videos"]["vid"]["frames"] == 2
+
+
+class TestConditionalCatalogWrite:
+    def _conflict(self):
+        error = Exception("At least one of the pre-conditions you specified did not hold")
+        error.response = {"Error": {"Code": "PreconditionFailed"},
+                          "ResponseMetadata": {"HTTPStatusCode": 412}}
+        return error
+
+    def test_creating_the_catalog_requires_it_to_be_absent(self, s3_client):
+        s3_client.get_object.side_effect = s3_client.exceptions.NoSuchKey()
+        update_catalog(s3_client, "bucket", {"a": {"manifest": "m"}})
+        assert s3_client.put_object.call_args.kwargs["IfNoneMatch"] == "*"
+
+    def test_rewrite_is_conditional_on_the_etag_read(self, s3_client):
+        s3_client.get_object.return_value = {
+            "Body": io.BytesIO(b'{"v": 1, "videos": {}}'), "ETag": '"e1"',
+        }
+        update_catalog(s3_client, "bucket", {"a": {"manifest": "m"}})
+        assert s3_client.put_object.call_args.kwargs["IfMatch"] == '"e1"'
+
+    def test_lost_race_re_reads_and_keeps_both_writers_entries(self, s3_client, monkeypatch):
+        import manifest
+        monkeypatch.setattr(manifest.time, "sleep", lambda s: None)
+        versions = iter([
+            {"Body": io.BytesIO(b'{"v": 1, "videos": {}}'), "ETag": '"e1"'},
+            {"Body": io.BytesIO(b'{"v": 1, "videos": {"other": {"manifest": "o"}}}'),
+             "ETag": '"e2"'},
+        ])
+        s3_client.get_object.side_effect = lambda **kw: next(versions)
+        s3_client.put_object.side_effect = [self._conflict(), None]
+
+        catalog = update_catalog(s3_client, "bucket", {"mine": {"manifest": "m"}})
+        assert set(catalog["videos"]) == {"other", "mine"}
+        final = s3_client.put_object.call_args.kwargs
+        assert final["IfMatch"] == '"e2"'
+        assert set(json.loads(final["Body"])["videos"]) == {"other", "mine"}
+
+    def test_other_errors_are_not_retried(self, s3_client):
+        s3_client.get_object.side_effect = s3_client.exceptions.NoSuchKey()
+        s3_client.put_object.side_effect = RuntimeError("network down")
+        with pytest.raises(RuntimeError):
+            update_catalog(s3_client, "bucket", {"a": {"manifest": "m"}})
+        assert s3_client.put_object.call_count == 1
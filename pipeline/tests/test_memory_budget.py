@@ -0,0 +1,202 @@
+"""
+Unit tests for the memory-bounded processing mode.
+No network, no database — RSS probes read the test process itself.
+"""
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+from memory_budget import (
+    MemoryBudget,
+    MemoryBudgetExceeded,
+    cgroup_working_set_bytes,
+    current_rss_bytes,
+    memory_usage_bytes,
+    peak_rss_bytes,
+    process_tree_rss_bytes,
+    spill_root,
+)
+
+MB = 2**20
+
+
+class TestRssProbes:
+    def test_current_rss_is_positive(self):
+        assert current_rss_bytes() > 0
+
+    def test_peak_rss_is_at_least_current(self):
+        assert peak_rss_bytes() >= current_rss_bytes() * 0.5
+
+    def test_process_tree_includes_children(self):
+        child = subprocess.Popen(
+            [sys.executable, "-c",
+             "import sys, time; b = b'x' * (80 << 20); print('ready', flush=True); time.sleep(30)"],
+            stdout=subprocess.PIPE, text=True,
+        )
+        try:
+            assert child.stdout.readline().strip() == "ready"
+            assert process_tree_rss_bytes() - current_rss_bytes() >= 70 * MB
+        finally:
+            child.kill()
+            child.wait()
+
+    def test_cgroup_working_set_excludes_inactive_page_cache(self, tmp_path, monkeypatch):
+        import memory_budget
+        (tmp_path / "memory.current").write_text(f"{900 * MB}\n")
+        (tmp_path / "memory.stat").write_text(f"anon {500 * MB}\ninactive_file {400 * MB}\n")
+        monkeypatch.setattr(memory_budget, "CGROUP_DIR", str(tmp_path))
+        assert cgroup_working_set_bytes() == 500 * MB
+        assert memory_usage_bytes() >= 500 * MB
+
+    def test_no_cgroup_files_means_process_usage(self, tmp_path, monkeypatch):
+        import memory_budget
+        monkeypatch.setattr(memory_budget, "CGROUP_DIR", str(tmp_path))
+        assert cgroup_working_set_bytes() is None
+        assert memory_usage_bytes() > 0
+
+
+class TestMemoryBudgetSlots:
+    def test_disabled_budget_adds_no_ffmpeg_args(self):
+        assert MemoryBudget().ffmpeg_args() == []
+
+    def test_enabled_budget_limits_ffmpeg_threads(self):
+        assert "-threads" in MemoryBudget(limit_mb=512).ffmpeg_args()
+
+    def test_frame_slot_limits_in_flight_frames(self):
+        budget = MemoryBudget(max_in_flight=2)
+        active, peak = 0, 0
+        lock = threading.Lock()
+
+        def work():
+            nonlocal active, peak
+            with budget.frame_slot():
+                with lock:
+                    active += 1
+                    peak = max(peak, active)
+                time.sleep(0.05)
+                with lock:
+                    active -= 1
+
+        threads = [threading.Thread(target=work) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert peak == 2
+
+    def test_frame_slot_records_samples(self):
+        budget = MemoryBudget()
+        with budget.frame_slot():
+            pass
+        assert budget.samples >= 2
+        assert budget.max_observed_rss > 0
+
+    def test_over_budget_frame_fails_without_waiting_when_alone(self):
+        budget = MemoryBudget(limit_mb=1)
+        start = time.monotonic()
+        with pytest.raises(MemoryBudgetExceeded):
+            with budget.frame_slot("f01"):
+                pass
+        assert time.monotonic() - start < 1.0
+        assert budget.overruns == 1
+        assert budget.reclaims == 1
+
+    def test_reserve_counts_against_the_limit(self):
+        budget = MemoryBudget(limit_mb=(memory_usage_bytes() + 200 * MB) // MB)
+        with budget.frame_slot("fits", reserve_bytes=10 * MB):
+            pass
+        with pytest.raises(MemoryBudgetExceeded):
+            with budget.frame_slot("too big", reserve_bytes=400 * MB):
+                pass
+
+    def test_budget_holds_usage_down(self):
+        """Two 64 MB frames don't fit together: the second waits for the first."""
+        chunk = 64 * MB
+        baseline = memory_usage_bytes()
+        budget = MemoryBudget(limit_mb=(baseline + chunk + 32 * MB) // MB, max_in_flight=2)
+        peak, done = 0, threading.Event()
+        spans = []
+
+        def monitor():
+            nonlocal peak
+            while not done.is_set():
+                peak = max(peak, memory_usage_bytes())
+                time.sleep(0.005)
+
+        def frame(name):
+            with budget.frame_slot(name, reserve_bytes=chunk):
+                start = time.monotonic()
+                buf = b"x" * chunk
+                time.sleep(0.2)
+                del buf
+                spans.append((start, time.monotonic()))
+
+        watcher = threading.Thread(target=monitor)
+        watcher.start()
+        frames = [threading.Thread(target=frame, args=(f"f0{i}",)) for i in (1, 2)]
+        for t in frames:
+            t.start()
+        for t in frames:
+            t.join()
+        done.set()
+        watcher.join()
+
+        assert len(spans) == 2 and budget.overruns == 0
+        first, second = sorted(spans)
+        assert second[0] >= first[1]
+        assert peak - baseline < 2 * chunk
+
+
+class TestHedgingUnderBudget:
+    @pytest.mark.parametrize("limit_mb, hedge", [(0, True), (512, False)])
+    def test_budget_turns_hedging_off(self, monkeypatch, limit_mb, hedge):
+        import extract_frames
+        seekers = []
+
+        class RecordingSeeker:
+            def __init__(self, *args, **kwargs):
+                seekers.append(kwargs)
+
+        monkeypatch.setattr(extract_frames, "SeekController", RecordingSeeker)
+        monkeypatch.setattr(extract_frames, "SEEK_HEDGING", True)
+        monkeypatch.setattr(extract_frames, "get_video_info", lambda url: {
+            "id": "v", "duration": 60, "heatmap": [{"start_time": 0, "end_time": 60, "value": 1}],
+            "formats": [{"url": "http://x", "vcodec": "avc1", "height": 720}],
+        })
+        cancel = threading.Event()
+        cancel.set()
+        with pytest.raises(extract_frames.JobCancelled):
+            extract_frames.process_video(
+                "v", budget=MemoryBudget(limit_mb=limit_mb), cancel=cancel
+            )
+        assert seekers[0]["hedge"] is hedge
+
+
+class TestMemoryBudgetReport:
+    def test_report_contains_peak_rss(self):
+        report = MemoryBudget().report()
+        assert report["peak_rss_mb"] > 0
+
+    def test_report_includes_tracemalloc_when_tracing(self):
+        import tracemalloc
+        budget = MemoryBudget(trace=True)
+        try:
+            report = budget.report()
+            assert "tracemalloc_peak_mb" in report
+        finally:
+            tracemalloc.stop()
+
+
+class TestSpillRoot:
+    def test_no_spill_dir_means_default_tmp(self):
+        assert spill_root(None) is None
+
+    def test_spill_dir_used_only_on_tmpfs(self, tmp_path, monkeypatch):
+        import memory_budget
+        spill = str(tmp_path / "spill")
+        monkeypatch.setattr(memory_budget, "_is_tmpfs", lambda path: True)
+        assert spill_root(spill) == spill
+        monkeypatch.setattr(memory_budget, "_is_tmpfs", lambda path: False)
+        assert spill_root(spill) is None
@@ -0,0 +1,122 @@
+"""
+Unit tests for the frame quality gate and gated moment capture.
+Uses synthetic Pillow frames on tmp_path — no network, no ffmpeg.
+"""
+import time
+
+import numpy as np
+import pytest
+from PIL import Image, ImageFilter
+
+import extract_frames
+from quality_gate import QualityGate, frame_metrics
+
+
+def _save(img, path):
+    img.save(str(path), "WEBP", quality=80)
+    return str(path)
+
+
+def _textured(seed: int) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(720, 1280, 3), dtype=np.uint8)
+    return Image.fromarray(pixels).filter(ImageFilter.BoxBlur(1))
+
+
+@pytest.fixture
+def good_frame(tmp_path):
+    return _save(_textured(1), tmp_path / "good.webp")
+
+
+@pytest.fixture
+def black_frame(tmp_path):
+    return _save(Image.new("RGB", (1280, 720), (4, 4, 4)), tmp_path / "black.webp")
+
+
+@pytest.fixture
+def blurred_frame(tmp_path):
+    return _save(_textured(2).filter(ImageFilter.GaussianBlur(25)), tmp_path / "blur.webp")
+
+
+class TestFrameMetrics:
+    def test_metrics_keys(self, good_frame):
+        assert set(frame_metrics(good_frame)) == {"luminance", "contrast", "sharpness", "dhash"}
+
+    def test_black_frame_has_low_luminance(self, black_frame):
+        assert frame_metrics(black_frame)["luminance"] < 10
+
+    def test_blur_lowers_sharpness(self, good_frame, blurred_frame):
+        assert frame_metrics(blurred_frame)["sharpness"] < frame_metrics(good_frame)["sharpness"]
+
+    def test_metrics_cost_milliseconds(self, good_frame):
+        frame_metrics(good_frame)
+        start = time.perf_counter()
+        for _ in range(10):
+            frame_metrics(good_frame)
+        assert (time.perf_counter() - start) / 10 < 0.1
+
+
+class TestQualityGate:
+    def test_accepts_textured_frame(self, good_frame):
+        accepted, reason, _ = QualityGate().check(good_frame)
+        assert accepted, reason
+
+    def test_rejects_black_frame(self, black_frame):
+        accepted, reason, _ = QualityGate().check(black_frame)
+        assert not accepted
+        assert "dark" in reason
+
+    def test_rejects_blurred_frame(self, blurred_frame):
+        accepted, reason, _ = QualityGate().check(blurred_frame)
+        assert not accepted
+        assert "blurred" in reason or "flat" in reason
+
+    def test_rejects_near_duplicate(self, good_frame, tmp_path):
+        reencoded = _save(Image.open(good_frame), tmp_path / "dup.webp")
+        gate = QualityGate()
+        assert gate.check(good_frame)[0]
+        accepted, reason, _ = gate.check(reencoded)
+        assert not accepted
+        assert "duplicate" in reason
+
+    def test_reset_forgets_accepted_hashes(self, good_frame):
+        gate = QualityGate()
+        gate.check(good_frame)
+        gate.reset()
+        assert gate.check(good_frame)[0]
+
+
+class TestCaptureMoments:
+    def test_rejected_frame_is_replaced_by_next_peak(self, sample_heatmap, tmp_path, monkeypatch):
+        # The hottest segment (6s) is a black fade; every other one is fine.
+        def fake_extract(video_url, timestamp, output_path, extra_args=None, settings=None):
+            if timestamp == 6.0:
+                img = Image.new("RGB", (1280, 720), (0, 0, 0))
+            else:
+                img = _textured(int(timestamp))
+            return _save(img, output_path)
+
+        monkeypatch.setattr(extract_frames, "extract_frame", fake_extract)
+        moments = extract_frames.capture_moments(
+            "http://example/video", sample_heatmap, 120.0, str(tmp_path), gate=QualityGate()
+        )
+        timestamps = [m["timestamp"] for m in moments]
+        assert 6.0 not in timestamps
+        assert len(moments) == extract_frames.NUM_FRAMES
+        assert [m["rank"] for m in moments] == list(range(1, len(moments) + 1))
+        for m in moments:
+            assert m["filepath"].endswith(f"f{m['rank']:02d}.webp")
+
+    def test_without_gate_keeps_original_selection(self, sample_heatmap, tmp_path, monkeypatch):
+        def fake_extract(video_url, timestamp, output_path, extra_args=None, settings=None):
+            return _save(Image.new("RGB", (64, 36)), output_path)
+
+        monkeypatch.setattr(extract_frames, "extract_frame", fake_extract)
+        moments = extract_frames.capture_moments(
+            "http://example/video", sample_heatmap, 120.0, str(tmp_path), gate=None
+        )
+        expected = extract_frames.find_top_moments(sample_heatmap, 120.0)
+        assert [m["timestamp"] for m in moments] == [m["timestamp"] for m in expected]
+        assert sorted(p.name for p in tmp_path.iterdir()) == [
+            f"f{i:02d}.webp" for i in range(1, len(moments) + 1)
+        ]
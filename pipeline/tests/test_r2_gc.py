@@ -0,0 +1,206 @@
+"""
+Unit tests for content-addressed uploads and the R2 garbage collector.
+R2 is replaced by an in-memory fake S3 client — no network, no database.
+"""
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+import pytest
+
+import r2_gc
+from extract_frames import IMMUTABLE_CACHE_CONTROL, content_key, upload_to_r2
+from r2_gc import frame_keys, sweep
+
+NOW = datetime(2026, 1, 10, tzinfo=timezone.utc)
+OLD = NOW - timedelta(days=7)
+
+
+class FakeS3:
+    """
+    list_objects_v2 with key-based continuation like S3 (deleting listed
+    keys mid-sweep doesn't shift later pages), delete_objects, get_object.
+    """
+
+    class exceptions:
+        NoSuchKey = type("NoSuchKey", (Exception,), {})
+
+    def __init__(self, objects: dict[str, datetime], catalog: dict | None = None):
+        self.objects = dict(objects)
+        self.catalog = catalog
+        self.delete_calls = []
+        self.list_calls = 0
+
+    def list_objects_v2(self, Bucket, Prefix, MaxKeys, ContinuationToken=None):
+        self.list_calls += 1
+        keys = sorted(
+            k for k in self.objects
+            if k.startswith(Prefix) and (ContinuationToken is None or k > ContinuationToken)
+        )
+        page = keys[:MaxKeys]
+        resp = {
+            "Contents": [{"Key": k, "LastModified": self.objects[k], "Size": 10} for k in page],
+            "IsTruncated": len(keys) > MaxKeys,
+        }
+        if resp["IsTruncated"]:
+            resp["NextContinuationToken"] = page[-1]
+        return resp
+
+    def delete_objects(self, Bucket, Delete):
+        self.delete_calls.append(len(Delete["Objects"]))
+        for obj in Delete["Objects"]:
+            self.objects.pop(obj["Key"], None)
+        return {}
+
+    def get_object(self, Bucket, Key):
+        if self.catalog is None:
+            raise self.exceptions.NoSuchKey(Key)
+        body = MagicMock()
+        body.read.return_value = json.dumps(self.catalog).encode()
+        return {"Body": body}
+
+
+def lookup_for(rows: dict[str, set[str]], recent=(), processed=None):
+    calls = []
+
+    def lookup(video_ids):
+        calls.append(video_ids)
+        referenced = set().union(*(rows.get(v, set()) for v in video_ids))
+        processed_at = {v: t for v, t in (processed or {}).items() if v in video_ids}
+        return referenced, {v for v in video_ids if v in recent}, processed_at
+
+    lookup.calls = calls
+    return lookup
+
+
+class TestContentKeys:
+    def test_key_changes_with_content(self, tmp_path):
+        a, b = tmp_path / "a.webp", tmp_path / "b.webp"
+        a.write_bytes(b"one")
+        b.write_bytes(b"two")
+        assert content_key("frames/v/f01", str(a)) == content_key("frames/v/f01", str(a))
+        assert content_key("frames/v/f01", str(a)) != content_key("frames/v/f01", str(b))
+        assert content_key("frames/v/f01", str(a)).startswith("frames/v/f01.")
+
+    def test_immutable_upload_records_hashed_keys(self, tmp_path):
+        frame, thumb = tmp_path / "f01.webp", tmp_path / "f01_thumb.webp"
+        frame.write_bytes(b"frame")
+        thumb.write_bytes(b"thumb")
+        client = MagicMock()
+        moments = [{"rank": 1, "filepath": str(frame), "variant_paths": {"thumb": str(thumb)}}]
+
+        result = upload_to_r2(client, "vid", moments, immutable=True)[1]
+        assert result["r2_path"] == content_key("frames/vid/f01", str(frame))
+        assert result["r2_variants"]["thumb"] == content_key("frames/vid/f01_thumb", str(thumb))
+        for call in client.upload_file.call_args_list:
+            assert call.kwargs["ExtraArgs"]["CacheControl"] == IMMUTABLE_CACHE_CONTROL
+
+    def test_default_upload_keeps_fixed_keys(self, tmp_path):
+        frame = tmp_path / "f01.webp"
+        frame.write_bytes(b"frame")
+        result = upload_to_r2(MagicMock(), "vid", [{"rank": 1, "filepath": str(frame)}])
+        assert result[1]["r2_path"] == "frames/vid/f01.webp"
+
+
+class TestFrameKeys:
+    def test_includes_variants_and_atlases(self):
+        keys = frame_keys("frames/v/f01.a.webp", {
+            "thumb": "frames/v/f01_thumb.b.webp",
+            "atlases": {"px": {"key": "frames/v/f01_atlas_px.c.webp", "sprites": {}}},
+        })
+        assert keys == {"frames/v/f01.a.webp", "frames/v/f01_thumb.b.webp", "frames/v/f01_atlas_px.c.webp"}
+
+
+class TestSweep:
+    def test_deletes_only_unreferenced_old_objects(self):
+        s3 = FakeS3({
+            "frames/v1/f01.new.webp": OLD,
+            "frames/v1/f01.old.webp": OLD,
+            "frames/v1/f01.upload.webp": NOW - timedelta(minutes=5),
+            "frames/v1/manifest.cur.json": OLD,
+            "frames/v1/manifest.prev.json": OLD,
+            "frames/gone/f01.webp": OLD,
+        }, catalog={"videos": {"v1": {"manifest": "frames/v1/manifest.cur.json"}}})
+        lookup = lookup_for({"v1": {"frames/v1/f01.new.webp"}})
+
+        stats = sweep(s3, "bucket", lookup, dry_run=False, now=NOW)
+        assert sorted(s3.objects) == [
+            "frames/v1/f01.new.webp", "frames/v1/f01.upload.webp", "frames/v1/manifest.cur.json",
+        ]
+        assert (stats["deleted"], stats["referenced"], stats["young"]) == (3, 2, 1)
+
+    def test_manifest_missing_from_a_stale_catalog_is_kept_if_current(self):
+        processed_at = OLD + timedelta(days=1)
+        s3 = FakeS3({
+            "frames/v1/manifest.0a1b.json": OLD,                          # earlier run
+            "frames/v1/manifest.2c3d.json": processed_at + timedelta(seconds=30),
+            "frames/v2/manifest.4e5f.json": OLD,                          # video deleted
+        }, catalog={"videos": {}})
+        stats = sweep(s3, "bucket", lookup_for({}, processed={"v1": processed_at}),
+                      dry_run=False, now=NOW)
+        assert sorted(s3.objects) == ["frames/v1/manifest.2c3d.json"]
+        assert (stats["deleted"], stats["referenced"]) == (2, 1)
+
+    def test_write_backs_are_kept_by_master_hash(self):
+        processed_at = OLD + timedelta(days=1)
+        s3 = FakeS3({
+            "frames/v1/f01.aaaaaaaaaaaa.webp": OLD,                       # current master
+            "frames/v1/f01_px12.aaaaaaaaaaaa.webp": OLD,                  # rendered from it
+            "frames/v1/f01_px24.bbbbbbbbbbbb.webp": processed_at + timedelta(hours=2),  # stale master
+            "frames/v2/f01_px12.aaaaaaaaaaaa.webp": OLD,                  # video deleted
+        })
+        lookup = lookup_for({"v1": {"frames/v1/f01.aaaaaaaaaaaa.webp"}}, processed={"v1": processed_at})
+        sweep(s3, "bucket", lookup, dry_run=False, now=NOW)
+        assert sorted(s3.objects) == [
+            "frames/v1/f01.aaaaaaaaaaaa.webp", "frames/v1/f01_px12.aaaaaaaaaaaa.webp",
+        ]
+
+    def test_write_backs_of_a_fixed_key_master_are_kept_by_age(self):
+        processed_at = OLD + timedelta(days=1)
+        s3 = FakeS3({
+            "frames/v1/f01.webp": OLD,
+            "frames/v1/f01_px12.cccccccccccc.webp": processed_at + timedelta(hours=2),
+            "frames/v1/f01_px24.dddddddddddd.webp": OLD,                  # before the latest run
+        })
+        lookup = lookup_for({"v1": {"frames/v1/f01.webp"}}, processed={"v1": processed_at})
+        sweep(s3, "bucket", lookup, dry_run=False, now=NOW)
+        assert sorted(s3.objects) == ["frames/v1/f01.webp", "frames/v1/f01_px12.cccccccccccc.webp"]
+
+    def test_recently_processed_videos_are_left_alone(self):
+        s3 = FakeS3({"frames/v1/f01.old.webp": OLD})
+        stats = sweep(s3, "bucket", lookup_for({}, recent={"v1"}), dry_run=False, now=NOW)
+        assert stats["deleted"] == 0
+        assert "frames/v1/f01.old.webp" in s3.objects
+
+    def test_dry_run_deletes_nothing(self):
+        s3 = FakeS3({"frames/v1/f01.old.webp": OLD})
+        stats = sweep(s3, "bucket", lookup_for({}), now=NOW)
+        assert stats["deleted"] == 1
+        assert s3.delete_calls == []
+        assert s3.objects
+
+    def test_pages_and_batches(self, monkeypatch):
+        monkeypatch.setattr(r2_gc, "PAGE_SIZE", 3)
+        monkeypatch.setattr(r2_gc, "DELETE_BATCH", 4)
+        s3 = FakeS3({f"frames/v{i}/f01.webp": OLD for i in range(10)})
+        lookup = lookup_for({})
+
+        stats = sweep(s3, "bucket", lookup, dry_run=False, now=NOW)
+        assert stats["deleted"] == 10 and not s3.objects
+        assert s3.list_calls == 4
+        assert len(lookup.calls) == 4 and all(len(ids) <= 3 for ids in lookup.calls)
+        assert s3.delete_calls == [4, 4, 2]
+
+    def test_reports_per_key_delete_errors(self):
+        s3 = FakeS3({"frames/v1/a.webp": OLD, "frames/v1/b.webp": OLD})
+        s3.delete_objects = lambda Bucket, Delete: {
+            "Errors": [{"Key": "frames/v1/a.webp", "Message": "AccessDenied"}]
+        }
+        stats = sweep(s3, "bucket", lookup_for({}), dry_run=False, now=NOW)
+        assert (stats["deleted"], stats["errors"]) == (1, 1)
+
+
+@pytest.mark.parametrize("prefix", ["catalog/", ""])
+def test_main_refuses_prefixes_outside_frames(prefix):
+    with pytest.raises(SystemExit):
+        r2_gc.main(["--prefix", prefix])
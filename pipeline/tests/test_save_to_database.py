@@ -112,8 +112,65 @@ class TestSaveToDatabase:
         assert count == 2, "Re-processing should replace old frames, not accumulate them"
         cur.close()
 
+    def test_refreshes_video_stats_with_frames(self, clean_db, minimal_video_info):
+        from extract_frames import save_to_database
+        moments = [
+            {"rank": i, "timestamp": i * 15.0, "value": 0.5,
+             "width": 1280, "height": 720, "file_size": 40_000}
+            for i in range(1, 4)
+        ]
+        save_to_database(minimal_video_info, moments, heatmap=[], r2_results={},
+                         timings={"capture": 1.5, "total": 4.2})
+        save_to_database(minimal_video_info, moments[:2], heatmap=[], r2_results={})
+        cur = clean_db.cursor()
+        cur.execute("SELECT frame_count, total_size_bytes, processing_ms "
+                    "FROM video_stats WHERE video_id = %s", (minimal_video_info["id"],))
+        assert cur.fetchone() == (2, 80_000, None)
+        cur.close()
+
+    def test_pipeline_status_view_reads_summary(self, clean_db, minimal_video_info):
+        from extract_frames import save_to_database
+        moments = [{"rank": 1, "timestamp": 30.0, "value": 0.8,
+                    "width": 1280, "height": 720, "file_size": 45_000}]
+        save_to_database(minimal_video_info, moments, heatmap=[], r2_results={},
+                         timings={"total": 2.0})
+        cur = clean_db.cursor()
+        cur.execute("SELECT frame_count, total_size_bytes, processing_ms "
+                    "FROM pipeline_status WHERE video_id = %s", (minimal_video_info["id"],))
+        assert cur.fetchone() == (1, 45_000, 2000)
+        cur.close()
+
     def test_raises_when_database_url_is_missing(self, minimal_video_info, monkeypatch):
         import extract_frames
         monkeypatch.setattr(extract_frames, "DATABASE_URL", None)
         with pytest.raises(RuntimeError, match="DATABASE_URL"):
             extract_frames.save_to_database(minimal_video_info, [], [], {})
+
+
+class TestGarbageCollectionLookup:
+    def test_references_come_from_saved_frames(self, clean_db, minimal_video_info):
+        from extract_frames import save_to_database
+        from r2_gc import video_references
+        video_id = minimal_video_info["id"]
+        moments = [{"rank": 1, "timestamp": 30.0, "value": 0.8,
+                    "width": 1280, "height": 720, "file_size": 45_000}]
+        r2_results = {1: {"r2_path": f"frames/{video_id}/f01.aaa.webp",
+                          "r2_variants": {"thumb": f"frames/{video_id}/f01_thumb.bbb.webp"}}}
+        save_to_database(minimal_video_info, moments, heatmap=[], r2_results=r2_results)
+
+        referenced, recent, processed = video_references(
+            clean_db, [video_id, "unknown"], grace_hours=24
+        )
+        assert referenced == {f"frames/{video_id}/f01.aaa.webp",
+                              f"frames/{video_id}/f01_thumb.bbb.webp"}
+        assert recent == {video_id}
+        assert set(processed) == {video_id}
+
+
+class TestIngestDedupe:
+    def test_existing_video_ids(self, clean_db, minimal_video_info):
+        from extract_frames import save_to_database
+        from ingest import existing_video_ids
+        save_to_database(minimal_video_info, [], heatmap=[], r2_results={})
+        found = existing_video_ids(clean_db, [minimal_video_info["id"], "notInDb1234"])
+        assert found == {minimal_video_info["id"]}
@@ -0,0 +1,99 @@
+"""
+Unit tests for proxy scene detection (the no-heatmap fallback).
+Raw proxy frames are synthesized with NumPy and streamed by a tiny Python
+subprocess standing in for ffmpeg — no video, no network.
+"""
+import sys
+
+import numpy as np
+import pytest
+
+import scene_detect
+from scene_detect import (
+    PROXY_HEIGHT, PROXY_WIDTH, SceneDetectionError, frame_features, get_proxy_video_url,
+    score_frames, scores_to_heatmap, synthetic_heatmap,
+)
+
+
+def _shot(seed: int, count: int) -> np.ndarray:
+    """``count`` identical textured frames (one static shot)."""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(40, 220, size=(PROXY_HEIGHT, PROXY_WIDTH), dtype=np.uint8)
+    return np.repeat(frame[None], count, axis=0)
+
+
+@pytest.fixture
+def proxy_stream(tmp_path):
+    """Write frames to a file and return an argv that streams it to stdout."""
+    def build(frames: np.ndarray, exit_code: int = 0) -> list[str]:
+        path = tmp_path / "proxy.raw"
+        path.write_bytes(frames.astype(np.uint8).tobytes())
+        code = (
+            "import sys, shutil; "
+            f"shutil.copyfileobj(open({str(path)!r}, 'rb'), sys.stdout.buffer); "
+            f"sys.exit({exit_code})"
+        )
+        return [sys.executable, "-c", code]
+    return build
+
+
+class TestFrameFeatures:
+    def test_detects_the_cut_between_shots(self, proxy_stream):
+        frames = np.concatenate([_shot(1, 100), _shot(2, 100)])
+        changes, activity, luminance = frame_features("", cmd=proxy_stream(frames))
+        assert len(changes) == len(activity) == len(luminance) == 200
+        assert int(np.argmax(changes)) == 100
+        assert changes[1:100].max() == 0
+
+    def test_decoder_failure_raises(self, proxy_stream):
+        with pytest.raises(SceneDetectionError):
+            frame_features("", cmd=proxy_stream(_shot(1, 3), exit_code=1))
+
+    def test_missing_ffmpeg_raises(self):
+        with pytest.raises(SceneDetectionError):
+            frame_features("", cmd=["/nonexistent/ffmpeg"])
+
+
+class TestScoring:
+    def test_dark_and_flat_frames_score_zero(self):
+        changes = np.array([0.0, 50.0, 50.0, 50.0])
+        activity = np.array([30.0, 30.0, 2.0, 30.0])
+        luminance = np.array([120.0, 5.0, 120.0, 120.0])
+        scores = score_frames(changes, activity, luminance)
+        assert scores[1] == 0 and scores[2] == 0
+        assert scores[3] > scores[0]
+
+    def test_heatmap_segments_cover_duration(self):
+        scores = np.zeros(3600)
+        scores[1234] = 1.0
+        heatmap = scores_to_heatmap(scores, 3600.0)
+        assert len(heatmap) <= scene_detect.MAX_SEGMENTS
+        assert heatmap[0]["start_time"] == 0
+        assert heatmap[-1]["end_time"] == 3600.0
+        best = max(heatmap, key=lambda s: s["value"])
+        assert best["start_time"] <= 1234 < best["end_time"]
+
+    def test_all_unusable_raises(self):
+        with pytest.raises(SceneDetectionError):
+            scores_to_heatmap(np.zeros(30), 30.0)
+
+
+class TestSyntheticHeatmap:
+    def test_top_moment_lands_on_new_shot(self, proxy_stream, monkeypatch):
+        from extract_frames import find_top_moments
+
+        frames = np.concatenate([_shot(1, 60), _shot(2, 60), _shot(3, 60)])
+        monkeypatch.setattr(
+            scene_detect, "proxy_cmd", lambda url, duration=None: proxy_stream(frames)
+        )
+        heatmap = synthetic_heatmap("http://example/proxy", 180.0)
+        top = find_top_moments(heatmap, 180.0, n=2)
+        assert sorted(round(m["timestamp"]) // 10 for m in top) == [6, 12]
+
+    def test_picks_smallest_rendition_for_proxy(self):
+        info = {"formats": [
+            {"vcodec": "avc1", "height": 720, "url": "u720"},
+            {"vcodec": "avc1", "height": 144, "url": "u144"},
+            {"vcodec": "none", "height": None, "url": "audio"},
+        ]}
+        assert get_proxy_video_url(info) == "u144"
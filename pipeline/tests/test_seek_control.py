@@ -0,0 +1,181 @@
+"""
+Unit tests for adaptive timeouts, hedging and retries around frame seeks.
+ffmpeg is replaced by tiny Python subprocesses — no network, no video.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+import seek_control
+from seek_control import FrameCaptureError, LatencyTracker, SeekController, percentile
+
+# Fake "ffmpeg": argv = url output. The URL encodes the behaviour:
+#   sleep:<sec>  → wait then write the output
+#   expired      → print an HTTP 403 error and fail
+#   missing      → print an HTTP 404 error and fail
+#   fail         → fail without a recognisable reason
+#   empty        → exit 0 without writing anything (seek past the end)
+FAKE_FFMPEG = """
+import sys, time
+url, out = sys.argv[1], sys.argv[2]
+if url.startswith("sleep:"):
+    time.sleep(float(url.split(":")[1]))
+    open(out, "wb").write(b"frame")
+elif url == "empty":
+    pass
+elif url == "expired":
+    sys.stderr.write("Server returned 403 Forbidden (access denied)")
+    sys.exit(1)
+elif url == "missing":
+    sys.stderr.write("HTTP error 404 Not Found; Server returned 404 Not Found")
+    sys.exit(1)
+else:
+    sys.exit(1)
+"""
+
+
+def fake_cmd(urls: list[str]):
+    """build_cmd that uses the next URL from ``urls`` for each spawn (hedges included)."""
+    calls = {"n": 0}
+
+    def build(url, timestamp, output_path, extra_args):
+        behaviour = urls[min(calls["n"], len(urls) - 1)] if url == "seq" else url
+        calls["n"] += 1
+        return [sys.executable, "-c", FAKE_FFMPEG, behaviour, output_path]
+
+    return build
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(seek_control, "RETRY_BACKOFF_SEC", 0)
+
+
+class TestPercentiles:
+    def test_nearest_rank(self):
+        samples = list(range(1, 101))
+        assert percentile(samples, 50) == 50
+        assert percentile(samples, 95) == 95
+        assert percentile(samples, 99) == 99
+
+    def test_empty_samples(self):
+        assert percentile([], 99) == 0.0
+
+
+class TestLatencyTracker:
+    def test_default_timeout_until_enough_samples(self):
+        tracker = LatencyTracker()
+        tracker.record(1.0)
+        assert tracker.timeout() == seek_control.DEFAULT_TIMEOUT_SEC
+
+    def test_timeout_adapts_to_observed_latency(self):
+        tracker = LatencyTracker()
+        for s in (4.0, 5.0, 6.0, 5.0, 5.0, 20.0):
+            tracker.record(s)
+        assert tracker.timeout() == pytest.approx(20.0 * seek_control.TIMEOUT_MULTIPLIER)
+
+    def test_timeout_is_clamped(self):
+        fast, slow = LatencyTracker(), LatencyTracker()
+        for _ in range(10):
+            fast.record(0.1)
+            slow.record(100.0)
+        assert fast.timeout() == seek_control.MIN_TIMEOUT_SEC
+        assert slow.timeout() == seek_control.MAX_TIMEOUT_SEC
+
+    def test_report_has_tail_percentiles(self):
+        tracker = LatencyTracker()
+        tracker.record(1.0)
+        assert {"p50", "p95", "p99", "hedges", "retries"} <= set(tracker.report())
+
+
+class TestSeekController:
+    def test_successful_capture_records_latency(self, tmp_path):
+        seeker = SeekController("sleep:0", fake_cmd([]))
+        out = tmp_path / "f01.webp"
+        seeker.extract(10.0, str(out))
+        assert out.read_bytes() == b"frame"
+        assert seeker.tracker.counters["captures"] == 1
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["f01.webp"]
+
+    def test_hedged_request_wins_over_straggler(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(seek_control, "DEFAULT_HEDGE_SEC", 0.3)
+        seeker = SeekController("seq", fake_cmd(["sleep:5", "sleep:0"]))
+        out = tmp_path / "f01.webp"
+        seeker.extract(10.0, str(out))
+        assert out.exists()
+        assert seeker.tracker.counters["hedges"] == 1
+        assert seeker.tracker.counters["hedge_wins"] == 1
+        assert seeker.tracker.samples()[0] < 5
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["f01.webp"]
+
+    def test_expired_url_is_refreshed_and_retried(self, tmp_path):
+        seeker = SeekController(
+            "expired", fake_cmd([]), refresh_url=lambda: "sleep:0", hedge=False
+        )
+        seeker.extract(10.0, str(tmp_path / "f01.webp"))
+        assert seeker.video_url == "sleep:0"
+        assert seeker.tracker.counters["url_refreshes"] == 1
+        assert seeker.tracker.counters["retries"] == 1
+
+    def test_not_found_does_not_refresh_the_url(self, tmp_path):
+        refreshed = []
+        seeker = SeekController(
+            "missing", fake_cmd([]), refresh_url=lambda: refreshed.append(1) or "sleep:0",
+            hedge=False, max_retries=1,
+        )
+        with pytest.raises(FrameCaptureError) as excinfo:
+            seeker.extract(10.0, str(tmp_path / "f01.webp"))
+        assert not excinfo.value.expired
+        assert refreshed == []
+        assert seeker.tracker.counters["url_refreshes"] == 0
+
+    @pytest.mark.parametrize("stderr, expired", [
+        ("HTTP error 403 Forbidden", True),
+        ("Server returned 403 Forbidden (access denied)", True),
+        ("HTTP error 410 Gone", True),
+        ("HTTP error 404 Not Found", False),
+        ("HTTP error 429 Too Many Requests", False),
+        ("Server returned 4XX Client Error, but not one of 40{0,1,3,4}", False),
+    ])
+    def test_only_403_and_410_mean_expired(self, stderr, expired):
+        assert bool(seek_control.EXPIRED_URL_PATTERN.search(stderr)) is expired
+
+    def test_timeout_aborts_a_hung_capture(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(seek_control, "DEFAULT_TIMEOUT_SEC", 0.3)
+        seeker = SeekController("sleep:10", fake_cmd([]), hedge=False, max_retries=0)
+        with pytest.raises(FrameCaptureError) as excinfo:
+            seeker.extract(10.0, str(tmp_path / "f01.webp"))
+        assert excinfo.value.timed_out
+        assert seeker.tracker.counters["timeouts"] == 1
+
+    def test_timeout_is_retried_without_refreshing_the_url(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(seek_control, "DEFAULT_TIMEOUT_SEC", 0.3)
+        refreshed = []
+        seeker = SeekController(
+            "seq", fake_cmd(["sleep:10", "sleep:0"]),
+            refresh_url=lambda: refreshed.append(1) or "sleep:0", hedge=False,
+        )
+        seeker.extract(10.0, str(tmp_path / "f01.webp"))
+        assert refreshed == []
+        assert seeker.tracker.counters["url_refreshes"] == 0
+        assert seeker.tracker.counters["retries"] == 1
+
+    def test_exit_without_output_is_a_retryable_failure(self, tmp_path):
+        seeker = SeekController("seq", fake_cmd(["empty", "sleep:0"]), hedge=False)
+        out = tmp_path / "f01.webp"
+        seeker.extract(10.0, str(out))
+        assert out.read_bytes() == b"frame"
+        assert seeker.tracker.counters["retries"] == 1
+
+    def test_exit_without_output_raises_capture_error(self, tmp_path):
+        seeker = SeekController("empty", fake_cmd([]), hedge=False, max_retries=1)
+        with pytest.raises(FrameCaptureError, match="without writing a frame"):
+            seeker.extract(10.0, str(tmp_path / "f01.webp"))
+        assert list(Path(tmp_path).iterdir()) == []
+
+    def test_retries_are_bounded(self, tmp_path):
+        seeker = SeekController("fail", fake_cmd([]), hedge=False, max_retries=2)
+        with pytest.raises(FrameCaptureError):
+            seeker.extract(10.0, str(tmp_path / "f01.webp"))
+        assert seeker.tracker.counters["retries"] == 2
+        assert list(Path(tmp_path).iterdir()) == []
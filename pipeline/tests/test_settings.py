@@ -0,0 +1,119 @@
+"""
+Unit tests for videos.json settings and per-game-mode variant profiles.
+No network, no database, no R2.
+"""
+import json
+from argparse import Namespace
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+import extract_frames
+from extract_batch import load_settings
+from extract_frames import VARIANTS, PipelineSettings, generate_variants
+
+
+class TestPipelineSettings:
+    def test_defaults_match_module_constants(self):
+        settings = PipelineSettings()
+        assert settings.num_frames == extract_frames.NUM_FRAMES
+        assert settings.frame_width == extract_frames.FRAME_WIDTH
+        assert settings.variant_names() == list(VARIANTS)
+
+    def test_repo_videos_json_settings_are_valid(self):
+        config = json.loads((Path(__file__).parent.parent / "videos.json").read_text())
+        assert PipelineSettings.from_dict(config["settings"]).num_frames == 6
+
+    def test_profiles_are_unioned_in_variants_order(self):
+        settings = PipelineSettings(variant_profiles=("fragment_match", "daily_frame"))
+        names = settings.variant_names()
+        assert names == [n for n in VARIANTS if n in names]
+        assert {"crop_25", "frag_tl", "thumb"} <= set(names)
+        assert "px8" not in names
+
+    def test_generate_variants_false_renders_nothing(self):
+        assert PipelineSettings(generate_variants=False).variant_names() == []
+
+    def test_single_profile_string_is_accepted(self):
+        settings = PipelineSettings.from_dict({"variant_profiles": "pixel_reveal"})
+        assert settings.variant_profiles == ("pixel_reveal",)
+
+    @pytest.mark.parametrize("config", [
+        {"variant_profiles": ["sepia_mode"]},
+        {"output_format": "png"},
+        {"webp_quality": 0},
+        {"num_frames": 0},
+        {"upload_to_r2": "false"},
+        {"generate_variants": 0},
+        {"immutable_keys": "yes"},
+        {"num_frames": "6"},
+        {"num_frames": 2.5},
+        {"frame_width": 1280.5},
+        {"webp_quality": 80.5},
+        {"frame_width": True},
+        {"min_spacing_sec": "10"},
+    ])
+    def test_invalid_settings_raise(self, config):
+        with pytest.raises(ValueError):
+            PipelineSettings.from_dict(config)
+
+    def test_fractional_spacing_is_allowed(self):
+        assert PipelineSettings.from_dict({"min_spacing_sec": 7.5}).min_spacing_sec == 7.5
+
+
+class TestProfileRendering:
+    def test_only_profile_variants_are_written(self, sample_image, tmp_path):
+        settings = PipelineSettings(variant_profiles=("pixel_reveal",))
+        paths = generate_variants(sample_image, "vid", 1, str(tmp_path), settings=settings)
+        assert list(paths) == ["thumb", "px8", "px16", "px32", "px64", "px128"]
+        assert not (tmp_path / "f01_crop_25.webp").exists()
+
+    def test_frame_width_drives_upscaled_variants(self, sample_image, tmp_path):
+        settings = PipelineSettings(frame_width=640, variant_profiles=("daily_frame",))
+        paths = generate_variants(sample_image, "vid", 1, str(tmp_path), settings=settings)
+        with Image.open(paths["crop_25"]) as img:
+            assert img.width == 640
+
+    def test_ffmpeg_command_uses_settings(self):
+        cmd = extract_frames.ffmpeg_frame_cmd("u", 1.0, "out.webp", frame_width=640, quality=60)
+        assert cmd[cmd.index("-vf") + 1] == "scale=640:-1"
+        assert cmd[cmd.index("-quality") + 1] == "60"
+
+
+class TestLoadSettings:
+    def test_reads_config_settings_block(self, tmp_path):
+        config = tmp_path / "videos.json"
+        config.write_text(json.dumps({
+            "videos": [],
+            "settings": {"num_frames": 4, "upload_to_r2": False},
+        }))
+        settings = load_settings(Namespace(config=str(config), profile=None))
+        assert settings.num_frames == 4
+        assert not settings.upload_to_r2
+
+    def test_profile_flag_overrides_config(self, tmp_path):
+        config = tmp_path / "videos.json"
+        config.write_text(json.dumps({"settings": {"variant_profiles": ["all"]}}))
+        settings = load_settings(Namespace(config=str(config), profile=["daily_frame"]))
+        assert settings.variant_profiles == ("daily_frame",)
+
+    def test_unknown_profile_is_not_blamed_on_the_config(self, tmp_path, caplog):
+        config = tmp_path / "videos.json"
+        config.write_text(json.dumps({"settings": {"num_frames": 4}}))
+        with pytest.raises(SystemExit):
+            load_settings(Namespace(config=str(config), profile=["sepia_mode"]))
+        assert "--profile" in caplog.text
+        assert str(config) not in caplog.text
+
+    def test_invalid_config_names_the_file(self, tmp_path, caplog):
+        config = tmp_path / "videos.json"
+        config.write_text(json.dumps({"settings": {"upload_to_r2": "false"}}))
+        with pytest.raises(SystemExit):
+            load_settings(Namespace(config=str(config), profile=None))
+        assert str(config) in caplog.text
+        assert "upload_to_r2" in caplog.text
+
+    def test_missing_config_uses_defaults(self, tmp_path):
+        settings = load_settings(Namespace(config=str(tmp_path / "none.json"), profile=None))
+        assert settings == PipelineSettings()
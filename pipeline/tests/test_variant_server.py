@@ -0,0 +1,282 @@
+"""
+Unit tests for the on-demand variant rendering service.
+Masters come from a temp directory; no R2, no network beyond localhost.
+"""
+import hashlib
+import io
+import json
+import shutil
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+from PIL import Image
+
+import extract_frames
+import variant_server
+from variant_server import (
+    DiskLRU, MasterStore, MemoryLRU, VariantRenderer, build_server, variant_key, variant_spec,
+)
+
+
+def content_hash(path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+@pytest.fixture
+def masters(tmp_path, sample_image):
+    root = tmp_path / "masters"
+    (root / "abc123").mkdir(parents=True)
+    shutil.copy(sample_image, root / "abc123" / "f01.webp")
+    return str(root)
+
+
+class FakeS3:
+    """get_object over an in-memory bucket."""
+
+    class exceptions:
+        NoSuchKey = type("NoSuchKey", (Exception,), {})
+
+    def __init__(self, objects: dict[str, bytes]):
+        self.objects = objects
+        self.gets = []
+
+    def get_object(self, Bucket, Key):
+        self.gets.append(Key)
+        if Key not in self.objects:
+            raise self.exceptions.NoSuchKey(Key)
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+
+def immutable_bucket(sample_image, master_key="frames/abc123/f01.0123456789ab.webp"):
+    """R2 as left by an IMMUTABLE_KEYS run with variants turned off."""
+    manifest_key = "frames/abc123/manifest.feedbeef0000.json"
+    with open(sample_image, "rb") as f:
+        master = f.read()
+    return FakeS3({
+        master_key: master,
+        manifest_key: json.dumps({"frames": [{"rank": 1, "key": master_key}]}).encode(),
+        "catalog/index.json": json.dumps(
+            {"videos": {"abc123": {"manifest": manifest_key}}}
+        ).encode(),
+    })
+
+
+@pytest.fixture
+def renderer(masters, tmp_path):
+    return VariantRenderer(
+        MasterStore(masters), MemoryLRU(10 * 1024 * 1024), DiskLRU(str(tmp_path / "cache"), 10**8)
+    )
+
+
+class TestVariantSpec:
+    def test_named_variants_come_from_variants_table(self):
+        assert variant_spec("px8") == extract_frames.VARIANTS["px8"]
+
+    @pytest.mark.parametrize("name,spec", [
+        ("px12", {"pixelate": 12}),
+        ("crop_40", {"crop": 0.4}),
+        ("thumb_200", {"width": 200}),
+    ])
+    def test_parametrized_variants(self, name, spec):
+        assert variant_spec(name) == spec
+
+    @pytest.mark.parametrize("name", ["px1", "px9999", "crop_0", "thumb_5000", "sepia"])
+    def test_rejects_unknown_or_out_of_range(self, name):
+        assert variant_spec(name) is None
+
+
+class TestMemoryLRU:
+    def test_evicts_least_recently_used(self):
+        cache = MemoryLRU(10)
+        cache.put("a", b"1234")
+        cache.put("b", b"1234")
+        cache.get("a")
+        cache.put("c", b"1234")
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1234"
+        assert cache.size == 8
+
+    def test_ignores_items_larger_than_capacity(self):
+        cache = MemoryLRU(4)
+        cache.put("a", b"12345")
+        assert len(cache) == 0
+
+
+class TestDiskLRU:
+    def test_evicts_and_deletes_files(self, tmp_path):
+        cache = DiskLRU(str(tmp_path), 10)
+        cache.put("frames/x/a.webp", b"123456")
+        cache.put("frames/x/b.webp", b"123456")
+        assert cache.get("frames/x/a.webp") is None
+        assert not (tmp_path / "frames/x/a.webp").exists()
+        assert cache.get("frames/x/b.webp") == b"123456"
+
+    def test_survives_restart(self, tmp_path):
+        DiskLRU(str(tmp_path), 100).put("frames/x/a.webp", b"data")
+        reopened = DiskLRU(str(tmp_path), 100)
+        assert reopened.get("frames/x/a.webp") == b"data"
+        assert reopened.size == 4
+
+
+class TestVariantRenderer:
+    def test_renders_then_serves_from_cache(self, renderer):
+        first = renderer.get("abc123", 1, "px16")
+        second = renderer.get("abc123", 1, "px16")
+        assert first == second
+        assert renderer.stats["renders"] == 1
+        assert renderer.stats["memory_hits"] == 1
+        with Image.open(io.BytesIO(first)) as img:
+            assert img.width == extract_frames.FRAME_WIDTH
+
+    def test_disk_tier_backs_memory_tier(self, masters, tmp_path):
+        disk = DiskLRU(str(tmp_path / "cache"), 10**8)
+        VariantRenderer(MasterStore(masters), MemoryLRU(10**8), disk).get("abc123", 1, "thumb")
+        fresh = VariantRenderer(MasterStore(masters), MemoryLRU(10**8), disk)
+        fresh.get("abc123", 1, "thumb")
+        assert fresh.stats["disk_hits"] == 1
+        assert fresh.stats["renders"] == 0
+
+    def test_matches_generate_variants_output(self, renderer, sample_image, tmp_path):
+        paths = extract_frames.generate_variants(sample_image, "abc123", 1, str(tmp_path))
+        with open(paths["crop_25"], "rb") as f:
+            assert renderer.get("abc123", 1, "crop_25") == f.read()
+
+    def test_write_back_key_names_the_master(self, masters, sample_image):
+        written = []
+        renderer = VariantRenderer(
+            MasterStore(masters), MemoryLRU(10**8),
+            write_back=lambda key, data: written.append(key),
+        )
+        renderer.get("abc123", 1, "px32")
+        assert written == [f"frames/abc123/f01_px32.{content_hash(sample_image)}.webp"]
+
+    def test_reprocessed_master_is_not_served_from_cache(self, masters, tmp_path, monkeypatch):
+        disk = DiskLRU(str(tmp_path / "cache"), 10**8)
+        renderer = VariantRenderer(MasterStore(masters), MemoryLRU(10**8), disk)
+        before = renderer.get("abc123", 1, "thumb")
+
+        master = f"{masters}/abc123/f01.webp"
+        Image.new("RGB", (1280, 720), "red").save(master, "WEBP")
+        monkeypatch.setattr(variant_server, "MASTER_KEYS_TTL_SEC", 0)   # version re-checked
+        after = renderer.get("abc123", 1, "thumb")
+        assert after != before
+        assert renderer.stats["renders"] == 2
+
+        restarted = VariantRenderer(MasterStore(masters), MemoryLRU(10**8), disk)
+        assert restarted.get("abc123", 1, "thumb") == after
+
+    def test_other_master_version_is_missing(self, renderer, sample_image):
+        assert renderer.get("abc123", 1, "px8", content_hash(sample_image)) is not None
+        assert renderer.get("abc123", 1, "px8", "0123456789ab") is None
+
+    def test_missing_master_returns_none(self, renderer):
+        assert renderer.get("nope", 1, "px8") is None
+
+    def test_pipeline_settings_shape_the_output(self, masters, sample_image, tmp_path):
+        settings = extract_frames.PipelineSettings(frame_width=640, webp_quality=60)
+        renderer = VariantRenderer(MasterStore(masters), MemoryLRU(10**8), settings=settings)
+        paths = extract_frames.generate_variants(
+            sample_image, "abc123", 1, str(tmp_path), settings=settings
+        )
+        with open(paths["px32"], "rb") as f:
+            assert renderer.get("abc123", 1, "px32") == f.read()
+        with Image.open(paths["px32"]) as img:
+            assert img.width == 640
+
+    def test_finished_request_keeps_a_newer_inflight_lock(self, renderer, sample_image, monkeypatch):
+        key = variant_key("abc123", 1, "px8", content_hash(sample_image))
+        newer = threading.Lock()
+        render = renderer._render
+
+        def render_while_another_request_arrives(*args):
+            renderer._inflight[key] = newer
+            return render(*args)
+
+        monkeypatch.setattr(renderer, "_render", render_while_another_request_arrives)
+        renderer.get("abc123", 1, "px8")
+        assert renderer._inflight[key] is newer
+
+
+class TestImmutableMasters:
+    def test_hashed_master_is_found_in_local_dir(self, tmp_path, sample_image):
+        (tmp_path / "abc123").mkdir()
+        shutil.copy(sample_image, tmp_path / "abc123" / "f01.0123456789ab.webp")
+        assert MasterStore(str(tmp_path)).get("abc123", 1) is not None
+
+    def test_hashed_master_is_resolved_through_the_manifest(self, sample_image):
+        s3 = immutable_bucket(sample_image)
+        store = MasterStore(s3_client=s3)
+        assert store.get("abc123", 1) == s3.objects["frames/abc123/f01.0123456789ab.webp"]
+        store.get("abc123", 1)
+        assert s3.gets.count("catalog/index.json") == 1
+
+    def test_reprocessed_video_re_resolves_its_master(self, sample_image):
+        s3 = immutable_bucket(sample_image)
+        store = MasterStore(s3_client=s3)
+        store.get("abc123", 1)
+        newer = immutable_bucket(sample_image, "frames/abc123/f01.ba9876543210.webp")
+        s3.objects = newer.objects     # old master swept, manifest replaced
+        assert store.get("abc123", 1) == newer.objects["frames/abc123/f01.ba9876543210.webp"]
+
+    def test_server_renders_from_an_immutable_layout(self, sample_image):
+        renderer = VariantRenderer(MasterStore(s3_client=immutable_bucket(sample_image)),
+                                   MemoryLRU(10**8))
+        server = build_server(renderer, port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            base_url = f"http://127.0.0.1:{server.server_address[1]}"
+            with urllib.request.urlopen(f"{base_url}/frames/abc123/f01_px8.webp") as resp:
+                assert resp.status == 200
+                assert resp.read()[:4] == b"RIFF"
+            with pytest.raises(urllib.error.HTTPError) as excinfo:
+                urllib.request.urlopen(f"{base_url}/frames/abc123/f02_px8.webp")
+            assert excinfo.value.code == 404
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestHTTP:
+    @pytest.fixture
+    def base_url(self, renderer):
+        server = build_server(renderer, port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+        server.shutdown()
+        server.server_close()
+
+    def test_serves_variant(self, base_url):
+        with urllib.request.urlopen(f"{base_url}/frames/abc123/f01_px24.webp") as resp:
+            assert resp.headers["Content-Type"] == "image/webp"
+            assert "max-age" in resp.headers["Cache-Control"]
+            assert resp.read()[:4] == b"RIFF"
+
+    @pytest.mark.parametrize("path,status", [
+        ("/frames/abc123/f01_sepia.webp", 400),
+        ("/frames/missing/f01_px8.webp", 404),
+        ("/frames/../etc/passwd", 404),
+    ])
+    def test_errors(self, base_url, path, status):
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            urllib.request.urlopen(base_url + path)
+        assert excinfo.value.code == status
+
+    def test_versioned_url_is_immutable(self, base_url, sample_image):
+        version = content_hash(sample_image)
+        with urllib.request.urlopen(f"{base_url}/frames/abc123/f01_px8.{version}.webp") as resp:
+            assert "immutable" in resp.headers["Cache-Control"]
+        with urllib.request.urlopen(f"{base_url}/frames/abc123/f01_px8.webp") as resp:
+            assert "immutable" not in resp.headers["Cache-Control"]
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            urllib.request.urlopen(f"{base_url}/frames/abc123/f01_px8.0123456789ab.webp")
+        assert excinfo.value.code == 404
+
+    def test_stats(self, base_url):
+        urllib.request.urlopen(f"{base_url}/frames/abc123/f01_thumb.webp").read()
+        with urllib.request.urlopen(f"{base_url}/stats") as resp:
+            assert json.load(resp)["renders"] == 1
@@ -0,0 +1,281 @@
+"""
+Unit tests for the warm worker daemon and warm pipeline backends.
+process_video is replaced by an in-test runner — no network, no ffmpeg.
+"""
+import threading
+import time
+
+import pytest
+
+import extract_frames
+from worker_daemon import JobRejected, WorkerDaemon, build_server, request
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+class BlockingRunner:
+    """Runs until released; records peak concurrency."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, job):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            self.release.wait(5)
+            if job.url.endswith("boom"):
+                raise RuntimeError("ffmpeg exploded")
+            if job.cancel.is_set():
+                raise extract_frames.JobCancelled("cancelled before upload")
+            return {job.url: {"manifest": "m"}}
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+@pytest.fixture
+def runner():
+    return BlockingRunner()
+
+
+@pytest.fixture
+def daemon(runner):
+    daemon = WorkerDaemon(concurrency=2, max_queued=3, runner=runner)
+    daemon.start()
+    yield daemon
+    runner.release.set()
+    daemon.drain(timeout=5)
+
+
+class TestScheduling:
+    def test_job_runs_to_done(self, daemon, runner):
+        runner.release.set()
+        job = daemon.submit("abc123")
+        wait_for(lambda: job.status == "done")
+        assert job.url == "https://www.youtube.com/watch?v=abc123"
+        assert job.catalog == {job.url: {"manifest": "m"}}
+
+    def test_failures_are_recorded(self, daemon, runner):
+        runner.release.set()
+        job = daemon.submit("https://example/boom")
+        wait_for(lambda: job.status == "failed")
+        assert "ffmpeg exploded" in job.error
+
+    def test_concurrency_is_bounded(self, daemon, runner):
+        jobs = [daemon.submit(f"v{i}") for i in range(2)]
+        wait_for(lambda: runner.running == 2)
+        jobs += [daemon.submit(f"v{i}") for i in range(2, 4)]
+        time.sleep(0.05)
+        assert runner.peak == 2
+        assert daemon.counts()["queued"] == 2
+        runner.release.set()
+        wait_for(lambda: all(j.status == "done" for j in jobs))
+
+    def test_queue_full_is_rejected(self, daemon, runner):
+        for i in range(2):
+            daemon.submit(f"running{i}")
+        wait_for(lambda: runner.running == 2)
+        for i in range(3):
+            daemon.submit(f"queued{i}")
+        with pytest.raises(JobRejected, match="full"):
+            daemon.submit("one-too-many")
+
+    def test_cancel_queued_job(self, daemon, runner):
+        for i in range(2):
+            daemon.submit(f"running{i}")
+        wait_for(lambda: runner.running == 2)
+        queued = daemon.submit("waiting")
+        assert daemon.cancel(queued.id).status == "cancelled"
+        runner.release.set()
+        wait_for(lambda: daemon.counts()["done"] == 2)
+        assert queued.started_at is None
+
+    def test_cancel_running_job(self, daemon, runner):
+        job = daemon.submit("slow")
+        wait_for(lambda: job.status == "running")
+        daemon.cancel(job.id)
+        runner.release.set()
+        wait_for(lambda: job.status == "cancelled")
+
+    def test_unknown_profile_is_rejected(self, daemon):
+        with pytest.raises(ValueError):
+            daemon.submit("abc", profiles=["sepia_mode"])
+
+
+class TestDrain:
+    def test_finishes_queued_jobs_and_refuses_new_ones(self, runner):
+        daemon = WorkerDaemon(concurrency=1, runner=runner)
+        daemon.start()
+        jobs = [daemon.submit(f"v{i}") for i in range(3)]
+        threading.Timer(0.1, runner.release.set).start()
+        assert daemon.drain(timeout=5)
+        assert all(j.status == "done" for j in jobs)
+        with pytest.raises(JobRejected, match="draining"):
+            daemon.submit("late")
+
+    def test_timeout_cancels_running_jobs(self):
+        started = threading.Event()
+
+        def runner(job):
+            started.set()
+            job.cancel.wait(5)
+            raise extract_frames.JobCancelled("cancelled before upload")
+
+        daemon = WorkerDaemon(concurrency=1, runner=runner)
+        daemon.start()
+        job = daemon.submit("stuck")
+        started.wait(5)
+        assert not daemon.drain(timeout=0.05)
+        assert job.status == "cancelled"
+
+    def test_jobs_ignoring_cancel_are_abandoned_after_grace(self):
+        started, release = threading.Event(), threading.Event()
+
+        def runner(job):
+            started.set()
+            release.wait(5)
+            return {}
+
+        daemon = WorkerDaemon(concurrency=1, runner=runner)
+        daemon.start()
+        running, queued = daemon.submit("hung"), daemon.submit("waiting")
+        started.wait(5)
+        start = time.monotonic()
+        assert not daemon.drain(timeout=0.05, grace=0.1)
+        assert time.monotonic() - start < 2
+        assert running.status == "failed" and "abandoned" in running.error
+        assert queued.status == "cancelled"
+
+        release.set()                      # a late finish doesn't overwrite it
+        time.sleep(0.1)
+        assert running.status == "failed"
+
+
+class TestHTTP:
+    @pytest.fixture
+    def socket_path(self, daemon, tmp_path):
+        path = str(tmp_path / "worker.sock")
+        server = build_server(daemon, path)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        yield path
+        server.shutdown()
+        server.server_close()
+
+    def test_submit_status_cancel_over_unix_socket(self, socket_path, runner):
+        for i in range(2):
+            request("POST", "/jobs", {"url": f"busy{i}"}, socket_path)
+        status, job = request("POST", "/jobs", {"url": "abc", "profiles": ["thumbnail"]}, socket_path)
+        assert status == 202
+        assert request("GET", f"/jobs/{job['id']}", None, socket_path)[1]["status"] == "queued"
+        assert request("DELETE", f"/jobs/{job['id']}", None, socket_path)[1]["status"] == "cancelled"
+        status, health = request("GET", "/health", None, socket_path)
+        assert health["jobs"]["cancelled"] == 1 and not health["draining"]
+
+    @pytest.mark.parametrize("payload,status", [
+        ({"nope": 1}, 400),
+        ({"url": "abc", "profiles": ["sepia_mode"]}, 400),
+    ])
+    def test_bad_requests(self, socket_path, payload, status):
+        assert request("POST", "/jobs", payload, socket_path)[0] == status
+
+    def test_unknown_job(self, socket_path):
+        assert request("GET", "/jobs/missing", None, socket_path)[0] == 404
+
+
+class FakeConn:
+    def __init__(self):
+        self.closed = 0
+        self.pings = 0
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql):
+                conn.pings += 1
+
+        return Cursor()
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class TestWarmResources:
+    @pytest.fixture
+    def warm(self):
+        warm = extract_frames.enable_warm_resources()
+        yield warm
+        extract_frames.disable_warm_resources()
+
+    def test_r2_client_is_created_once(self, warm, monkeypatch):
+        created = []
+        monkeypatch.setattr(extract_frames, "create_r2_client", lambda: created.append(1) or object())
+        assert extract_frames.get_r2_client() is extract_frames.get_r2_client()
+        assert len(created) == 1
+
+    def test_get_video_info_reuses_the_threads_youtube_dl(self, warm, monkeypatch):
+        class FakeYDL:
+            def extract_info(self, url, download):
+                return {"id": url}
+
+        ydl = FakeYDL()
+        monkeypatch.setattr(warm, "youtube_dl", lambda: ydl)
+        assert extract_frames.get_video_info("abc") == {"id": "abc"}
+
+    def test_db_connection_is_reused_and_pinged_when_idle(self, warm, monkeypatch):
+        import psycopg2
+
+        conns = []
+        monkeypatch.setattr(extract_frames, "DATABASE_URL", "postgresql://x")
+        monkeypatch.setattr(psycopg2, "connect", lambda *a, **kw: conns.append(FakeConn()) or conns[-1])
+        first = warm.db_connection()
+        assert warm.db_connection() is first and first.pings == 0
+
+        monkeypatch.setattr(extract_frames, "DB_PING_AFTER_SEC", 0)
+        assert warm.db_connection() is first and first.pings == 1
+
+        first.closed = 1
+        assert warm.db_connection() is not first
+        assert len(conns) == 2
+
+    def test_disable_closes_connections(self, monkeypatch):
+        import psycopg2
+
+        warm = extract_frames.enable_warm_resources()
+        monkeypatch.setattr(extract_frames, "DATABASE_URL", "postgresql://x")
+        monkeypatch.setattr(psycopg2, "connect", lambda *a, **kw: FakeConn())
+        conn = warm.db_connection()
+        extract_frames.disable_warm_resources()
+        assert conn.closed
+        assert extract_frames._warm is None
+
+
+class TestCancelBetweenStages:
+    def test_cancel_stops_before_capture(self, monkeypatch):
+        monkeypatch.setattr(extract_frames, "get_video_info", lambda url: {
+            "id": "v", "duration": 60, "heatmap": [{"start_time": 0, "end_time": 60, "value": 1}],
+            "formats": [{"url": "http://x", "vcodec": "avc1", "height": 720}],
+        })
+        cancel = threading.Event()
+        cancel.set()
+        with pytest.raises(extract_frames.JobCancelled, match="capture"):
+            extract_frames.process_video("v", cancel=cancel)
@@ -0,0 +1,539 @@
+"""
+On-demand variant rendering service
+===================================
+Renders frame variants on request from the stored master frame instead of
+precomputing all of VARIANTS for every frame. Paths mirror the R2 layout,
+so the service can sit behind the CDN as the origin for variant keys:
+
+    GET /frames/<video_id>/f<rank>_<variant>.webp           current master
+    GET /frames/<video_id>/f<rank>_<variant>.<hash>.webp    master <hash> only
+    GET /stats                                               cache hit/miss counters
+
+Besides the named VARIANTS, parametrized variants are accepted:
+
+    px<N>        N×N pixelation          (PARAM_LIMITS["pixelate"])
+    crop_<P>     center P% crop          (PARAM_LIMITS["crop"])
+    thumb_<W>    W-pixel-wide thumbnail  (PARAM_LIMITS["width"])
+
+Masters are found under their fixed key (``f01.webp``) or, for videos
+processed with IMMUTABLE_KEYS, under the content-hashed key listed in the
+video's current manifest (resolved through catalog/index.json).
+
+Every rendered variant is keyed on its master's content hash (the
+``<hash>`` of ``f01.<hash>.webp``, or the same digest of a fixed-key
+master's bytes), so reprocessing a video never serves or writes back
+variants of the old master. Versioned URLs are immutable; unversioned ones
+follow the current master, which is re-checked every MASTER_KEYS_TTL_SEC.
+
+Rendering reuses extract_frames.render_variant with the batch's
+PipelineSettings (frame_width, webp_quality from the config file's
+``settings`` block), so output matches what generate_variants produces.
+Results live in a size-bounded in-memory LRU backed by a larger on-disk
+LRU and can be written back to R2 under their versioned key, after which
+the CDN serves that URL without reaching this service.
+
+Usage:
+    python variant_server.py --masters ./frames            # local masters
+    python variant_server.py --r2 --write-back --port 8090  # masters from R2
+    python variant_server.py --masters ./frames --config videos.json
+
+Environment:
+    VARIANT_CACHE_MB        In-memory cache size (default: 64)
+    VARIANT_DISK_CACHE_MB   On-disk cache size (default: 1024)
+    VARIANT_CACHE_DIR       On-disk cache directory (default: $TMPDIR/framedle-variants)
+"""
+
+import argparse
+import glob
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import extract_frames
+from extract_frames import (
+    IMMUTABLE_CACHE_CONTROL, R2_BUCKET, VARIANTS, PipelineSettings, render_variant, setup_logging,
+)
+from manifest import load_catalog
+
+log = logging.getLogger(__name__)
+
+VARIANT_CACHE_MB = int(os.environ.get("VARIANT_CACHE_MB", "64"))
+VARIANT_DISK_CACHE_MB = int(os.environ.get("VARIANT_DISK_CACHE_MB", "1024"))
+VARIANT_CACHE_DIR = os.environ.get(
+    "VARIANT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "framedle-variants")
+)
+# How long resolved master keys and versions are reused (the catalog's max-age).
+MASTER_KEYS_TTL_SEC = 300
+
+# Unversioned URLs change meaning when the video is reprocessed.
+CACHE_CONTROL = f"public, max-age={MASTER_KEYS_TTL_SEC}"
+
+# Inclusive bounds for parametrized variants
+PARAM_LIMITS = {
+    "pixelate": (2, 256),
+    "crop": (5, 100),      # percent
+    "width": (16, 1280),
+}
+
+PATH_PATTERN = re.compile(
+    r"^/frames/([A-Za-z0-9_-]{1,20})/f(\d{2})_([a-z0-9_]{1,16})(?:\.([0-9a-f]{12}))?\.webp$"
+)
+HASHED_MASTER = re.compile(r"/f\d{2}\.([0-9a-f]{12})\.webp$")
+PARAM_PATTERNS = [
+    (re.compile(r"^px(\d+)$"), "pixelate", lambda n: n),
+    (re.compile(r"^crop_(\d+)$"), "crop", lambda n: n / 100),
+    (re.compile(r"^thumb_(\d+)$"), "width", lambda n: n),
+]
+
+
+def variant_spec(name: str) -> dict | None:
+    """Spec for a named or parametrized variant, or None if invalid."""
+    if name in VARIANTS:
+        return VARIANTS[name]
+    for pattern, key, convert in PARAM_PATTERNS:
+        match = pattern.match(name)
+        if match:
+            n = int(match.group(1))
+            low, high = PARAM_LIMITS[key]
+            if low <= n <= high:
+                return {key: convert(n)}
+            return None
+    return None
+
+
+def master_version(location: str, data: bytes) -> str:
+    """Content hash of a master, as in its content-hashed key (see extract_frames.content_key)."""
+    match = HASHED_MASTER.search(location)
+    return match.group(1) if match else hashlib.sha256(data).hexdigest()[:12]
+
+
+def variant_key(video_id: str, rank: int, name: str, version: str) -> str:
+    """R2/cache key of a variant rendered from master ``version``."""
+    return f"frames/{video_id}/f{rank:02d}_{name}.{version}.webp"
+
+
+class MemoryLRU:
+    """Thread-safe byte-size-bounded LRU of key → bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._items[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class DiskLRU:
+    """
+    Byte-size-bounded LRU of files under ``root``. Recency survives
+    restarts via file mtimes, which are bumped on every hit.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items: OrderedDict[str, int] = OrderedDict()   # key → size
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        entries = []
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if filename.endswith(".part"):
+                    os.remove(path)   # interrupted write
+                    continue
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, os.path.relpath(path, root), stat.st_size))
+        for _, key, size in sorted(entries):
+            self._items[key] = size
+            self.size += size
+        self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+            os.utime(self._path(key))
+            return data
+        except FileNotFoundError:
+            with self._lock:
+                self.size -= self._items.pop(key, 0)
+            return None
+
+    def put(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so concurrent readers never see partial files
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self.size -= self._items.pop(key, 0)
+            self._items[key] = len(data)
+            self.size += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self.size > self.max_bytes and self._items:
+            key, size = self._items.popitem(last=False)
+            self.size -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def __len__(self):
+        return len(self._items)
+
+
+class MasterStore:
+    """
+    Master frames from a local directory (R2 layout) or from R2 itself.
+    Content-hashed masters (``f01.<hash>.webp``) are found by globbing the
+    local directory, and in R2 through the video's manifest.
+    """
+
+    def __init__(self, master_dir: str | None = None, s3_client=None, bucket: str = R2_BUCKET):
+        self.master_dir = master_dir
+        self.s3 = s3_client
+        self.bucket = bucket
+        self._catalog: tuple[float, dict] | None = None
+        self._keys: dict[str, tuple[float, dict[int, str]]] = {}
+        self._versions: dict[tuple[str, int], tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def _local(self, video_id: str, rank: int) -> tuple[str, bytes] | None:
+        fixed = os.path.join(self.master_dir, video_id, f"f{rank:02d}.webp")
+        hashed = glob.glob(os.path.join(glob.escape(self.master_dir), video_id, f"f{rank:02d}.*.webp"))
+        for path in [fixed] + sorted(hashed, key=os.path.getmtime, reverse=True):
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    return path, f.read()
+        return None
+
+    def _read(self, key: str) -> bytes | None:
+        try:
+            return self.s3.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        except self.s3.exceptions.NoSuchKey:
+            return None
+
+    def master_keys(self, video_id: str, refresh: bool = False) -> dict[int, str]:
+        """rank → master key from the video's current manifest ({} if unlisted)."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._keys.get(video_id)
+            if cached and not refresh and now - cached[0] < MASTER_KEYS_TTL_SEC:
+                return cached[1]
+            catalog = self._catalog
+        if catalog is None or refresh or now - catalog[0] >= MASTER_KEYS_TTL_SEC:
+            catalog = (now, load_catalog(self.s3, self.bucket).get("videos", {}))
+        entry = catalog[1].get(video_id)
+        body = self._read(entry["manifest"]) if entry else None
+        keys = {frame["rank"]: frame["key"] for frame in json.loads(body)["frames"]} if body else {}
+        with self._lock:
+            self._catalog = catalog
+            self._keys[video_id] = (now, keys)
+        return keys
+
+    def _locate(self, video_id: str, rank: int) -> tuple[str, bytes] | None:
+        """(path or key, bytes) of the current master."""
+        if self.master_dir:
+            found = self._local(video_id, rank)
+            if found is not None:
+                return found
+        if self.s3 is None:
+            return None
+        key = self.master_keys(video_id).get(rank)
+        if key is not None:
+            data = self._read(key)
+            if data is not None:
+                return key, data
+            # Reprocessed since we resolved it; the old master was swept.
+            key = self.master_keys(video_id, refresh=True).get(rank)
+            data = self._read(key) if key else None
+            if data is not None:
+                return key, data
+        key = f"frames/{video_id}/f{rank:02d}.webp"
+        data = self._read(key)
+        return (key, data) if data is not None else None
+
+    def fetch(self, video_id: str, rank: int) -> tuple[str, bytes] | None:
+        """(version, bytes) of the current master; remembers the version."""
+        found = self._locate(video_id, rank)
+        with self._lock:
+            if found is None:
+                self._versions.pop((video_id, rank), None)
+                return None
+            version = master_version(*found)
+            self._versions[(video_id, rank)] = (time.monotonic(), version)
+        return version, found[1]
+
+    def version(self, video_id: str, rank: int) -> str | None:
+        """Master version seen by a fetch within MASTER_KEYS_TTL_SEC, else None."""
+        with self._lock:
+            cached = self._versions.get((video_id, rank))
+        if cached and time.monotonic() - cached[0] < MASTER_KEYS_TTL_SEC:
+            return cached[1]
+        return None
+
+    def get(self, video_id: str, rank: int) -> bytes | None:
+        found = self.fetch(video_id, rank)
+        return found[1] if found else None
+
+
+class VariantRenderer:
+    """
+    Cache-first variant rendering: memory LRU → disk LRU → render from the
+    master. Concurrent requests for the same variant render it once.
+    """
+
+    def __init__(self, masters: MasterStore, memory: MemoryLRU, disk: DiskLRU | None = None,
+                 write_back=None, settings: PipelineSettings | None = None):
+        self.masters = masters
+        self.memory = memory
+        self.disk = disk
+        self.write_back = write_back
+        self.settings = settings or PipelineSettings()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "renders": 0, "missing": 0}
+        self._stats_lock = threading.Lock()
+        self._inflight: dict[str, threading.Lock] = {}
+        self._inflight_lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _cached(self, key: str) -> bytes | None:
+        data = self.memory.get(key)
+        if data is not None:
+            self._count("memory_hits")
+            return data
+        if self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                self._count("disk_hits")
+                self.memory.put(key, data)
+                return data
+        return None
+
+    def get(self, video_id: str, rank: int, name: str, version: str | None = None) -> bytes | None:
+        """
+        Variant bytes rendered from the current master, or None when there is
+        no master (or, with ``version``, when that is not the current one).
+        """
+        current = self.masters.version(video_id, rank)
+        if current is not None:
+            data = self._cached(variant_key(video_id, rank, name, current))
+            if data is not None and version in (None, current):
+                return data
+        master = self.masters.fetch(video_id, rank)   # re-checks the version
+        if master is None or version not in (None, master[0]):
+            self._count("missing")
+            return None
+        current, master_bytes = master
+        key = variant_key(video_id, rank, name, current)
+        data = self._cached(key)
+        if data is not None:
+            return data
+
+        with self._inflight_lock:
+            lock = self._inflight.setdefault(key, threading.Lock())
+        with lock:
+            try:
+                data = self._cached(key)
+                if data is not None:
+                    return data
+                data = self._render(master_bytes, name)
+                self._count("renders")
+                self.memory.put(key, data)
+                if self.disk is not None:
+                    self.disk.put(key, data)
+                if self.write_back is not None:
+                    self.write_back(key, data)
+                return data
+            finally:
+                with self._inflight_lock:
+                    # A later request may have installed its own lock already.
+                    if self._inflight.get(key) is lock:
+                        del self._inflight[key]
+
+    def _render(self, master: bytes, name: str) -> bytes:
+        from PIL import Image
+
+        with Image.open(io.BytesIO(master)) as img:
+            img.load()
+            variant = render_variant(img, variant_spec(name), self.settings.frame_width)
+        out = io.BytesIO()
+        variant.save(out, "WEBP", quality=self.settings.webp_quality)
+        variant.close()
+        return out.getvalue()
+
+    def report(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["memory_entries"] = len(self.memory)
+        stats["memory_bytes"] = self.memory.size
+        if self.disk is not None:
+            stats["disk_entries"] = len(self.disk)
+            stats["disk_bytes"] = self.disk.size
+        return stats
+
+
+def r2_write_back(s3_client, bucket: str = R2_BUCKET, workers: int = 2):
+    """
+    Callback uploading rendered variants to R2 in the background. Keys carry
+    the master version, so the objects never change and are cached as such.
+    """
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="r2-write-back")
+
+    def upload(key: str, data: bytes):
+        try:
+            s3_client.put_object(
+                Bucket=bucket, Key=key, Body=data,
+                ContentType="image/webp", CacheControl=IMMUTABLE_CACHE_CONTROL,
+            )
+            log.info(f"  Wrote back {key}")
+        except Exception as e:
+            log.warning(f"  Write-back of {key} failed: {e}")
+
+    def submit(key: str, data: bytes):
+        executor.submit(upload, key, data)
+
+    submit.executor = executor
+    return submit
+
+
+def make_handler(renderer: VariantRenderer):
+    class VariantHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send(200, json.dumps(renderer.report()).encode(), "application/json")
+                return
+            match = PATH_PATTERN.match(self.path.split("?", 1)[0])
+            if not match:
+                self._send(404, b"not found\n", "text/plain")
+                return
+            video_id, rank, name, version = match.groups()
+            if variant_spec(name) is None:
+                self._send(400, f"unknown variant {name}\n".encode(), "text/plain")
+                return
+            try:
+                data = renderer.get(video_id, int(rank), name, version)
+            except Exception as e:
+                log.error(f"Rendering {self.path} failed: {e}")
+                self._send(500, b"render failed\n", "text/plain")
+                return
+            if data is None:
+                self._send(404, b"master frame not found\n", "text/plain")
+                return
+            self._send(200, data, "image/webp", IMMUTABLE_CACHE_CONTROL if version else CACHE_CONTROL)
+
+        def _send(self, status: int, body: bytes, content_type: str, cache_control: str = "no-store"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", cache_control)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            log.debug(fmt % args)
+
+    return VariantHandler
+
+
+def build_server(renderer: VariantRenderer, host: str = "127.0.0.1", port: int = 8090):
+    return ThreadingHTTPServer((host, port), make_handler(renderer))
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="On-demand variant rendering service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--masters", default=None, help="Local dir laid out like frames/<id>/f01.webp")
+    parser.add_argument("--r2", action="store_true", help="Fetch masters from R2")
+    parser.add_argument("--write-back", action="store_true", help="Upload rendered variants to R2")
+    parser.add_argument("--cache-mb", type=int, default=VARIANT_CACHE_MB)
+    parser.add_argument("--disk-cache-mb", type=int, default=VARIANT_DISK_CACHE_MB)
+    parser.add_argument("--cache-dir", default=VARIANT_CACHE_DIR)
+    parser.add_argument(
+        "--config", default=None,
+        help="Batch config file whose settings block (frame_width, webp_quality) to match",
+    )
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    s3_client = extract_frames.get_r2_client() if (args.r2 or args.write_back) else None
+    if (args.r2 or args.write_back) and s3_client is None:
+        raise SystemExit("R2 is not configured (R2_ENDPOINT / R2_ACCESS_KEY / R2_SECRET_KEY)")
+    if not args.masters and not args.r2:
+        raise SystemExit("Give --masters DIR and/or --r2")
+    settings = PipelineSettings()
+    if args.config:
+        try:
+            with open(args.config) as f:
+                settings = PipelineSettings.from_dict(json.load(f).get("settings", {}))
+        except (OSError, TypeError, ValueError) as e:
+            raise SystemExit(f"Invalid settings in {args.config}: {e}")
+
+    renderer = VariantRenderer(
+        MasterStore(args.masters, s3_client if args.r2 else None),
+        MemoryLRU(args.cache_mb * 1024 * 1024),
+        DiskLRU(args.cache_dir, args.disk_cache_mb * 1024 * 1024) if args.disk_cache_mb else None,
+        write_back=r2_write_back(s3_client) if args.write_back else None,
+        settings=settings,
+    )
+    server = build_server(renderer, args.host, args.port)
+    log.info(f"Serving variants on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+"""
+Warm worker daemon
+==================
+Long-running process that keeps the pipeline warm — modules imported, a
+YoutubeDL and DB connection per worker thread, one boto3 client, one
+variant pool — and takes jobs over a local HTTP endpoint, so an ad-hoc
+reprocess from the admin tools costs seconds instead of a cold start.
+
+  - listens on a Unix socket (default) or a TCP port on localhost
+  - at most --concurrency videos run at once; up to --max-queued more wait,
+    further submissions get 503
+  - SIGTERM/SIGINT drains: new jobs are refused, queued and running jobs
+    finish (jobs still running after --drain-timeout are cancelled at their
+    next stage boundary; any still unfinished CANCEL_GRACE_SEC later are
+    marked failed and abandoned), then backends are closed
+
+Endpoints:
+    POST   /jobs        {"url": "...", "atlas": false, "snap": false,
+                         "profiles": ["daily_frame"]}  → 202 job
+    GET    /jobs        recent jobs
+    GET    /jobs/<id>   one job
+    DELETE /jobs/<id>   cancel (queued: immediately; running: at the next
+                        stage boundary, before the database write)
+    GET    /health      counts and drain state
+
+Usage:
+    python worker_daemon.py serve [--socket /tmp/framedle-worker.sock] [--concurrency 2]
+    python worker_daemon.py submit <url_or_id> [--wait]
+    curl --unix-socket /tmp/framedle-worker.sock -X POST \\
+        -d '{"url": "dQw4w9WgXcQ"}' http://localhost/jobs
+"""
+
+import argparse
+import dataclasses
+import http.client
+import json
+import logging
+import os
+import queue
+import signal
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import extract_frames
+from extract_frames import (
+    MAX_RSS_MB, SNAP_KEYFRAMES, SPILL_DIR, VARIANT_PROFILES, VARIANT_WORKERS,
+    JobCancelled, PipelineSettings, normalize_url, setup_logging,
+)
+from frame_share import variant_pool
+from memory_budget import MemoryBudget
+from seek_control import LatencyTracker
+
+log = logging.getLogger(__name__)
+
+DAEMON_SOCKET = os.environ.get("DAEMON_SOCKET", "/tmp/framedle-worker.sock")
+DAEMON_CONCURRENCY = int(os.environ.get("DAEMON_CONCURRENCY", "2"))
+MAX_QUEUED = 100
+MAX_HISTORY = 1000            # finished jobs kept for status queries
+DRAIN_TIMEOUT_SEC = 600
+CANCEL_GRACE_SEC = 30         # after cancelling, how long drain waits for stage boundaries
+MAX_BODY_BYTES = 64 * 1024
+
+FINISHED = ("done", "failed", "cancelled")
+
+
+class Job:
+    def __init__(self, url: str, atlas: bool = False, snap: bool = False,
+                 settings: PipelineSettings | None = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.url = url
+        self.atlas = atlas
+        self.snap = snap
+        self.settings = settings
+        self.status = "queued"
+        self.error = None
+        self.catalog = {}
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel = threading.Event()
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "url": self.url,
+            "status": self.status,
+            "error": self.error,
+            "catalog": self.catalog,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "cancel_requested": self.cancel.is_set(),
+        }
+
+
+class JobRejected(RuntimeError):
+    """The daemon is draining or its queue is full."""
+
+
+class WorkerDaemon:
+    """
+    Job table + bounded queue + worker threads around process_video. The
+    runner is injectable so tests can exercise scheduling without ffmpeg.
+    """
+
+    def __init__(self, concurrency: int = DAEMON_CONCURRENCY, max_queued: int = MAX_QUEUED,
+                 settings: PipelineSettings | None = None, runner=None, pool=None):
+        self.concurrency = max(1, concurrency)
+        self.max_queued = max_queued
+        self.settings = settings or PipelineSettings()
+        self.pool = pool
+        self.runner = runner or self._process
+        self.budget = MemoryBudget(
+            limit_mb=MAX_RSS_MB, max_in_flight=self.concurrency, spill_dir=SPILL_DIR
+        )
+        self.latency = LatencyTracker()
+        self.jobs = OrderedDict()
+        self.draining = False
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    # -- lifecycle -----------------------------------------------------------
+    def start(self):
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._work, name=f"worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def drain(self, timeout: float = DRAIN_TIMEOUT_SEC, grace: float = CANCEL_GRACE_SEC) -> bool:
+        """
+        Refuse new jobs, let queued/running ones finish. True if all did in
+        time; otherwise the rest are cancelled, and whatever hasn't stopped
+        ``grace`` seconds later is marked finished so shutdown can go ahead
+        (worker threads are daemons and die with the process).
+        """
+        with self._lock:
+            self.draining = True
+        log.info(f"Draining: {self.counts()}")
+        for _ in self._threads:
+            self._queue.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        stuck = [t for t in self._threads if t.is_alive()]
+        if stuck:
+            log.warning(f"Drain timed out — cancelling {len(stuck)} running job(s)")
+            with self._lock:
+                for job in self.jobs.values():
+                    if job.status in ("queued", "running"):
+                        job.cancel.set()
+            deadline = time.monotonic() + grace
+            for thread in stuck:
+                thread.join(max(0.0, deadline - time.monotonic()))
+            self._abandon()
+        return not stuck
+
+    def _abandon(self):
+        """Mark jobs that outlived the drain: never started → cancelled, running → failed."""
+        with self._lock:
+            for job in self.jobs.values():
+                if job.status == "queued":
+                    self._finish(job, "cancelled", "daemon shut down before start")
+                elif job.status == "running":
+                    self._finish(job, "failed", "abandoned at shutdown while running")
+                    log.error(f"Job {job.id} abandoned at shutdown: {job.url}")
+
+    # -- jobs ----------------------------------------------------------------
+    def submit(self, url: str, atlas: bool = False, snap: bool = False,
+               profiles: list[str] | None = None) -> Job:
+        settings = self.settings
+        if profiles:
+            settings = dataclasses.replace(settings, variant_profiles=tuple(profiles))
+            settings.validate()
+        job = Job(normalize_url(url), atlas=atlas, snap=snap, settings=settings)
+        with self._lock:
+            if self.draining:
+                raise JobRejected("daemon is draining")
+            if sum(j.status == "queued" for j in self.jobs.values()) >= self.max_queued:
+                raise JobRejected("queue is full")
+            self._queue.put(job)
+            self.jobs[job.id] = job
+            self._trim_history()
+        log.info(f"Job {job.id} queued: {job.url}")
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def recent(self, limit: int = 100) -> list[Job]:
+        with self._lock:
+            return list(reversed(self.jobs.values()))[:limit]
+
+    def cancel(self, job_id: str) -> Job | None:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return job
+            job.cancel.set()
+            if job.status == "queued":
+                self._finish(job, "cancelled")
+        log.info(f"Job {job_id} cancel requested")
+        return job
+
+    def counts(self) -> dict:
+        with self._lock:
+            counts = {status: 0 for status in ("queued", "running", *FINISHED)}
+            for job in self.jobs.values():
+                counts[job.status] += 1
+        return counts
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED]
+        for job_id in finished[:max(0, len(self.jobs) - MAX_HISTORY)]:
+            del self.jobs[job_id]
+
+    def _finish(self, job: Job, status: str, error: str | None = None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+
+    # -- workers -------------------------------------------------------------
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                if job.status != "queued":     # cancelled while waiting
+                    continue
+                if job.cancel.is_set():
+                    self._finish(job, "cancelled", "cancelled before start")
+                    continue
+                job.status = "running"
+                job.started_at = time.time()
+            log.info(f"Job {job.id} started: {job.url}")
+            try:
+                catalog = self.runner(job)
+            except JobCancelled as e:
+                self._complete(job, "cancelled", str(e))
+            except Exception as e:
+                log.error(f"Job {job.id} failed: {e}")
+                self._complete(job, "failed", f"{type(e).__name__}: {e}"[:500])
+            else:
+                self._complete(job, "done", catalog=catalog)
+            log.info(f"Job {job.id} {job.status} in {job.finished_at - job.started_at:.1f}s")
+
+    def _complete(self, job: Job, status: str, error: str | None = None, catalog=None):
+        with self._lock:
+            if job.status != "running":    # abandoned by a timed-out drain
+                return
+            if catalog is not None:
+                job.catalog = catalog
+            self._finish(job, status, error)
+
+    def _process(self, job: Job) -> dict:
+        # update_catalog is a conditional put that retries lost races, so it is
+        # safe against other workers, batches and daemons writing the catalog
+        return extract_frames.process_video(
+            job.url, budget=self.budget, atlases=job.atlas,
+            update_catalog_index=True, latency=self.latency, snap=job.snap,
+            pool=self.pool, settings=job.settings, cancel=job.cancel,
+        )
+
+
+# ---------------------------------------------------------------------------
+# HTTP front end
+# ---------------------------------------------------------------------------
+def make_handler(daemon: WorkerDaemon):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, {"draining": daemon.draining, "jobs": daemon.counts()})
+            elif self.path == "/jobs":
+                self._send(200, {"jobs": [job.to_dict() for job in daemon.recent()]})
+            elif self.path.startswith("/jobs/"):
+                job = daemon.get(self.path[len("/jobs/"):])
+                if job is None:
+                    self._send(404, {"error": "no such job"})
+                else:
+                    self._send(200, job.to_dict())
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/jobs":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                if length > MAX_BODY_BYTES:
+                    raise ValueError("request body too large")
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(body, dict) or not isinstance(body.get("url"), str):
+                    raise ValueError('expected {"url": "..."}')
+                job = daemon.submit(
+                    body["url"], atlas=bool(body.get("atlas")), snap=bool(body.get("snap")),
+                    profiles=body.get("profiles"),
+                )
+            except (ValueError, TypeError) as e:
+                self._send(400, {"error": str(e)})
+            except JobRejected as e:
+                self._send(503, {"error": str(e)})
+            else:
+                self._send(202, job.to_dict())
+
+        def do_DELETE(self):
+            if not self.path.startswith("/jobs/"):
+                self._send(404, {"error": "not found"})
+                return
+            job = daemon.cancel(self.path[len("/jobs/"):])
+            if job is None:
+                self._send(404, {"error": "no such job"})
+            else:
+                self._send(200, job.to_dict())
+
+        def _send(self, status: int, payload: dict):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            log.debug(fmt % args)
+
+    return Handler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("local", 0)    # BaseHTTPRequestHandler expects (host, port)
+
+
+def build_server(daemon: WorkerDaemon, socket_path: str | None = None,
+                 host: str = "127.0.0.1", port: int | None = None):
+    """HTTP server on a Unix socket (only the owner may connect) or a TCP port."""
+    handler = make_handler(daemon)
+    if port is not None:
+        server = ThreadingHTTPServer((host, port), handler)
+        server.daemon_threads = True
+        return server
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    old_umask = os.umask(0o177)
+    try:
+        return UnixHTTPServer(socket_path, handler)
+    finally:
+        os.umask(old_umask)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float = 10):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def request(method: str, path: str, payload: dict | None = None,
+            socket_path: str = DAEMON_SOCKET, port: int | None = None) -> tuple[int, dict]:
+    """Call a running daemon. Returns (status, JSON body)."""
+    conn = (http.client.HTTPConnection("127.0.0.1", port, timeout=10) if port
+            else UnixHTTPConnection(socket_path))
+    try:
+        body = json.dumps(payload).encode() if payload is not None else None
+        conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        return resp.status, json.loads(resp.read() or b"{}")
+    finally:
+        conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Entry points
+# ---------------------------------------------------------------------------
+def serve(args):
+    import extract_batch
+
+    settings = extract_batch.load_settings(args)
+    extract_frames.enable_warm_resources()
+    server = None
+    try:
+        with variant_pool(args.variant_workers) as pool:
+            daemon = WorkerDaemon(args.concurrency, args.max_queued, settings, pool=pool)
+            daemon.start()
+            server = build_server(daemon, args.socket, port=args.port)
+            where = f"port {args.port}" if args.port is not None else args.socket
+            log.info(f"Worker daemon listening on {where} ({daemon.concurrency} worker(s))")
+
+            stop = threading.Event()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, lambda *_: stop.set())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            stop.wait()
+
+            # Keep answering status queries (new jobs get 503) while draining
+            drained = daemon.drain(args.drain_timeout)
+            server.shutdown()
+            log.info(f"Drained {'cleanly' if drained else 'after cancelling'}: {daemon.counts()}")
+    finally:
+        if server is not None:
+            server.server_close()
+            if args.port is None and os.path.exists(args.socket):
+                os.unlink(args.socket)
+        extract_frames.disable_warm_resources()
+
+
+def submit(args):
+    payload = {"url": args.url, "atlas": args.atlas, "snap": args.snap_keyframes}
+    if args.profile:
+        payload["profiles"] = args.profile
+    status, job = request("POST", "/jobs", payload, args.socket, args.port)
+    if status != 202:
+        raise SystemExit(f"Submit failed ({status}): {job.get('error')}")
+    while args.wait and job["status"] not in FINISHED:
+        time.sleep(0.5)
+        status, job = request("GET", f"/jobs/{job['id']}", None, args.socket, args.port)
+    print(json.dumps(job, indent=2))
+    if job["status"] in ("failed", "cancelled"):
+        raise SystemExit(1)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Warm pipeline worker daemon")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def endpoint(p):
+        p.add_argument("--socket", default=DAEMON_SOCKET, help="Unix socket path")
+        p.add_argument("--port", type=int, default=None, help="Use TCP on localhost instead")
+
+    p = sub.add_parser("serve", help="Run the daemon")
+    endpoint(p)
+    p.add_argument("--concurrency", type=int, default=DAEMON_CONCURRENCY)
+    p.add_argument("--max-queued", type=int, default=MAX_QUEUED)
+    p.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT_SEC)
+    p.add_argument("--variant-workers", type=int, default=VARIANT_WORKERS)
+    p.add_argument("--config", default="videos.json", help="Config with a settings block")
+    p.add_argument(
+        "--profile", action="append", choices=sorted(VARIANT_PROFILES), default=None,
+        help="Default variant profile(s) for jobs that don't name any",
+    )
+    p.set_defaults(func=serve)
+
+    p = sub.add_parser("submit", help="Queue a video on a running daemon")
+    endpoint(p)
+    p.add_argument("url", help="YouTube URL or video ID")
+    p.add_argument("--atlas", action="store_true")
+    p.add_argument("--snap-keyframes", action="store_true", default=SNAP_KEYFRAMES)
+    p.add_argument("--profile", action="append", choices=sorted(VARIANT_PROFILES))
+    p.add_argument("--wait", action="store_true", help="Poll until the job finishes")
+    p.set_defaults(func=submit)
+
+    args = parser.parse_args(argv)
+    setup_logging()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()